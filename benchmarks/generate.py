@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# Seeded synthetic inputs for the benchmarks: the same kind, size and seed
+# always give the same bytes, so runs on different commits read identical
+# data.
+#
+#   python3 generate.py heartbeats|alerts|timestamps 1k|1m|10m|ROWS [path] [--seed N]
+#
+# heartbeats  agent heartbeat JSON lines (logParse.py, testTimesort.py)
+# alerts      alert JSON lines (chatGPTversion.py, alert.py)
+# timestamps  one date string per line in a mix of the formats ts_convert
+#             detects
+import os
+import sys
+import json
+import random
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "old"))
+import linereader
+
+SIZES = {"1k": 1_000, "1m": 1_000_000, "10m": 10_000_000}
+DEFAULT_SEED = 42
+START = datetime(2025, 11, 12)
+SEVERITIES = ("low", "medium", "high", "critical")
+# Mostly healthy, as real feeds are
+STATUSES = ("ok",) * 90 + ("degraded",) * 6 + ("error",) * 4
+
+# (format, weight) for the timestamp column: mostly ISO 8601 as logs write
+# it, with a long tail of the other formats. "unix", "unix_ms" and
+# "unix_frac" are Unix timestamps.
+TIMESTAMP_FORMATS = (
+    ("%Y-%m-%dT%H:%M:%SZ", 40),
+    ("%Y-%m-%dT%H:%M:%S.%fZ", 10),
+    ("%Y-%m-%dT%H:%M:%S%z", 8),
+    ("%Y-%m-%d %H:%M:%S", 8),
+    ("unix", 8),
+    ("unix_ms", 6),
+    ("unix_frac", 2),
+    ("%m/%d/%Y %H:%M:%S", 4),
+    ("%d/%m/%Y", 3),
+    ("%d-%b-%Y", 3),
+    ("%B %d, %Y", 2),
+    ("%Y/%m/%d %H:%M:%S", 2),
+    ("%d.%m.%Y", 2),
+    ("%Y%m%d", 2),
+)
+
+def rows_for(size):
+    # "1k", "1m", "10m" or a plain number of rows
+    return SIZES[size] if size in SIZES else int(size)
+
+def write_lines(path, lines):
+    # Through a temp name, so an interrupted run never leaves a short file
+    # that looks complete
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8", buffering=1 << 20) as f:
+        f.writelines(lines)
+    os.replace(tmp, path)
+
+def heartbeat_lines(rows, seed=DEFAULT_SEED):
+    # A few thousand agents checking in roughly in time order with some
+    # jitter. About 0.1% bad JSON and 0.5% lines missing a field.
+    rnd = random.Random(seed)
+    t = START
+    agents = max(10, min(5000, rows // 100))
+    for _ in range(rows):
+        t += timedelta(milliseconds=rnd.randint(0, 200))
+        if rnd.random() < 0.001:
+            yield "{not json\n"
+            continue
+        agent = rnd.randrange(agents)
+        entry = {
+            "ts": (t - timedelta(seconds=rnd.randint(0, 20))).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "agent_id": f"agent-{agent:04d}",
+            "hostname": f"host-{agent:04d}",
+            "status": rnd.choice(STATUSES),
+            "cpu_pct": round(rnd.uniform(0, 100), 1),
+            "mem_pct": round(rnd.uniform(10, 100), 1),
+            "last_checkin_sec": rnd.choice((rnd.randint(0, 120), rnd.randint(0, 600))),
+        }
+        if rnd.random() < 0.005:
+            del entry[rnd.choice(("hostname", "cpu_pct", "status"))]
+        yield json.dumps(entry, separators=(",", ":")) + "\n"
+
+def alert_lines(rows, seed=DEFAULT_SEED):
+    # Roughly in time order with a little jitter, a few thousand hosts and a
+    # mix of sha256 / threat_id / host-only keys. About 0.1% bad lines.
+    rnd = random.Random(seed)
+    t = START
+    hosts = max(10, min(5000, rows // 200))
+    for _ in range(rows):
+        t += timedelta(milliseconds=rnd.randint(0, 400))
+        if rnd.random() < 0.001:
+            yield "{oops!--}\n"
+            continue
+        host = rnd.randint(1, hosts)
+        r = rnd.random()
+        entry = {
+            "ts": (t - timedelta(seconds=rnd.randint(0, 30))).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "hostname": f"host-{host:04d}",
+            "agent_id": f"a{host}",
+            "threat_id": f"t-{rnd.randint(1, 500)}" if r < 0.6 else None,
+            "sha256": f"{rnd.getrandbits(32):08x}" if r < 0.3 else None,
+            "severity": rnd.choice(SEVERITIES),
+            "confidence": rnd.randint(0, 100),
+        }
+        yield json.dumps(entry) + "\n"
+
+def timestamp_lines(rows, seed=DEFAULT_SEED):
+    # Times spread over a few years, so dates as well as times vary, each
+    # written in a format drawn from TIMESTAMP_FORMATS
+    rnd = random.Random(seed)
+    formats = [fmt for fmt, _ in TIMESTAMP_FORMATS]
+    weights = [weight for _, weight in TIMESTAMP_FORMATS]
+    offsets = [timezone(timedelta(minutes=m)) for m in (0, 60, -300, 330, -480)]
+    span = 3 * 365 * 86400
+    for fmt in rnd.choices(formats, weights, k=rows):
+        t = datetime(2023, 1, 1, tzinfo=timezone.utc) + timedelta(seconds=rnd.randrange(span),
+                                                                   microseconds=rnd.randrange(1_000_000))
+        if fmt == "unix":
+            yield f"{int(t.timestamp())}\n"
+        elif fmt == "unix_ms":
+            yield f"{int(t.timestamp() * 1000)}\n"
+        elif fmt == "unix_frac":
+            yield f"{t.timestamp():.6f}\n"
+        else:
+            if "%z" in fmt:
+                t = t.astimezone(rnd.choice(offsets))
+            yield t.strftime(fmt) + "\n"
+
+KINDS = {
+    "heartbeats": heartbeat_lines,
+    "alerts": alert_lines,
+    "timestamps": timestamp_lines,
+}
+
+def generate(kind, rows, path, seed=DEFAULT_SEED):
+    write_lines(path, KINDS[kind](rows, seed))
+
+def ensure(kind, size, data_dir, seed=DEFAULT_SEED):
+    # Path of the data file for (kind, size, seed), generated if missing
+    path = os.path.join(data_dir, f"{kind}_{size}_s{seed}.log")
+    if not os.path.exists(path):
+        os.makedirs(data_dir, exist_ok=True)
+        print(f"Generating {rows_for(size):,} {kind} rows into {path} ...", file=sys.stderr)
+        generate(kind, rows_for(size), path, seed)
+    return path
+
+def main():
+    args = sys.argv[1:]
+    try:
+        seed = linereader.pop_option(args, "--seed", int)
+        rows = rows_for(args[1]) if len(args) in (2, 3) else None
+    except (ValueError, IndexError):
+        rows = None
+    if rows is None or args[0] not in KINDS:
+        print(f"Usage: python3 {sys.argv[0]} heartbeats|alerts|timestamps 1k|1m|10m|ROWS [path] [--seed N]")
+        sys.exit(1)
+    seed = DEFAULT_SEED if seed is None else seed
+    path = args[2] if len(args) == 3 else f"{args[0]}_{args[1]}_s{seed}.log"
+    generate(args[0], rows, path, seed)
+
+if __name__ == "__main__":
+    main()
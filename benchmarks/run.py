@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# Benchmark suite: times each tool on seeded synthetic data (generate.py) and
+# records lines/sec and peak RSS per case, so regressions show up from one
+# commit to the next.
+#
+#   python3 run.py [--size 1k|1m|10m] [--seed N] [--output FILE] [--data-dir DIR] [case,...]
+#   python3 run.py --size 10m logParse,testTimesort
+#
+# Every case runs in its own process (peak RSS is that process's), with its
+# output sent to /dev/null. Data files are generated on first use and kept in
+# the data dir. Each run is appended to the output file (default
+# results.json next to this script) with the commit it was run on, and the
+# table shows the change in lines/sec against the last run of the same size
+# and seed.
+import os
+import sys
+import json
+import time
+import platform
+import resource
+import subprocess
+from datetime import datetime, timezone
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPO = os.path.dirname(HERE)
+sys.path.insert(0, os.path.join(REPO, "old"))
+sys.path.insert(0, os.path.join(REPO, "ts_convert"))
+import linereader
+import generate
+
+DEFAULT_SIZE = "1m"
+DEFAULT_OUTPUT = os.path.join(HERE, "results.json")
+DEFAULT_DATA_DIR = os.path.join(HERE, "data")
+
+def read_column(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read().splitlines()
+
+# Each case takes the data file and returns (lines, seconds), timing only the
+# work being measured. Loading a column into memory is not timed; the tools
+# are timed end to end, reading included.
+
+def case_detect(path):
+    import ts_convert
+    column = read_column(path)
+    detect = ts_convert.detect_datetime_format
+    start = time.perf_counter()
+    for s in column:
+        detect(s)
+    return len(column), time.perf_counter() - start
+
+def case_parse_epoch_ns(path):
+    import ts_convert
+    column = read_column(path)
+    start = time.perf_counter()
+    ts_convert.parse_epoch_ns_many(column)
+    return len(column), time.perf_counter() - start
+
+def case_sort(path):
+    import ts_convert
+    column = read_column(path)
+    start = time.perf_counter()
+    ts_convert.sort_datetimes(column)
+    return len(column), time.perf_counter() - start
+
+def case_format(path):
+    # Every parsed value back to its own format
+    import ts_convert
+    parsed = [ts_convert.detect_datetime_format(s) for s in read_column(path)]
+    parsed = [(dt, name) for dt, name in parsed if dt is not None]
+    to_string = ts_convert.datetime_to_string
+    start = time.perf_counter()
+    for dt, name in parsed:
+        to_string(dt, name)
+    return len(parsed), time.perf_counter() - start
+
+def tool_case(module_name, *options):
+    # A tool's main() on the data file, as if run from the command line
+    def run_tool(path):
+        module = __import__(module_name)
+        sys.argv = [module_name + ".py", *options, path]
+        with open(path, "rb") as f:
+            lines = sum(1 for _ in f)
+        start = time.perf_counter()
+        module.main()
+        sys.stdout.flush()
+        return lines, time.perf_counter() - start
+    return run_tool
+
+# case -> (kind of data, function)
+CASES = {
+    "detect_datetime_format": ("timestamps", case_detect),
+    "parse_epoch_ns": ("timestamps", case_parse_epoch_ns),
+    "sort_datetimes": ("timestamps", case_sort),
+    "datetime_to_string": ("timestamps", case_format),
+    "logParse": ("heartbeats", tool_case("logParse")),
+    "testTimesort": ("heartbeats", tool_case("testTimesort")),
+    "chatGPTversion": ("alerts", tool_case("chatGPTversion")),
+    "chatGPTversion_stream": ("alerts", tool_case("chatGPTversion", "--stream")),
+    "alert": ("alerts", tool_case("alert", "--output", os.devnull)),
+}
+
+def run_case(name, path):
+    # In the child: stdout goes to /dev/null and the result to the original
+    # stdout
+    result_fd = os.dup(1)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    sys.stdout.flush()
+    os.dup2(devnull, 1)
+    lines, seconds = CASES[name][1](path)
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    os.write(result_fd, json.dumps({"lines": lines, "seconds": seconds, "peak_rss_kb": peak_kb}).encode())
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO, check=True,
+                              capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def load_results(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+
+def previous_case(runs, size, seed, name):
+    # The case's result in the last run of the same size and seed, or None
+    for run in reversed(runs):
+        if run["size"] == size and run["seed"] == seed and name in run["cases"]:
+            return run["cases"][name]
+    return None
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == "--run":
+        run_case(sys.argv[2], sys.argv[3])
+        return
+
+    args = sys.argv[1:]
+    try:
+        size = linereader.pop_option(args, "--size", str)
+        seed = linereader.pop_option(args, "--seed", int)
+        output = linereader.pop_option(args, "--output", str)
+        data_dir = linereader.pop_option(args, "--data-dir", str)
+        size = DEFAULT_SIZE if size is None else size
+        generate.rows_for(size)
+    except ValueError:
+        args = None
+    names = args[0].split(",") if args else list(CASES)
+    if args is None or len(args) > 1 or "" in (output, data_dir) or any(name not in CASES for name in names):
+        print(f"Usage: python3 {sys.argv[0]} [--size 1k|1m|10m|ROWS] [--seed N] [--output FILE] "
+              f"[--data-dir DIR] [case,...]")
+        print(f"Cases: {', '.join(CASES)}")
+        sys.exit(1)
+    seed = generate.DEFAULT_SEED if seed is None else seed
+    output = DEFAULT_OUTPUT if output is None else output
+    data_dir = DEFAULT_DATA_DIR if data_dir is None else data_dir
+
+    runs = load_results(output)
+    run = {
+        "commit": git_commit(),
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "size": size,
+        "seed": seed,
+        "cases": {},
+    }
+
+    print(f"{'case':24} {'lines/sec':>12} {'seconds':>9} {'peak RSS MB':>12} {'vs last':>8}")
+    for name in names:
+        path = generate.ensure(CASES[name][0], size, data_dir, seed)
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), "--run", name, path],
+                             check=True, capture_output=True, text=True).stdout
+        result = json.loads(out)
+        result["lines_per_sec"] = result["lines"] / result["seconds"] if result["seconds"] else None
+        run["cases"][name] = result
+
+        change = ""
+        before = previous_case(runs, size, seed, name)
+        if before and before.get("lines_per_sec") and result["lines_per_sec"]:
+            change = f"{result['lines_per_sec'] / before['lines_per_sec'] - 1:+.1%}"
+        rate = f"{result['lines_per_sec']:,.0f}" if result["lines_per_sec"] else "-"
+        print(f"{name:24} {rate:>12} {result['seconds']:9.2f} "
+              f"{result['peak_rss_kb'] / 1024:12.1f} {change:>8}")
+
+    runs.append(run)
+    tmp = output + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(runs, f, indent=1)
+        f.write("\n")
+    os.replace(tmp, output)
+
+if __name__ == "__main__":
+    main()
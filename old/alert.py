@@ -1,43 +1,169 @@
+#!/usr/bin/env python3
+# Alert exporter: one CSV row per (hostname, indicator) key, where the
+# indicator is the alert's sha256, else its threat_id, else empty. A row
+# holds how many alerts the key had and the fields of the latest of them
+# (by ts; on a tie the one read last).
+#
+#   python3 alert.py [--output FILE|-] [--workers N] <input.log|glob>...
+#
+# The index is one small record per distinct key, so memory does not grow
+# with the size of the logs. Several files are indexed in parallel and the
+# indexes merged. Rows come out in the order their keys were first seen.
 import sys
-import json
 import csv
+import operator
+from datetime import datetime, timezone
 
+import linereader
 
-def process_line(l):
-    result = csv.writer
-    if l.get('sha256'):
-        lkey = {l['hostname'],l['sha256']}
-    elif l.get('threat_id'):
-        lkey = {l['hostname'],l['threat_id']}
-    else:
-        lkey = {l['hostname']}
-    
+DEFAULT_OUTPUT = "out"
+OUTPUT_BUFFER = 1 << 20
+CSV_HEADER = ("hostname", "indicator", "count", "ts", "agent_id", "severity", "confidence",
+              "sha256", "threat_id")
 
+def parse_ts(ts_str):
+    # ISO 8601, with Z accepted; a ts without an offset is taken as UTC so
+    # that every ts can be compared with every other
+    if ts_str.endswith("Z"):
+        ts_str = ts_str[:-1] + "+00:00"
+    ts = datetime.fromisoformat(ts_str)
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts
 
-def main():
-    DEBUG=False
-    
-    if len(sys.argv) < 2:
-        print("USAGE: python3 "+sys.argv[0]+" <input.log>")
-        sys.exit(1)
+def alert_key(alert):
+    # (hostname, sha256 or threat_id): a hashable key that is the same for
+    # the same alert whatever order its fields came in
+    return alert["hostname"], alert.get("sha256") or alert.get("threat_id") or None
 
-    logFile = sys.argv[1];    
+# What is kept of a key's latest alert, after its ts and ts string
+LATEST_FIELD_NAMES = ("agent_id", "severity", "confidence", "sha256", "threat_id")
+_LATEST_FIELDS = operator.itemgetter(*LATEST_FIELD_NAMES)
+
+def index_file(path):
+    # Worker for one log: (error or None, bad line numbers, counts, latest)
+    # where counts maps each key to its number of alerts and latest maps it
+    # to (ts, ts string, *LATEST_FIELD_NAMES) of its latest alert. Both
+    # are plain dicts of tuples, which the garbage collector stops tracking,
+    # so a large index costs no GC time. Lines that are valid JSON but not
+    # an alert with a hostname and a usable ts are left out.
+    bad_lines = []
+    counts = {}
+    latest = {}
+    count_of = counts.get
+    latest_of = latest.get
+    hostnames = {}
+    # ts string -> (that string, datetime): logs repeat the same ts a lot,
+    # and alerts kept from the same second share both
+    parsed = {}
     try:
-        with open(logFile,mode='r') as f:
-            for lineCount, line in enumerate(f,1):
-                line = line.strip()
+        for _, alert in linereader.iter_json(path, on_error=bad_lines.append, skip_blank=False):
+            try:
+                ts_str = alert["ts"]
+                key = alert_key(alert)
+                count = count_of(key, 0)
+            except (KeyError, TypeError):
+                # Not a dict, no ts or hostname, or a value that can't be a key
+                continue
+            if key[0] is None or type(ts_str) is not str:
+                continue
+            found = parsed.get(ts_str)
+            if found is None:
                 try:
-                    l = json.loads(line)
-                except:
-                    print("Error in json at line "+str(lineCount))
+                    found = ts_str, parse_ts(ts_str)
+                except ValueError:
                     continue
-                if DEBUG:
-                    print(str(lineCount)+": "+json.dumps(l))
-                result=process_line(l)
-    except:
-        print("ERROR - Colud not open file: "+logFile)
-    with open("out",'w') as o:
-        json.dumps(result,f)
-
-if __name__=="__main__":
-    main()
\ No newline at end of file
+                if len(parsed) >= 4096:
+                    parsed.clear()
+                parsed[ts_str] = found
+
+            if count:
+                counts[key] = count + 1
+                kept = latest_of(key)
+                if found[1] < kept[0]:
+                    continue
+            else:
+                # New key: its hostname string is shared with the other keys
+                # of the host
+                hostname = key[0]
+                if type(hostname) is str:
+                    key = hostnames.setdefault(hostname, hostname), key[1]
+                counts[key] = 1
+            try:
+                fields = _LATEST_FIELDS(alert)
+            except KeyError:
+                fields = tuple(map(alert.get, LATEST_FIELD_NAMES))
+            latest[key] = (found[1], found[0], *fields)
+    except OSError as e:
+        return str(e), bad_lines, counts, latest
+    return None, bad_lines, counts, latest
+
+def merge_indexes(indexes):
+    # One (counts, latest) from per-file ones given in file order. Keys keep
+    # the order they were first seen in and a tie on ts goes to the later
+    # file, as if the files had been one log.
+    counts = {}
+    latest = {}
+    for file_counts, file_latest in indexes:
+        if not counts:
+            counts, latest = file_counts, file_latest
+            continue
+        for key, count in file_counts.items():
+            kept = latest.get(key)
+            found = file_latest[key]
+            if kept is None:
+                counts[key] = count
+                latest[key] = found
+                continue
+            counts[key] += count
+            if found[0] >= kept[0]:
+                latest[key] = found
+    return counts, latest
+
+def write_csv(counts, latest, out):
+    # All rows through one csv.writer
+    writer = csv.writer(out, lineterminator="\n")
+    writer.writerow(CSV_HEADER)
+    writer.writerows((hostname, indicator, count, *latest[hostname, indicator][1:])
+                     for (hostname, indicator), count in counts.items())
+
+def export(paths, output=DEFAULT_OUTPUT, workers=None):
+    # Index the logs, report bad lines and unreadable files, write the CSV.
+    # Returns the number of rows written.
+    def indexes():
+        # Merged as they arrive, so only one file's index waits at a time
+        for path, (error, bad_lines, counts, latest) in zip(paths, linereader.map_files(index_file, paths, workers)):
+            for line_no in bad_lines:
+                if len(paths) > 1:
+                    print(f"Error in json at {path} line {line_no}")
+                else:
+                    print(f"Error in json at line {line_no}")
+            if error is not None:
+                print(f"ERROR - Could not open file: {path} ({error})")
+            yield counts, latest
+
+    counts, latest = merge_indexes(indexes())
+
+    if output == "-":
+        sys.stdout.flush()
+        write_csv(counts, latest, sys.stdout)
+        sys.stdout.flush()
+    else:
+        with open(output, "w", encoding="utf-8", newline="", buffering=OUTPUT_BUFFER) as out:
+            write_csv(counts, latest, out)
+    return len(counts)
+
+def main():
+    args = sys.argv[1:]
+    try:
+        output = linereader.pop_option(args, "--output", str)
+        workers = linereader.pop_option(args, "--workers", int)
+    except ValueError:
+        args = []
+    if not args or output == "" or (workers is not None and workers < 1):
+        print(f"USAGE: python3 {sys.argv[0]} [--output FILE|-] [--workers N] <input.log|glob>...")
+        sys.exit(1)
+    export(linereader.expand_paths(args), DEFAULT_OUTPUT if output is None else output, workers)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# Benchmark for the chatGPTversion alert dedup loop and the alert.py CSV
+# exporter. Generates a synthetic alert log, then runs the original dict-slot
+# loop, the current one and the exporter, each in its own process, and reports
+# input rows/sec and peak RSS.
+#
+#   python3 alert_bench.py [lines] [path] [variant,...]
+#   python3 alert_bench.py 10000000 alerts_10m.log export
+#
+# Default is 5,000,000 lines written to alerts_bench.log (reused if present)
+# and every variant.
+import sys
+import os
+import json
+import time
+import random
+import resource
+import subprocess
+import contextlib
+from datetime import datetime, timedelta
+
+import alert
+import chatGPTversion as cgv
+
+SEVERITIES = ("low", "medium", "high", "critical")
+
+def generate(path, lines, seed=42):
+    # Roughly in time order with a little jitter, a few thousand hosts, and a
+    # mix of sha256 / threat_id / host-only keys. About 0.1% bad lines.
+    rnd = random.Random(seed)
+    t = datetime(2025, 11, 12)
+    with open(path, "w", encoding="utf-8") as f:
+        for _ in range(lines):
+            t += timedelta(milliseconds=rnd.randint(0, 400))
+            if rnd.random() < 0.001:
+                f.write("{oops!--}\n")
+                continue
+            host = rnd.randint(1, 5000)
+            r = rnd.random()
+            entry = {
+                "ts": (t - timedelta(seconds=rnd.randint(0, 30))).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "hostname": f"host-{host:04d}",
+                "agent_id": f"a{host}",
+                "threat_id": f"t-{rnd.randint(1, 500)}" if r < 0.6 else None,
+                "sha256": f"{rnd.getrandbits(32):08x}" if r < 0.3 else None,
+                "severity": rnd.choice(SEVERITIES),
+                "confidence": rnd.randint(0, 100),
+            }
+            f.write(json.dumps(entry) + "\n")
+
+def legacy_process_file(path):
+    # The loop as it was before parse-once records: ts parsed three times per
+    # line and a 5-key dict holding the whole event for every window
+    def validate_entry(entry):
+        for k in cgv.REQUIRED_MIN_KEYS:
+            if k not in entry:
+                return False
+        if entry["severity"] not in cgv.SEV_RANK:
+            return False
+        try:
+            cgv.parse_ts(entry["ts"])
+        except Exception:
+            return False
+        return True
+
+    def emit_record(kept_event, key_str, suppressed_count, out_list):
+        out_list.append((cgv.parse_ts(kept_event["ts"]), kept_event["ts"], kept_event["hostname"],
+                         kept_event["agent_id"], key_str, kept_event["severity"], suppressed_count))
+
+    active = {}
+    emitted = []
+    with open(path, "r", encoding="utf-8") as f:
+        for raw_line in f:
+            line = raw_line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if not validate_entry(entry):
+                continue
+            try:
+                evt_ts = cgv.parse_ts(entry["ts"])
+            except Exception:
+                continue
+            key_str = cgv.best_key(entry)
+            rank = cgv.SEV_RANK.get(entry["severity"])
+            if key_str not in active:
+                active[key_str] = {"window_start": evt_ts, "kept_event": entry, "kept_rank": rank,
+                                   "kept_ts": evt_ts, "suppressed": 0}
+                continue
+            slot = active[key_str]
+            if evt_ts - slot["window_start"] <= cgv.WINDOW:
+                slot["suppressed"] += 1
+                if cgv.should_update_kept(rank, evt_ts, slot["kept_rank"], slot["kept_ts"]):
+                    slot["kept_event"] = entry
+                    slot["kept_rank"] = rank
+                    slot["kept_ts"] = evt_ts
+            else:
+                emit_record(slot["kept_event"], key_str, slot["suppressed"], emitted)
+                active[key_str] = {"window_start": evt_ts, "kept_event": entry, "kept_rank": rank,
+                                   "kept_ts": evt_ts, "suppressed": 0}
+    for key_str, slot in active.items():
+        emit_record(slot["kept_event"], key_str, slot["suppressed"], emitted)
+    emitted.sort(key=lambda r: (r[2], r[0]))
+    for _, ts_str, hostname, agent_id, key_str, kept_sev, suppressed in emitted:
+        print(f"{ts_str},{hostname},{agent_id},{key_str},{kept_sev},{suppressed}")
+
+VARIANTS = {
+    "legacy": legacy_process_file,
+    "current": lambda path: cgv.process_files([path]),
+    "streaming": lambda path: cgv.process_files_streaming([path]),
+    "export": lambda path: alert.export([path], os.devnull, workers=1),
+}
+
+def run_variant(name, path):
+    # Runs in a child process: time one variant, output discarded
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        VARIANTS[name](path)
+        elapsed = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"variant": name, "seconds": elapsed, "peak_rss_kb": peak_kb}))
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == "--run":
+        run_variant(sys.argv[2], sys.argv[3])
+        return
+
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000_000
+    path = sys.argv[2] if len(sys.argv) > 2 else "alerts_bench.log"
+    names = sys.argv[3].split(",") if len(sys.argv) > 3 else list(VARIANTS)
+    if any(name not in VARIANTS for name in names):
+        print(f"Variants: {', '.join(VARIANTS)}")
+        sys.exit(1)
+    if not os.path.exists(path):
+        print(f"Generating {lines} lines into {path} ...")
+        generate(path, lines)
+    with open(path, "rb") as f:
+        lines = sum(1 for _ in f)
+
+    print(f"{'variant':10} {'rows/sec':>12} {'seconds':>9} {'peak RSS MB':>12}")
+    for name in names:
+        out = subprocess.run([sys.executable, __file__, "--run", name, path],
+                             check=True, capture_output=True, text=True).stdout
+        result = json.loads(out)
+        print(f"{name:10} {lines / result['seconds']:12,.0f} {result['seconds']:9.2f} "
+              f"{result['peak_rss_kb'] / 1024:12.1f}")
+
+if __name__ == "__main__":
+    main()
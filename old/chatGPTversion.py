@@ -1,9 +1,28 @@
 #!/usr/bin/env python3
 import sys
-import json
+import os
+import zlib
+import heapq
+import pickle
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 
+import linereader
+import runstats
+
 WINDOW = timedelta(minutes=15)
+# Streaming mode: how far behind the newest timestamp an event may arrive
+# and still join its window
+ALLOWED_LATENESS = timedelta(minutes=5)
+# --lateness above this is refused: it would keep every window open to the
+# end anyway, and much more runs the cutoff off the start of the calendar
+MAX_LATENESS = timedelta(days=36525)
+# Parallel mode: approximate bytes of input per stage 1 task
+PARALLEL_CHUNK_SIZE = 32 * 1024 * 1024
+# Parallel mode: an event's seq is its file's rank shifted by this many bits
+# plus its byte offset (line number in a compressed file)
+FILE_SEQ_BITS = 48
 SEV_RANK = {"low": 0, "medium": 1, "high": 2, "critical": 3}
 
 REQUIRED_MIN_KEYS = ("ts", "hostname", "agent_id", "severity")
@@ -27,18 +46,26 @@ def best_key(entry):
         return f"threat:{threat}"
     return f"host:{host}"
 
-def validate_entry(entry):
-    # Ensure required fields exist and are well formed
+def validate_entry(entry, parse=parse_ts):
+    # Ensure required fields exist and are well formed.
+    # Returns the parsed timestamp so callers don't parse it again, or None.
     for k in REQUIRED_MIN_KEYS:
         if k not in entry:
-            return False
+            return None
     if entry["severity"] not in SEV_RANK:
-        return False
+        return None
     try:
-        parse_ts(entry["ts"])
+        return parse(entry["ts"])
     except Exception:
-        return False
-    return True
+        return None
+
+def event_validator():
+    # validate_entry, or with --stats on one that times validation and
+    # timestamp parsing as stages of their own
+    if runstats.STATS is None:
+        return validate_entry
+    parse = runstats.timed("timestamp", parse_ts)
+    return runstats.timed("validate", lambda entry: validate_entry(entry, parse))
 
 def should_update_kept(new_rank, new_ts, kept_rank, kept_ts):
     if new_rank > kept_rank:
@@ -47,92 +74,354 @@ def should_update_kept(new_rank, new_ts, kept_rank, kept_ts):
         return True
     return False
 
-def emit_record(kept_event, key_str, suppressed_count, out_list):
-    # kept_event is the dict we stored
+class Window:
+    # State of one key's suppression window. Only the fields needed for the
+    # output row are kept from the event, not the whole decoded JSON dict.
+    __slots__ = ("start", "suppressed", "kept_rank", "kept_ts",
+                 "ts_str", "hostname", "agent_id", "severity")
+
+    def __init__(self, entry, evt_ts, rank):
+        self.start = evt_ts
+        self.suppressed = 0
+        self.keep(entry, evt_ts, rank)
+
+    def keep(self, entry, evt_ts, rank):
+        self.kept_rank = rank
+        self.kept_ts = evt_ts
+        self.ts_str = entry["ts"]
+        self.hostname = entry["hostname"]
+        self.agent_id = entry["agent_id"]
+        self.severity = entry["severity"]
+
+    def add(self, entry, evt_ts, rank):
+        # Count an event inside the window, promoting it if it ranks higher
+        self.suppressed += 1
+        if should_update_kept(rank, evt_ts, self.kept_rank, self.kept_ts):
+            self.keep(entry, evt_ts, rank)
+
+def emit_record(window, key_str, out_list, order):
     out_list.append((
-        parse_ts(kept_event["ts"]),              # for sorting
-        kept_event["ts"],                        # for printing
-        kept_event["hostname"],
-        kept_event["agent_id"],
+        window.kept_ts,                          # for sorting
+        window.ts_str,                           # for printing
+        window.hostname,
+        window.agent_id,
         key_str,
-        kept_event["severity"],
-        suppressed_count
+        window.severity,
+        window.suppressed,
+        order                                    # ties keep emission order
     ))
 
-def process_file(path):
-    active = {}  # key_str -> {window_start, kept_event, kept_rank, kept_ts, suppressed}
-    emitted = [] # list of tuples as prepared in emit_record
-
-    with open(path, "r", encoding="utf-8") as f:
-        for raw_line in f:
-            line = raw_line.strip()
-            if not line:
-                continue
-
-            try:
-                entry = json.loads(line)
-            except json.JSONDecodeError:
-                continue
-
-            if not validate_entry(entry):
-                continue
-
-            try:
-                evt_ts = parse_ts(entry["ts"])
-            except Exception:
-                continue
-
-            key_str = best_key(entry)
-            rank = SEV_RANK.get(entry["severity"])
-            if key_str not in active:
-                # Start a new window
-                active[key_str] = {
-                    "window_start": evt_ts,
-                    "kept_event": entry,
-                    "kept_rank": rank,
-                    "kept_ts": evt_ts,
-                    "suppressed": 0
-                }
-                continue
-
-            slot = active[key_str]
-            # Check window
-            if evt_ts - slot["window_start"] <= WINDOW:
-                # Inside window
-                # Count this alert as part of the window
-                slot["suppressed"] += 1
-                # Promote kept if needed
-                if should_update_kept(rank, evt_ts, slot["kept_rank"], slot["kept_ts"]):
-                    slot["kept_event"] = entry
-                    slot["kept_rank"] = rank
-                    slot["kept_ts"] = evt_ts
-            else:
-                # Window expired. Emit, then start a new one.
-                emit_record(slot["kept_event"], key_str, slot["suppressed"], emitted)
-                active[key_str] = {
-                    "window_start": evt_ts,
-                    "kept_event": entry,
-                    "kept_rank": rank,
-                    "kept_ts": evt_ts,
-                    "suppressed": 0
-                }
+def row_sort_key(row):
+    # Sort by hostname then ts; rows that tie come out in emission order
+    return (row[2], row[0], row[7])
 
-    # Flush remaining windows
-    for key_str, slot in active.items():
-        emit_record(slot["kept_event"], key_str, slot["suppressed"], emitted)
+def read_events(path):
+    # Yield (entry, parsed ts) for every valid line; the ts is parsed once
+    validate = event_validator()
+    for _, entry in linereader.iter_json(path):
+        evt_ts = validate(entry)
+        if evt_ts is None:
+            runstats.count("lines_skipped")
+            continue
+        yield entry, evt_ts
+
+def first_event_ts(path):
+    # The parsed ts of a log's first valid event, or None if it has none
+    for _, evt_ts in read_events(path):
+        return evt_ts
+    return None
+
+def order_files(paths):
+    # Several logs are read one after another as if they were one, so that
+    # windows carry over from one file into the next. They go in event-time
+    # order, by the ts of each file's first event, not in the order they
+    # were named (a glob puts alerts.log.10 before alerts.log.9). Ties keep
+    # their order; files with no valid events go last. With --stats the
+    # probe is an "order" stage; its lines are counted when read for real.
+    if len(paths) <= 1:
+        return list(paths)
+    with runstats.stage("order"), runstats.suspended():
+        firsts = {path: first_event_ts(path) for path in paths}
+    return sorted(paths, key=lambda path: (firsts[path] is None, firsts[path]))
 
-    # Sort by hostname then ts
-    emitted.sort(key=lambda r: (r[2], r[0]))
+def read_files(paths):
+    # read_events over several logs, in order_files order
+    for path in order_files(paths):
+        yield from read_events(path)
 
+def dedupe(events):
+    # Run the suppression windows over (seq, key_str, entry, evt_ts) events in
+    # file order, where seq increases through the file. Returns the emitted
+    # rows. Each row's order tag reproduces the order a single pass over the
+    # whole file emits them in: (0, seq of the event that closed the window)
+    # or, for windows still open at EOF, (1, seq of the key's first event).
+    active = {}     # key_str -> Window
+    first_seq = {}  # key_str -> seq of its first event
+    emitted = []
+
+    for seq, key_str, entry, evt_ts in events:
+        rank = SEV_RANK[entry["severity"]]
+        window = active.get(key_str)
+        if window is None:
+            # Start a new window
+            active[key_str] = Window(entry, evt_ts, rank)
+            first_seq[key_str] = seq
+        elif evt_ts - window.start <= WINDOW:
+            # Inside window
+            window.add(entry, evt_ts, rank)
+        else:
+            # Window expired. Emit, then start a new one.
+            emit_record(window, key_str, emitted, (0, seq))
+            active[key_str] = Window(entry, evt_ts, rank)
+
+    # Flush remaining windows
+    for key_str, window in active.items():
+        emit_record(window, key_str, emitted, (1, first_seq[key_str]))
+    # Windows are only replaced here, never dropped, so this is the most
+    # that were open at once
+    runstats.peak("windows_active", len(active))
+    return emitted
+
+def print_rows(rows):
     # Print CSV rows (no header, to match the example)
-    for _, ts_str, hostname, agent_id, key_str, kept_sev, suppressed in emitted:
+    for _, ts_str, hostname, agent_id, key_str, kept_sev, suppressed, _ in rows:
         print(f"{ts_str},{hostname},{agent_id},{key_str},{kept_sev},{suppressed}")
 
+def process_files(paths):
+    events = ((seq, best_key(entry), entry, evt_ts)
+              for seq, (entry, evt_ts) in enumerate(read_files(paths)))
+    emitted = dedupe(runstats.timed_iter("read", events))
+    with runstats.stage("sort"):
+        emitted.sort(key=row_sort_key)
+    with runstats.stage("output"):
+        print_rows(emitted)
+    runstats.count("rows_out", len(emitted))
+
+def chunk_ranges(path, chunk_size):
+    # Split a file into (start, end) byte ranges that end on line boundaries
+    size = os.path.getsize(path)
+    ranges = []
+    with open(path, "rb") as f:
+        start = 0
+        while start < size:
+            f.seek(min(start + chunk_size, size))
+            f.readline()
+            end = min(f.tell(), size)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+def range_lines(path, start, end):
+    # (byte offset, stripped line) for each line of a byte range
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    raw_lines = data.split(b"\n")
+    runstats.count("lines_read", len(raw_lines) - data.endswith(b"\n"))
+    offset = start
+    for raw_line in raw_lines:
+        yield offset, raw_line.strip()
+        offset += len(raw_line) + 1
+
+def shard_range(path, start, end, parts, out_prefix, rank=0):
+    # Parallel stage 1: decode one byte range and split its valid events by a
+    # stable hash of their key into `parts` pickle files. An event's seq is
+    # its byte offset, after those of the files ranked before its file. A
+    # compressed file can't be split, so it is one task (end is None) and
+    # line numbers stand in for offsets. Only the fields a Window needs are
+    # kept.
+    shards = [[] for _ in range(parts)]
+    if end is None:
+        lines = linereader.iter_lines(path)
+    else:
+        lines = range_lines(path, start, end)
+
+    lines = runstats.timed_iter("io", lines)
+    loads = runstats.timed("json", linereader.loads)
+    validate = event_validator()
+    base = rank << FILE_SEQ_BITS
+    for offset, line in lines:
+        if not line:
+            continue
+        seq = base + offset
+        try:
+            entry = loads(line)
+        except ValueError:
+            runstats.count("lines_invalid")
+            continue
+        evt_ts = validate(entry)
+        if evt_ts is None:
+            runstats.count("lines_skipped")
+            continue
+        key_str = best_key(entry)
+        fields = {k: entry[k] for k in REQUIRED_MIN_KEYS}
+        shards[zlib.crc32(key_str.encode("utf-8")) % parts].append((seq, key_str, fields, evt_ts))
+
+    for part, shard in enumerate(shards):
+        with open(f"{out_prefix}-{part}", "wb") as out:
+            pickle.dump(shard, out, protocol=pickle.HIGHEST_PROTOCOL)
+
+def dedupe_shard(shard_paths):
+    # Parallel stage 2: run the windows for one key partition, reading its
+    # shard files in file order, and return the rows sorted for merging
+    def events():
+        for shard_path in shard_paths:
+            with open(shard_path, "rb") as f:
+                yield from pickle.load(f)
+    emitted = runstats.timed("window", dedupe)(runstats.timed_iter("read", events()))
+    with runstats.stage("sort"):
+        emitted.sort(key=row_sort_key)
+    return emitted
+
+def process_files_parallel(paths, workers, chunk_size=PARALLEL_CHUNK_SIZE):
+    # Windows are independent per key, so the work is split by key: stage 1
+    # decodes byte ranges in parallel and partitions events by key hash,
+    # stage 2 runs each partition's windows in its own process, and the
+    # per-partition sorted rows are k-way merged. Output matches
+    # process_files.
+    tasks = []  # (path, start, end, file rank)
+    for rank, path in enumerate(order_files(paths)):
+        if linereader.is_compressed(path):
+            tasks.append((path, 0, None, rank))
+        else:
+            tasks.extend((path, start, end, rank) for start, end in chunk_ranges(path, chunk_size))
+    n = len(tasks)
+    with tempfile.TemporaryDirectory(prefix="alert_shards_") as tmpdir, \
+            ProcessPoolExecutor(max_workers=workers) as pool:
+        prefixes = [os.path.join(tmpdir, f"range{i:06d}") for i in range(n)]
+        paths, starts, ends, ranks = zip(*tasks) if tasks else ((), (), (), ())
+        list(runstats.pool_map(pool, shard_range, paths, starts, ends, [workers] * n, prefixes, ranks))
+        partitions = [[f"{prefix}-{part}" for prefix in prefixes] for part in range(workers)]
+        results = list(runstats.pool_map(pool, dedupe_shard, partitions))
+    with runstats.stage("output"):
+        print_rows(heapq.merge(*results, key=row_sort_key))
+    runstats.count("rows_out", sum(map(len, results)))
+
+def print_record(window, key_str):
+    print(f"{window.ts_str},{window.hostname},{window.agent_id},"
+          f"{key_str},{window.severity},{window.suppressed}")
+
+class Suppressor:
+    # The suppression windows of process_files_streaming, fed (entry, parsed
+    # ts) events a batch at a time so that a live stream can go through them
+    # too (ingest.py). The watermark is the newest timestamp seen minus the
+    # allowed lateness; a window that started more than WINDOW before the
+    # watermark can no longer receive events, so emit(window, key_str) is
+    # called for it and it is dropped. Memory is bounded by the keys active
+    # in the last window, not by the length of the stream. Events arriving
+    # later than the lateness allows start a new window instead of joining
+    # their old one.
+    def __init__(self, emit=print_record, lateness=ALLOWED_LATENESS):
+        self.emit = emit
+        self.lateness = lateness
+        self.active = {}    # key_str -> Window
+        self.expiry = []    # heap of (window start, seq, Window, key_str), one per window opened
+        self.opened = 0     # windows opened so far, the seq of the next one
+        self.max_ts = None
+
+    def _expire(self, cutoff):
+        # Emit and drop the windows that started before cutoff
+        active, expiry, emit = self.active, self.expiry, self.emit
+        while expiry and expiry[0][0] < cutoff:
+            _, _, window, key_str = heapq.heappop(expiry)
+            # Entries for windows that were already replaced are stale
+            if active.get(key_str) is window:
+                emit(window, key_str)
+                del active[key_str]
+
+    def feed(self, events):
+        active, expiry, emit = self.active, self.expiry, self.emit
+        stats = runstats.STATS
+        seq, max_ts = self.opened, self.max_ts
+        try:
+            for entry, evt_ts in events:
+                if max_ts is None or evt_ts > max_ts:
+                    if stats is not None:
+                        stats.peak("windows_active", len(active))
+                    self.max_ts = max_ts = evt_ts
+                    self._expire(max_ts - self.lateness - WINDOW)
+
+                key_str = best_key(entry)
+                rank = SEV_RANK[entry["severity"]]
+                window = active.get(key_str)
+                if window is not None and evt_ts - window.start <= WINDOW:
+                    # Inside window
+                    window.add(entry, evt_ts, rank)
+                    continue
+
+                if window is not None:
+                    # Window expired. Emit, then start a new one.
+                    emit(window, key_str)
+                window = Window(entry, evt_ts, rank)
+                active[key_str] = window
+                heapq.heappush(expiry, (evt_ts, seq, window, key_str))
+                seq += 1
+        finally:
+            self.opened = seq
+
+    def advance(self, ts):
+        # Move the watermark as if an event at ts had arrived, e.g. by the
+        # clock when a live stream goes quiet
+        if self.max_ts is None or ts > self.max_ts:
+            self.max_ts = ts
+            self._expire(ts - self.lateness - WINDOW)
+
+    def close(self):
+        # Flush the remaining windows in the order they opened
+        active, expiry, emit = self.active, self.expiry, self.emit
+        while expiry:
+            _, _, window, key_str = heapq.heappop(expiry)
+            if active.get(key_str) is window:
+                emit(window, key_str)
+                del active[key_str]
+
+def process_files_streaming(paths, lateness=ALLOWED_LATENESS):
+    # Same suppression as process_files, but rows are printed as soon as their
+    # window closes instead of being sorted at the end (see Suppressor)
+    suppressor = Suppressor(runstats.timed("output", print_record), lateness)
+    suppressor.feed(runstats.timed_iter("read", read_files(paths)))
+    suppressor.close()
+    runstats.count("rows_out", suppressor.opened)
+
+def parse_lateness(value):
+    # --lateness MINUTES -> timedelta, from 0 up to MAX_LATENESS. A negative
+    # lateness would close windows before they are up.
+    minutes = float(value)
+    if not 0 <= minutes <= MAX_LATENESS / timedelta(minutes=1):
+        raise ValueError(value)
+    return timedelta(minutes=minutes)
+
 def main():
-    if len(sys.argv) != 2:
-        print(f"Usage: {sys.argv[0]} <alerts.log>")
+    args = sys.argv[1:]
+    stream = linereader.pop_flag(args, "--stream")
+    try:
+        lateness = linereader.pop_option(args, "--lateness", parse_lateness)
+        workers = linereader.pop_option(args, "--workers", int)
+        stats = linereader.pop_option(args, "--stats", str)
+    except ValueError:
+        args = []
+    if (not args or (workers is not None and (workers < 1 or stream))
+            or stats not in (None, *runstats.REPORT_FORMATS)):
+        print(f"Usage: {sys.argv[0]} [--stream [--lateness MINUTES] | --workers N] "
+              f"[--stats table|prometheus] <alerts.log|glob>...")
         sys.exit(1)
-    process_file(sys.argv[1])
+
+    paths = linereader.expand_paths(args)
+    if workers is None and not stream and len(paths) > 1 and (os.cpu_count() or 1) > 1:
+        # Several files: spread them over the CPUs unless told otherwise
+        workers = linereader.default_workers(paths)
+    if stats:
+        runstats.enable()
+    # With --stats, whatever the stages inside don't account for is the
+    # suppression windows themselves
+    with runstats.stage("window"):
+        if stream:
+            process_files_streaming(paths, ALLOWED_LATENESS if lateness is None else lateness)
+        elif workers:
+            process_files_parallel(paths, workers)
+        else:
+            process_files(paths)
+    runstats.report(stats, "chatgptversion")
 
 if __name__ == "__main__":
     main()
@@ -1,27 +1,217 @@
-import rearrange
-import json
 import sys
+import json
+import math
+from collections import Counter
+
+import linereader
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Schema profile of a JSON array or JSON-lines file of objects: for each
+# top-level key, how many objects have it, the types of its values, how
+# often it is null and roughly how many distinct values it takes.
+#
+#   python3 importTest.py [--format table|json] <input.json|input.jsonl>
+#
+# The input is streamed (linereader.iter_records) and nothing is kept per
+# row beyond a batch: key and type counts go into Counters and distinct
+# values into a small sketch per key, so memory is bounded by the number of
+# distinct keys. Used to pick which fields the fast decoders should pull.
+OUTPUT_FORMATS = ("table", "json")
+TYPE_NAMES = {str: "string", int: "integer", float: "number", bool: "boolean",
+              type(None): "null", dict: "object", list: "array"}
+# Values are gathered per key for this many rows, then counted and
+# sketched a column at a time
+BATCH_SIZE = 4096
+
+# HyperLogLog with 2**12 one-byte registers: about 1.6% standard error
+HLL_PRECISION = 12
+# Up to this many distinct values a key's count is exact (a set of the
+# values) before its sketch switches to registers
+EXACT_LIMIT = 64
+_MASK64 = (1 << 64) - 1
+
+_CONTAINERS = frozenset((list, dict))
+
+def _value_keys(values):
+    # Each value together with its type, so 1, 1.0, "1" and true count
+    # apart; lists and objects are keyed by their JSON
+    types = list(map(type, values))
+    if _CONTAINERS.isdisjoint(types):
+        return list(zip(types, values))
+    return [(t, json.dumps(v, sort_keys=True) if t in _CONTAINERS else v) for t, v in zip(types, values)]
+
+class DistinctSketch:
+    # Distinct-value estimate for one key: exact up to EXACT_LIMIT values,
+    # then a HyperLogLog of 2**precision registers. Only the registers work
+    # on hashes: hash() values, so estimates are for one process, run
+    # through the splitmix64 finalizer first, since int hashes are nearly
+    # the identity.
+    __slots__ = ("precision", "exact", "registers")
+
+    def __init__(self, precision=HLL_PRECISION):
+        self.precision = precision
+        self.exact = set()
+        self.registers = None
+
+    def update(self, values):
+        keys = _value_keys(values)
+        if self.exact is not None:
+            self.exact.update(keys)
+            if len(self.exact) <= EXACT_LIMIT:
+                return
+            keys = self.exact
+            self.exact = None
+            self.registers = bytearray(1 << self.precision)
+        self._add_hashes(list(map(hash, keys)))
+
+    def _add_hashes(self, hashes):
+        # The first precision bits of a mixed hash pick a register, which
+        # keeps the longest run of leading zeros (+1) seen in the rest
+        bits = 64 - self.precision
+        low = (1 << bits) - 1
+        if np is not None:
+            h = np.array(hashes, dtype=np.int64).view(np.uint64)
+            h ^= h >> np.uint64(30)
+            h *= np.uint64(0xbf58476d1ce4e5b9)
+            h ^= h >> np.uint64(27)
+            h *= np.uint64(0x94d049bb133111eb)
+            h ^= h >> np.uint64(31)
+            # bit_length of the low bits, exact in a float64 as bits <= 52
+            _, lengths = np.frexp((h & np.uint64(low)).astype(np.float64))
+            ranks = (bits + 1 - lengths).astype(np.uint8)
+            np.maximum.at(np.frombuffer(self.registers, dtype=np.uint8),
+                          (h >> np.uint64(bits)).astype(np.intp), ranks)
+            return
+        registers = self.registers
+        for h in hashes:
+            h &= _MASK64
+            h = (h ^ (h >> 30)) * 0xbf58476d1ce4e5b9 & _MASK64
+            h = (h ^ (h >> 27)) * 0x94d049bb133111eb & _MASK64
+            h ^= h >> 31
+            rank = bits + 1 - (h & low).bit_length()
+            i = h >> bits
+            if rank > registers[i]:
+                registers[i] = rank
+
+    def is_exact(self):
+        return self.exact is not None
+
+    def estimate(self):
+        if self.exact is not None:
+            return len(self.exact)
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * m and zeros:
+            # Small range: linear counting is more accurate
+            return round(m * math.log(m / zeros))
+        return round(raw)
+
+class SchemaProfile:
+    # Per-key statistics over a stream of objects. Each row's values are
+    # only appended to their key's list; counting and sketching happen in
+    # flush(), a whole column at a time.
+    def __init__(self, batch_size=BATCH_SIZE):
+        self.batch_size = batch_size
+        self.rows = 0
+        self.skipped = 0                # values that were not objects, bad lines
+        self.key_counts = Counter()     # key -> objects having it
+        self.type_counts = {}           # key -> Counter of value types
+        self.sketches = {}              # key -> DistinctSketch
+        self._pending = {}              # key -> values not counted yet
+        self._pending_rows = 0
+
+    def add(self, obj):
+        if type(obj) is not dict:
+            self.skipped += 1
+            return
+        pending = self._pending
+        for key, value in obj.items():
+            values = pending.get(key)
+            if values is None:
+                pending[key] = [value]
+            else:
+                values.append(value)
+        self._pending_rows += 1
+        if self._pending_rows >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        self.rows += self._pending_rows
+        for key, values in self._pending.items():
+            self.key_counts[key] += len(values)
+            types = self.type_counts.get(key)
+            if types is None:
+                types = self.type_counts[key] = Counter()
+                self.sketches[key] = DistinctSketch()
+            types.update(map(type, values))
+            self.sketches[key].update(values)
+        self._pending = {}
+        self._pending_rows = 0
+
+    def keys(self):
+        # One dict per key, most common first
+        self.flush()
+        result = []
+        for key, count in sorted(self.key_counts.items(), key=lambda item: (-item[1], item[0])):
+            key_types = {TYPE_NAMES.get(t, t.__name__): n for t, n in self.type_counts[key].most_common()}
+            sketch = self.sketches[key]
+            result.append({
+                "key": key,
+                "count": count,
+                "present": count / self.rows,
+                "null_rate": key_types.get("null", 0) / count,
+                "distinct": sketch.estimate(),
+                "distinct_exact": sketch.is_exact(),
+                "types": key_types,
+            })
+        return result
+
+def print_table(profile):
+    keys = profile.keys()
+    print(f"rows: {profile.rows:,}  skipped: {profile.skipped:,}")
+    width = max([len(k["key"]) for k in keys] + [3])
+    print(f"{'key':{width}}  {'present':>8}  {'null':>7}  {'distinct':>11}  types")
+    for k in keys:
+        distinct = f"{k['distinct']:,}" if k["distinct_exact"] else f"~{k['distinct']:,}"
+        types = ", ".join(f"{name} {n / k['count']:.1%}" for name, n in k["types"].items())
+        print(f"{k['key']:{width}}  {k['present']:8.2%}  {k['null_rate']:7.2%}  {distinct:>11}  {types}")
 
 def main():
-    rearrange.arg_check()
-    myFile=rearrange.getFile()
-    #print(myFile)
-    k_list=[]
-    k_count=1
+    args = sys.argv[1:]
     try:
-        with open(myFile,mode='r') as f:
-            data_list = json.load(f)
-    except:
+        fmt = linereader.pop_option(args, "--format", str)
+    except ValueError:
+        args = []
+    if len(args) != 1 or fmt not in (None, *OUTPUT_FORMATS):
+        print(f"Usage: python3 {sys.argv[0]} [--format table|json] <input.json|input.jsonl>")
+        sys.exit(1)
+    myFile = args[0]
+
+    profile = SchemaProfile()
+
+    def report_bad_line(line_no):
+        profile.skipped += 1
+
+    try:
+        for obj in linereader.iter_records(myFile, on_error=report_bad_line):
+            profile.add(obj)
+    except (OSError, ValueError):
         print("could not open file: "+myFile)
         sys.exit(1)
-    for data in data_list:
-        keys = data.keys()
-        for k in keys:
-                k_list.append(k)
-    k_list.sort()
-    print(k_list)
+
+    if fmt == "json":
+        keys = profile.keys()
+        print(json.dumps({"rows": profile.rows, "skipped": profile.skipped, "keys": keys}))
+    else:
+        print_table(profile)
 
 
 
 if __name__=="__main__":
-    main()
\ No newline at end of file
+    main()
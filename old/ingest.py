@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+# Live ingest server: takes newline-delimited JSON over TCP and/or a Unix
+# socket and runs the alert suppression of chatGPTversion.py --stream and the
+# health checks of logParse.py on it as it arrives. A line with a "severity"
+# is an alert; one with all of logParse.REQUIRED_KEYS is a heartbeat;
+# anything else is skipped. An alert row is written as soon as its window
+# closes and a heartbeat row as soon as an agent's health changes (as
+# logParse.py --follow reports it), in the tools' own formats (CSV for
+# alerts, key=value for heartbeats) or as JSON lines with --format json.
+#
+#   python3 ingest.py [--tcp [HOST:]PORT] [--unix PATH] [--output FILE|-] [--format text|json]
+#                     [--lateness MINUTES] [--thresholds FILE] [--wall-clock]
+#                     [--stats table|prometheus]
+#   python3 ingest_load.py 5170        # drive it with generated events
+#
+# Backpressure: each connection is read a chunk at a time, and the next
+# read only happens once the chunk has been processed and its rows written
+# out (drained, when the output is a pipe or socket). Until then the socket
+# buffers fill and the producer's writes block, so a fast producer is held
+# to the rate the server, and whatever reads its output, can keep up with,
+# and memory stays bounded however far behind it is.
+#
+# Windows close on event time: the watermark is the newest ts seen minus the
+# lateness (chatGPTversion.Suppressor). With --wall-clock the clock moves it
+# too, once a second, so windows still close when a live stream goes quiet;
+# leave it off when replaying old logs. On SIGINT or SIGTERM the server stops
+# accepting, drops its connections, writes every window still open and
+# exits. A ts without an offset is taken as UTC, so that events from
+# different producers can always be compared.
+import os
+import sys
+import json
+import stat
+import signal
+import asyncio
+from datetime import datetime, timezone
+
+import linereader
+import runstats
+import logParse
+import chatGPTversion as cgv
+
+DEFAULT_PORT = 5170
+OUTPUT_FORMATS = ("text", "json")
+# Bytes read from a connection at a time; the connection's buffer holds
+# about twice this before the socket stops being read
+READ_SIZE = 256 * 1024
+# A producer that sends a longer line than this is disconnected
+MAX_LINE = 1 << 20
+# --wall-clock: how often the clock moves the watermark (seconds)
+TICK_INTERVAL = 1.0
+# Parsed timestamps remembered; events of the same second share one
+TS_CACHE_SIZE = 4096
+
+_HEARTBEAT_KEYS = frozenset(logParse.REQUIRED_KEYS)
+
+def parse_ts(ts_str):
+    # chatGPTversion.parse_ts, with no offset meaning UTC
+    ts = cgv.parse_ts(ts_str)
+    return ts if ts.tzinfo is not None else ts.replace(tzinfo=timezone.utc)
+
+def cached_parse_ts(maxsize=TS_CACHE_SIZE):
+    # parse_ts remembering its last few thousand results; a stream repeats
+    # the same ts string for every event in the same second
+    cache = {}
+
+    def parse(ts_str):
+        ts = cache.get(ts_str)
+        if ts is None:
+            ts = parse_ts(ts_str)
+            if len(cache) >= maxsize:
+                cache.clear()
+            cache[ts_str] = ts
+        return ts
+    return parse
+
+class Output:
+    # Rows are collected as text and written out after each chunk of input.
+    # On a pipe, socket or terminal they go through an asyncio transport and
+    # flush() waits while the reader is behind; a regular file is written
+    # directly.
+    def __init__(self, f, writer=None):
+        self._file = f
+        self._writer = writer
+        self._parts = []
+        self.write = self._parts.append
+
+    @classmethod
+    async def open(cls, path):
+        if path == "-":
+            f = os.fdopen(os.dup(sys.stdout.fileno()), "wb", buffering=0)
+        else:
+            f = open(path, "wb", buffering=0)
+        if stat.S_ISREG(os.fstat(f.fileno()).st_mode):
+            return cls(f)
+        loop = asyncio.get_running_loop()
+        transport, protocol = await loop.connect_write_pipe(asyncio.streams.FlowControlMixin, f)
+        return cls(f, asyncio.StreamWriter(transport, protocol, None, loop))
+
+    async def flush(self):
+        if not self._parts:
+            return
+        data = "".join(self._parts).encode("utf-8")
+        self._parts.clear()
+        if self._writer is None:
+            self._file.write(data)
+        else:
+            self._writer.write(data)
+            await self._writer.drain()
+
+    async def close(self):
+        await self.flush()
+        if self._writer is not None:
+            self._writer.close()
+        else:
+            self._file.close()
+
+class Ingest:
+    # The processing every connection shares: one set of suppression windows
+    # and one health state, whichever producer an event came from
+    def __init__(self, out, fmt="text", lateness=cgv.ALLOWED_LATENESS,
+                 thresholds=logParse.DEFAULT_THRESHOLDS):
+        self.out = out
+        self.fmt = fmt
+        self.suppressor = cgv.Suppressor(runstats.timed("output", self.write_alert), lateness)
+        self.health = logParse.HealthTracker(thresholds)
+        self.rows = logParse.RowWriter(out, "json" if fmt == "json" else "kv")
+        self.connections = set()
+        # --stats: decoding, validation with timestamp parsing, the windows
+        # and the health checks are stages of their own
+        self._loads = runstats.timed("json", linereader.fast_loads)
+        parse = runstats.timed("timestamp", cached_parse_ts())
+        self._validate = runstats.timed("validate", lambda entry: cgv.validate_entry(entry, parse))
+        self._suppress = runstats.timed("window", self.suppressor.feed)
+        self._check = runstats.timed("health", self.health.changes)
+
+    def write_alert(self, window, key_str):
+        if self.fmt == "json":
+            self.out.write(json.dumps({"ts": window.ts_str, "hostname": window.hostname,
+                                       "agent_id": window.agent_id, "key": key_str,
+                                       "severity": window.severity, "suppressed": window.suppressed}) + "\n")
+        else:
+            self.out.write(f"{window.ts_str},{window.hostname},{window.agent_id},"
+                           f"{key_str},{window.severity},{window.suppressed}\n")
+
+    def feed(self, lines):
+        # Run a chunk of lines (bytes, without their newlines) through both
+        # checks; the rows they produce are left in the output
+        loads = self._loads
+        validate = self._validate
+        heartbeat_keys = _HEARTBEAT_KEYS
+        alerts = []
+        heartbeats = []
+        invalid = skipped = 0
+        for line in lines:
+            try:
+                entry = loads(line)
+            except Exception:
+                # Blank, padded with odd whitespace, or really bad
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = linereader.loads(line)
+                except ValueError:
+                    invalid += 1
+                    continue
+            if type(entry) is not dict:
+                skipped += 1
+            elif "severity" in entry:
+                evt_ts = validate(entry)
+                if evt_ts is None:
+                    skipped += 1
+                else:
+                    alerts.append((entry, evt_ts))
+            elif entry.keys() >= heartbeat_keys:
+                heartbeats.append(entry)
+            else:
+                skipped += 1
+
+        self._suppress(alerts)
+        write = self.rows.write
+        for entry, mask in self._check(heartbeats):
+            write(entry["ts"], entry["hostname"], entry["agent_id"], mask)
+
+        stats = runstats.STATS
+        if stats is not None:
+            stats.count("lines_read", len(lines))
+            stats.count("lines_invalid", invalid)
+            stats.count("lines_skipped", skipped)
+            stats.count("alerts", len(alerts))
+            stats.count("heartbeats", len(heartbeats))
+
+    async def handle(self, reader, writer):
+        # One producer's connection, until it closes it. Once everything it
+        # sent has been processed and written out the connection is closed,
+        # so a producer that half-closes (shuts down writing) can wait for
+        # EOF to know its events are in.
+        task = asyncio.current_task()
+        self.connections.add(task)
+        runstats.count("connections")
+        tail = b""
+        try:
+            while True:
+                chunk = await reader.read(READ_SIZE)
+                if not chunk:
+                    break
+                lines = (tail + chunk).split(b"\n")
+                tail = lines.pop()
+                if len(tail) > MAX_LINE:
+                    peer = writer.get_extra_info("peername") or "unix socket"
+                    print(f"Dropping {peer}: line longer than {MAX_LINE} bytes", file=sys.stderr)
+                    return
+                self.feed(lines)
+                await self.out.flush()
+            if tail:
+                self.feed([tail])
+                await self.out.flush()
+        except ConnectionError:
+            pass
+        finally:
+            self.connections.discard(task)
+            writer.close()
+
+    async def tick(self, interval=TICK_INTERVAL):
+        # --wall-clock: close the windows the clock says are over
+        while True:
+            await asyncio.sleep(interval)
+            self.suppressor.advance(datetime.now(timezone.utc))
+            await self.out.flush()
+
+    async def close(self):
+        # Drop the connections still open, then write every open window
+        for task in list(self.connections):
+            task.cancel()
+        await asyncio.gather(*self.connections, return_exceptions=True)
+        self.suppressor.close()
+        await self.out.close()
+
+def parse_address(value):
+    # "PORT" or "HOST:PORT" -> (host, port); the host defaults to localhost
+    host, _, port = value.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+async def serve(tcp, unix, out_path, fmt, lateness, thresholds, wall_clock):
+    out = await Output.open(out_path)
+    ingest = Ingest(out, fmt, lateness, thresholds)
+    servers = []
+    if tcp:
+        servers.append(await asyncio.start_server(ingest.handle, *tcp, limit=READ_SIZE))
+        print(f"Listening on {tcp[0]}:{tcp[1]}", file=sys.stderr)
+    if unix:
+        # A socket file left behind by an earlier run would be in the way
+        if os.path.exists(unix) and stat.S_ISSOCK(os.stat(unix).st_mode):
+            os.unlink(unix)
+        servers.append(await asyncio.start_unix_server(ingest.handle, unix, limit=READ_SIZE))
+        print(f"Listening on {unix}", file=sys.stderr)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+    ticker = asyncio.create_task(ingest.tick()) if wall_clock else None
+    try:
+        await stop.wait()
+    finally:
+        for server in servers:
+            server.close()
+        if ticker is not None:
+            ticker.cancel()
+        await ingest.close()
+        if unix and os.path.exists(unix):
+            os.unlink(unix)
+
+def main():
+    args = sys.argv[1:]
+    wall_clock = linereader.pop_flag(args, "--wall-clock")
+    try:
+        tcp = linereader.pop_option(args, "--tcp", parse_address)
+        unix = linereader.pop_option(args, "--unix", str)
+        output = linereader.pop_option(args, "--output", str)
+        fmt = linereader.pop_option(args, "--format", str)
+        lateness = linereader.pop_option(args, "--lateness", cgv.parse_lateness)
+        thresholds_file = linereader.pop_option(args, "--thresholds", str)
+        stats = linereader.pop_option(args, "--stats", str)
+    except ValueError:
+        args = None
+    if (args != [] or "" in (unix, output) or fmt not in (None, *OUTPUT_FORMATS)
+            or stats not in (None, *runstats.REPORT_FORMATS)):
+        print(f"Usage: {sys.argv[0]} [--tcp [HOST:]PORT] [--unix PATH] [--output FILE|-] [--format text|json] "
+              f"[--lateness MINUTES] [--thresholds FILE] [--wall-clock] [--stats table|prometheus]")
+        sys.exit(1)
+    if tcp is None and unix is None:
+        tcp = ("127.0.0.1", DEFAULT_PORT)
+    if output is None:
+        output = "-"
+    if fmt is None:
+        fmt = "text"
+
+    thresholds = logParse.DEFAULT_THRESHOLDS
+    if thresholds_file:
+        try:
+            thresholds = logParse.Thresholds.load(thresholds_file)
+        except (OSError, ValueError) as e:
+            print(f"Could not load thresholds from {thresholds_file}: {e}")
+            sys.exit(1)
+
+    if lateness is None:
+        lateness = cgv.ALLOWED_LATENESS
+
+    if stats:
+        runstats.enable()
+    try:
+        asyncio.run(serve(tcp, unix, output, fmt, lateness, thresholds, wall_clock))
+    except OSError as e:
+        # Could not listen or open the output, or its reader went away
+        print(f"{sys.argv[0]}: {e}", file=sys.stderr)
+        sys.exit(1)
+    runstats.report(stats, "ingest")
+
+if __name__ == "__main__":
+    main()
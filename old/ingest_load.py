@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# Load generator for ingest.py: sends generated alerts and heartbeats over
+# one or more connections as fast as the server will take them, and reports
+# events/sec. Each connection half-closes once it has sent its share and
+# waits for the server to close it, which the server does after processing
+# everything, so the time covers the processing and not just the sending.
+#
+#   python3 ingest_load.py [--events N] [--connections N] [--kind alerts|heartbeats|mixed]
+#                          [--seed N] [HOST:]PORT|SOCKET_PATH
+#
+#   python3 ingest.py --output /dev/null --stats table &
+#   python3 ingest_load.py --events 2000000 5170
+#
+# Events are generated before the clock starts. Their timestamps advance
+# about 200ms per event across all connections, as on a busy feed, so
+# suppression windows open and close as they would live. About 0.1% of
+# lines are bad JSON.
+import sys
+import json
+import time
+import random
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import linereader
+import ingest
+
+DEFAULT_EVENTS = 1_000_000
+KINDS = ("alerts", "heartbeats", "mixed")
+# Share of alerts in a mixed stream
+MIXED_ALERT_SHARE = 0.8
+# Lines per write
+BLOCK_LINES = 2000
+START = datetime(2025, 11, 12, tzinfo=timezone.utc)
+SEVERITIES = ("low", "medium", "high", "critical")
+STATUSES = ("ok",) * 90 + ("degraded",) * 6 + ("error",) * 4
+HOSTS = 5000
+
+def alert_line(rnd, ts):
+    host = rnd.randint(1, HOSTS)
+    r = rnd.random()
+    return json.dumps({
+        "ts": ts,
+        "hostname": f"host-{host:04d}",
+        "agent_id": f"a{host}",
+        "threat_id": f"t-{rnd.randint(1, 500)}" if r < 0.6 else None,
+        "sha256": f"{rnd.getrandbits(32):08x}" if r < 0.3 else None,
+        "severity": rnd.choice(SEVERITIES),
+        "confidence": rnd.randint(0, 100),
+    })
+
+def heartbeat_line(rnd, ts):
+    agent = rnd.randrange(HOSTS)
+    return json.dumps({
+        "ts": ts,
+        "agent_id": f"agent-{agent:04d}",
+        "hostname": f"host-{agent:04d}",
+        "status": rnd.choice(STATUSES),
+        "cpu_pct": round(rnd.uniform(0, 100), 1),
+        "mem_pct": round(rnd.uniform(10, 100), 1),
+        "last_checkin_sec": rnd.randint(0, 400),
+    }, separators=(",", ":"))
+
+def generate(events, connections, kind, seed):
+    # Per connection, its events as blocks of bytes. Event k goes to
+    # connection k % connections, so together they move forward in time.
+    rnd = random.Random(seed)
+    alert_share = {"alerts": 1.0, "heartbeats": 0.0, "mixed": MIXED_ALERT_SHARE}[kind]
+    lines = [[] for _ in range(connections)]
+    ts_strings = {}
+    for k in range(events):
+        second = k // 5
+        ts = ts_strings.get(second)
+        if ts is None:
+            ts_strings.clear()
+            ts = ts_strings[second] = (START + timedelta(seconds=second)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        if rnd.random() < 0.001:
+            line = "{oops!--}"
+        elif rnd.random() < alert_share:
+            line = alert_line(rnd, ts)
+        else:
+            line = heartbeat_line(rnd, ts)
+        lines[k % connections].append(line)
+    return [["".join(line + "\n" for line in own[i:i + BLOCK_LINES]).encode()
+             for i in range(0, len(own), BLOCK_LINES)] for own in lines]
+
+async def send(target, blocks):
+    if isinstance(target, str):
+        reader, writer = await asyncio.open_unix_connection(target)
+    else:
+        reader, writer = await asyncio.open_connection(*target)
+    for block in blocks:
+        writer.write(block)
+        # Blocks here while the server is behind
+        await writer.drain()
+    writer.write_eof()
+    # The server closes the connection once it has processed everything
+    await reader.read()
+    writer.close()
+
+async def run(target, per_connection):
+    start = time.perf_counter()
+    await asyncio.gather(*(send(target, blocks) for blocks in per_connection))
+    return time.perf_counter() - start
+
+def parse_target(value):
+    # A path (anything with a "/") is a Unix socket, else [HOST:]PORT
+    return value if "/" in value else ingest.parse_address(value)
+
+def main():
+    args = sys.argv[1:]
+    try:
+        events = linereader.pop_option(args, "--events", int)
+        connections = linereader.pop_option(args, "--connections", int)
+        kind = linereader.pop_option(args, "--kind", str)
+        seed = linereader.pop_option(args, "--seed", int)
+        target = parse_target(args[0]) if len(args) == 1 else None
+    except ValueError:
+        target = None
+    if (target is None or kind not in (None, *KINDS) or (events is not None and events < 1)
+            or (connections is not None and connections < 1)):
+        print(f"Usage: {sys.argv[0]} [--events N] [--connections N] [--kind alerts|heartbeats|mixed] "
+              f"[--seed N] [HOST:]PORT|SOCKET_PATH")
+        sys.exit(1)
+    if events is None:
+        events = DEFAULT_EVENTS
+    if connections is None:
+        connections = 1
+    if kind is None:
+        kind = "mixed"
+
+    per_connection = generate(events, connections, kind, 42 if seed is None else seed)
+    size = sum(len(block) for blocks in per_connection for block in blocks)
+    try:
+        seconds = asyncio.run(run(target, per_connection))
+    except OSError as e:
+        print(f"Could not connect: {e}")
+        sys.exit(1)
+    print(f"{events:,} events ({size / 1e6:,.1f} MB) over {connections} connection(s) in {seconds:.2f}s: "
+          f"{events / seconds:,.0f} events/sec")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,633 @@
+#!/usr/bin/env python3
+# Shared JSON-lines reading for the log tools (logParse, chatGPTversion,
+# testTimesort, alert), plus the bits of plumbing they have in common:
+# tailing a live file, checkpoints, command-line options, many input files.
+#
+# The file is read in large binary chunks and split on b"\n", so lines are
+# never decoded to str on the way in. Each line is handed to the fastest JSON
+# decoder available: orjson, then msgspec, then the stdlib json module. All of
+# them accept bytes directly.
+#
+# Files ending in .gz or .zst are decompressed on the fly as they are read
+# (.zst needs the zstandard package). The memory-mapped scanners read those
+# as a stream of line-aligned blocks instead.
+#
+#   python3 linereader.py <file.log>    # lines/sec of this reader vs the old loop
+import os
+import re
+import sys
+import glob
+import codecs
+import gzip
+import json
+import mmap
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import runstats
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CHUNK_SIZE = 1 << 20
+
+if orjson is not None:
+    BACKEND = "orjson"
+    _fast_loads = orjson.loads
+elif msgspec is not None:
+    BACKEND = "msgspec"
+    _fast_loads = msgspec.json.decode
+else:
+    BACKEND = "json"
+    _fast_loads = None
+
+def loads(data):
+    # Decode one JSON document from bytes. Raises ValueError if it is not
+    # valid JSON. The fast decoders are stricter than json about a few things
+    # (NaN/Infinity, huge integers), so a line they reject is retried with
+    # json before it counts as bad; the set of accepted lines stays the same.
+    if _fast_loads is not None:
+        try:
+            return _fast_loads(data)
+        except Exception:
+            # orjson raises a ValueError subclass, msgspec its own DecodeError
+            pass
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    try:
+        return json.loads(data)
+    except RecursionError:
+        raise ValueError("JSON nested too deeply")
+
+# What iter_json tries first on each line, with loads() as the careful
+# fallback for the lines it rejects
+fast_loads = _fast_loads or json.loads
+
+COMPRESSED_SUFFIXES = (".gz", ".zst")
+
+def is_compressed(path):
+    return path.endswith(COMPRESSED_SUFFIXES)
+
+def open_binary(path):
+    # Open a log for reading bytes, decompressing .gz and .zst as it is read
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise OSError(f"{path}: reading .zst files needs the zstandard package")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+    return open(path, "rb")
+
+def _line_blocks(path, chunk_size=CHUNK_SIZE):
+    # The (decompressed) bytes of a file in blocks of about chunk_size that
+    # end on line boundaries, for the scanners when a file can't be mapped
+    tail = b""
+    with open_binary(path) as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            cut = chunk.rfind(b"\n") + 1
+            if cut == 0:
+                tail += chunk
+                continue
+            yield tail + chunk[:cut]
+            tail = chunk[cut:]
+    if tail:
+        yield tail
+
+def iter_lines(path, chunk_size=CHUNK_SIZE, skip_blank=True):
+    # Yield (line_no, stripped bytes) for every line, leaving out blank ones
+    # unless skip_blank is False. line_no is 1-based and counts blank lines,
+    # like enumerate(f, start=1).
+    stats = runstats.STATS
+    line_no = 0
+    tail = b""
+    with open_binary(path) as f:
+        read = f.read if stats is None else stats.timed("io", f.read)
+        while True:
+            chunk = read(chunk_size)
+            if not chunk:
+                break
+            lines = (tail + chunk).split(b"\n")
+            tail = lines.pop()
+            for line in lines:
+                line_no += 1
+                line = line.strip()
+                if line or not skip_blank:
+                    yield line_no, line
+    if tail:
+        line_no += 1
+        tail = tail.strip()
+        if tail or not skip_blank:
+            yield line_no, tail
+    if stats is not None:
+        stats.count("lines_read", line_no)
+
+def iter_json(path, on_error=None, chunk_size=CHUNK_SIZE, skip_blank=True):
+    # Yield (line_no, decoded object) for every line that is valid JSON.
+    # Bad lines are skipped; on_error(line_no) is called for each if given,
+    # so every tool keeps its own message (or lack of one). With
+    # skip_blank=False blank lines count as bad lines too.
+    #
+    # This is iter_lines and loads inlined into one loop: the per-line
+    # generator and function call overhead is a large share of the cost.
+    # With --stats on, reads and decodes are timed as the "io" and "json"
+    # stages, and lines read and bad lines are counted.
+    fast_loads = _fast_loads or json.loads
+    slow_loads = loads
+    stats = runstats.STATS
+    if stats is not None:
+        fast_loads = stats.timed("json", fast_loads)
+        slow_loads = stats.timed("json", loads)
+        on_error = stats.counted("lines_invalid", on_error)
+    line_no = 0
+    tail = b""
+    with open_binary(path) as f:
+        read = f.read if stats is None else stats.timed("io", f.read)
+        while True:
+            chunk = read(chunk_size)
+            if chunk:
+                lines = (tail + chunk).split(b"\n")
+                tail = lines.pop()
+            elif tail:
+                lines = [tail]
+                tail = b""
+            else:
+                break
+            for line in lines:
+                line_no += 1
+                try:
+                    obj = fast_loads(line)
+                except Exception:
+                    # Blank, padded with odd whitespace, or really bad
+                    line = line.strip()
+                    if not line and skip_blank:
+                        continue
+                    try:
+                        obj = slow_loads(line)
+                    except ValueError:
+                        if on_error is not None:
+                            on_error(line_no)
+                        continue
+                yield line_no, obj
+    if stats is not None:
+        stats.count("lines_read", line_no)
+
+def scan(path, prefilter=None):
+    # Yield (line_no, memoryview) for every line where prefilter(view) is true
+    # (every line if there is no prefilter). The file is memory-mapped and each
+    # view points into the mapping without its newline, so a line is never
+    # copied unless the caller copies it. A view is only valid until the
+    # generator finishes. Compiled bytes regexes can search views directly,
+    # which makes them good cheap prefilters.
+    if is_compressed(path):
+        line_no = 0
+        for block in _line_blocks(path):
+            lines = block.split(b"\n")
+            if block.endswith(b"\n"):
+                lines.pop()
+            for line in lines:
+                line_no += 1
+                if prefilter is None or prefilter(line):
+                    yield line_no, memoryview(line)
+        return
+    with open(path, "rb") as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped
+            return
+    view = memoryview(mm)
+    find = mm.find
+    size = len(mm)
+    pos = 0
+    line_no = 0
+    line = None
+    try:
+        while pos < size:
+            end = find(b"\n", pos)
+            if end < 0:
+                end = size
+            line_no += 1
+            line = view[pos:end]
+            if prefilter is None or prefilter(line):
+                yield line_no, line
+            pos = end + 1
+    finally:
+        del line
+        view.release()
+        try:
+            mm.close()
+        except BufferError:
+            # The caller still holds a view; the mapping goes when it does
+            pass
+
+def _match_lines(buf, pattern):
+    # (line_no, start, end) of each line of buf holding a match, line_no
+    # counted from 1 at the start of buf
+    search = pattern.search
+    size = len(buf)
+    pos = 0
+    line_no = 1
+    counted = 0
+    while pos < size:
+        match = search(buf, pos)
+        if match is None:
+            break
+        start = buf.rfind(b"\n", pos, match.start()) + 1
+        if start == 0:
+            start = pos
+        # The line the match starts on, even if \s in the pattern ran on
+        end = buf.find(b"\n", match.start())
+        if end < 0:
+            end = size
+        # Line numbers: count the newlines skipped since the last match, a
+        # chunk at a time, as an mmap has no count() and slicing the whole
+        # gap would copy it into memory
+        while counted < start:
+            stop = min(counted + CHUNK_SIZE, start)
+            line_no += buf[counted:stop].count(b"\n")
+            counted = stop
+        yield line_no, start, end
+        pos = end + 1
+
+def scan_matches(path, pattern):
+    # Yield (line_no, memoryview) for every line containing a match of the
+    # compiled bytes regex `pattern`. The regex runs over the whole mapping,
+    # so lines without a match are skipped inside the regex engine and cost
+    # no Python work at all. Same view lifetime rules as scan().
+    if is_compressed(path):
+        first = 0
+        for block in _line_blocks(path):
+            view = memoryview(block)
+            for line_no, start, end in _match_lines(block, pattern):
+                yield first + line_no, view[start:end]
+            first += block.count(b"\n")
+        return
+    with open(path, "rb") as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return
+    view = memoryview(mm)
+    line = None
+    try:
+        for line_no, start, end in _match_lines(mm, pattern):
+            line = view[start:end]
+            yield line_no, line
+    finally:
+        del line
+        view.release()
+        try:
+            mm.close()
+        except BufferError:
+            pass
+
+def findall_chunks(path, pattern, chunk_size=16 * CHUNK_SIZE):
+    # Yield pattern.findall() over the memory-mapped file, one list per chunk
+    # of about chunk_size bytes. Chunks end on line boundaries, so a pattern
+    # that stays within a line never misses a match, and only one chunk's
+    # results are alive at a time. Reducing each list with a builtin (max,
+    # len, set) keeps a whole-file pass almost entirely in C.
+    if is_compressed(path):
+        for block in _line_blocks(path, chunk_size):
+            yield pattern.findall(block)
+        return
+    with open(path, "rb") as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return
+    with mm:
+        findall = pattern.findall
+        size = len(mm)
+        pos = 0
+        while pos < size:
+            end = mm.find(b"\n", min(pos + chunk_size, size))
+            end = size if end < 0 else end + 1
+            yield findall(mm, pos, end)
+            pos = end
+
+def iter_json_scan(path, pattern, on_error=None, skip_blank=True):
+    # iter_json over scan_matches(): only lines matching `pattern` are decoded,
+    # so a cheap candidate pattern lets most lines go by without decoding.
+    # Lines that don't match are never looked at, so they are not reported to
+    # on_error even if they are not valid JSON.
+    fast_loads = _fast_loads or loads
+    for line_no, line in scan_matches(path, pattern):
+        try:
+            obj = fast_loads(line)
+        except Exception:
+            stripped = line.tobytes().strip()
+            if not stripped and skip_blank:
+                continue
+            try:
+                obj = loads(stripped)
+            except ValueError:
+                if on_error is not None:
+                    on_error(line_no)
+                continue
+        yield line_no, obj
+
+# iter_array gives up on an element (as malformed) once this much of the
+# file has been buffered without it decoding
+MAX_ELEMENT_SIZE = 64 << 20
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_NUMBER_TAIL = re.compile(r"[0-9.eE+-]*\Z")
+_SEPARATOR = re.compile(r"[ \t\n\r]*,[ \t\n\r]*")
+
+def iter_array(path, chunk_size=CHUNK_SIZE, max_element=MAX_ELEMENT_SIZE):
+    # Yield the elements of a file holding one JSON array, one at a time,
+    # without loading the array: the file is decoded chunk by chunk and each
+    # element is parsed out of the buffer with the json module's raw_decode.
+    # Memory is bounded by a chunk plus the largest element. Raises
+    # ValueError if the file is not a single JSON array.
+    raw_decode = json.JSONDecoder().raw_decode
+    skip = _WHITESPACE.match
+    separator = _SEPARATOR.match
+    number_tail = _NUMBER_TAIL.match
+    text = codecs.getincrementaldecoder("utf-8")()
+    buf = ""
+    pos = 0
+    eof = False
+    started = False    # "[" seen
+    want_value = True  # next is a value (or "]" for an empty array), not "," / "]"
+    first = True
+    with open_binary(path) as f:
+        while True:
+            pos = skip(buf, pos).end()
+            if pos < len(buf):
+                c = buf[pos]
+                if not started:
+                    if c != "[":
+                        raise ValueError("not a JSON array")
+                    started = True
+                    pos += 1
+                    continue
+                if want_value and not (first and c == "]"):
+                    # Elements and the commas between them, for as long as
+                    # the buffer holds whole ones
+                    while True:
+                        try:
+                            obj, end = raw_decode(buf, pos)
+                        except json.JSONDecodeError as e:
+                            if eof or len(buf) - pos > max_element:
+                                raise ValueError(f"bad JSON array element: {e}")
+                            break
+                        # A number that the buffer cuts off may go on in the next chunk
+                        if not eof and type(obj) in (int, float) and number_tail(buf, end):
+                            break
+                        yield obj
+                        first = False
+                        found = separator(buf, end)
+                        if found is None:
+                            pos = end
+                            want_value = False
+                            break
+                        pos = found.end()
+                    if not want_value:
+                        continue
+                elif c == "," and not want_value:
+                    want_value = True
+                    pos += 1
+                    continue
+                elif c == "]":
+                    pos = skip(buf, pos + 1).end()
+                    if pos < len(buf) or f.read(chunk_size).strip():
+                        raise ValueError("data after the JSON array")
+                    return
+                else:
+                    raise ValueError(f"unexpected {c!r} in JSON array")
+            # Out of buffered text part way through: read on
+            if eof:
+                raise ValueError("unterminated JSON array")
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buf = buf[pos:] + text.decode(chunk, final=eof)
+            pos = 0
+
+def iter_records(path, on_error=None):
+    # The values in a file holding either one JSON array or JSON lines,
+    # told apart by the first non-blank byte: with "[" the file is read by
+    # iter_array (and a JSON-lines file whose first line is an array can't
+    # be read this way), otherwise by iter_json with on_error as there.
+    with open_binary(path) as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            head = chunk.lstrip()
+            if head or not chunk:
+                break
+    if head.startswith(b"["):
+        return iter_array(path)
+    return (obj for _, obj in iter_json(path, on_error=on_error))
+
+FOLLOW_POLL_INTERVAL = 0.25
+
+def follow(path, offset=0, inode=None, poll_interval=FOLLOW_POLL_INTERVAL):
+    # Tail a file that is still being written, forever. Yields
+    # (inode, offset, line) for each complete line, where offset is the byte
+    # position just after it, i.e. where to resume. Also yields None after
+    # each batch of lines and whenever it has caught up with the writer:
+    # that is the moment to flush output or save a checkpoint.
+    #
+    # Rotation (path now names a different file) is handled by finishing the
+    # old file and then reading the new one from the start. Truncation (the
+    # file got shorter than what was read) restarts at offset 0. To resume
+    # from a checkpoint pass its offset and inode: if the inode no longer
+    # matches, the file was rotated in the meantime and is read from 0.
+    f = None
+    pending = b""
+    rotated = False
+    try:
+        while True:
+            if f is None:
+                try:
+                    f = open(path, "rb")
+                except FileNotFoundError:
+                    yield None
+                    time.sleep(poll_interval)
+                    continue
+                st = os.fstat(f.fileno())
+                if (inode is not None and st.st_ino != inode) or st.st_size < offset:
+                    offset = 0
+                inode = st.st_ino
+                f.seek(offset)
+                pending = b""
+
+            chunk = f.read(CHUNK_SIZE)
+            if chunk:
+                lines = (pending + chunk).split(b"\n")
+                pending = lines.pop()
+                for line in lines:
+                    offset += len(line) + 1
+                    yield inode, offset, line
+                yield None
+                continue
+
+            if rotated:
+                # The old file is drained; an unterminated last line is
+                # as complete as it will ever get
+                if pending:
+                    offset += len(pending)
+                    yield inode, offset, pending
+                f.close()
+                f = None
+                offset = 0
+                inode = None
+                rotated = False
+                continue
+
+            yield None
+            time.sleep(poll_interval)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                # Moved away and not recreated yet: keep reading the old one
+                continue
+            if st.st_ino != inode:
+                rotated = True
+            elif st.st_size < f.tell():
+                f.seek(0)
+                offset = 0
+                pending = b""
+    finally:
+        if f is not None:
+            f.close()
+
+def follow_json(path, on_error=None, offset=0, inode=None, poll_interval=FOLLOW_POLL_INTERVAL):
+    # follow() with each line decoded: yields (inode, offset, object), and
+    # None at batch boundaries. Blank lines are skipped; for a bad line
+    # on_error(offset) is called with the byte offset the line starts at.
+    for item in follow(path, offset, inode, poll_interval):
+        if item is None:
+            yield None
+            continue
+        inode, end, raw = item
+        try:
+            obj = loads(raw)
+        except ValueError:
+            line = raw.strip()
+            if not line:
+                continue
+            try:
+                obj = loads(line)
+            except ValueError:
+                if on_error is not None:
+                    on_error(max(0, end - len(raw) - 1))
+                continue
+        yield inode, end, obj
+
+def load_checkpoint(path):
+    # The dict saved by save_checkpoint, or None if there is no usable one
+    try:
+        with open(path, "rb") as f:
+            data = loads(f.read())
+    except (OSError, ValueError):
+        return None
+    return data if isinstance(data, dict) else None
+
+def save_checkpoint(path, data):
+    # Write data as JSON via a temp file and rename, so a crash mid-write
+    # leaves the previous checkpoint in place
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+def pop_flag(args, name):
+    # Remove a bare --flag from args; True if it was there
+    if name not in args:
+        return False
+    args.remove(name)
+    return True
+
+def pop_option(args, name, convert):
+    # Remove "name value" from args and return convert(value), or None if
+    # the option is absent. Raises ValueError if the value is missing/bad.
+    if name not in args:
+        return None
+    i = args.index(name)
+    if i + 1 >= len(args):
+        raise ValueError(name)
+    value = convert(args[i + 1])
+    del args[i:i + 2]
+    return value
+
+def expand_paths(patterns):
+    # Command-line paths and glob patterns -> the files to read: each
+    # pattern's matches sorted, in argument order, without repeats. A
+    # pattern that matches nothing is kept as is, so opening it reports
+    # the missing file.
+    paths = []
+    seen = set()
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else []
+        for path in matches or [pattern]:
+            if path not in seen:
+                seen.add(path)
+                paths.append(path)
+    return paths
+
+def default_workers(paths):
+    # One process per file, up to one per CPU
+    return max(1, min(len(paths), os.cpu_count() or 1))
+
+def map_files(fn, paths, workers=None):
+    # Yield fn(path) for each path, in path order. With more than one path
+    # and worker the calls run in a process pool, so fn and its results
+    # must pickle (a module-level function, or functools.partial of one).
+    workers = default_workers(paths) if workers is None else workers
+    if workers <= 1 or len(paths) <= 1:
+        yield from map(fn, paths)
+        return
+    with ProcessPoolExecutor(max_workers=min(workers, len(paths))) as pool:
+        yield from runstats.pool_map(pool, fn, paths)
+
+def _old_loop(path):
+    # The per-line str decode + json.loads loop the tools used before
+    count = 0
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            count += 1
+    return count
+
+def main():
+    if len(sys.argv) != 2:
+        print(f"Usage: {sys.argv[0]} <file.log>")
+        sys.exit(1)
+    path = sys.argv[1]
+
+    start = time.perf_counter()
+    old_count = _old_loop(path)
+    old_secs = time.perf_counter() - start
+
+    start = time.perf_counter()
+    new_count = sum(1 for _ in iter_json(path))
+    new_secs = time.perf_counter() - start
+
+    print(f"backend: {BACKEND}")
+    print(f"old loop:   {old_count / old_secs:12,.0f} lines/sec")
+    print(f"linereader: {new_count / new_secs:12,.0f} lines/sec ({old_secs / new_secs:.1f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,25 @@
+import io
+import re
+import csv
 import sys
 import json
+import time
+import heapq
+import pickle
+import tempfile
+import signal
+import fnmatch
+import operator
+import functools
+import itertools
+
+import linereader
+import runstats
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 REQUIRED_KEYS = (
     "ts",
@@ -11,28 +31,88 @@ REQUIRED_KEYS = (
     "last_checkin_sec",
 )
 
+# Default cpu_pct, mem_pct and last_checkin_sec limits
+DEFAULT_LIMITS = (85, 90, 300)
+
+class Thresholds:
+    # Health limits per hostname: rules are (glob, cpu, mem, checkin) and the
+    # first glob matching a hostname wins; other hosts get DEFAULT_LIMITS.
+    # limits[index(hostname)] is the (cpu, mem, checkin) triple for a host.
+    __slots__ = ("patterns", "limits", "_index")
+
+    def __init__(self, rules=()):
+        self.patterns = [rule[0] for rule in rules]
+        self.limits = [DEFAULT_LIMITS] + [tuple(rule[1:]) for rule in rules]
+        self._index = {}
+
+    @classmethod
+    def load(cls, path):
+        # A JSON list of rules like
+        #   {"hostname": "db-*", "cpu_pct": 95, "last_checkin_sec": 600}
+        # where a limit left out keeps its default. Raises ValueError if
+        # the file is not like that.
+        with open(path, "rb") as f:
+            config = linereader.loads(f.read())
+        if not isinstance(config, list):
+            raise ValueError("thresholds must be a JSON list")
+        rules = []
+        for rule in config:
+            if not isinstance(rule, dict) or not isinstance(rule.get("hostname"), str):
+                raise ValueError(f"bad threshold rule: {rule!r}")
+            limits = [rule.get(k, d) for k, d in zip(("cpu_pct", "mem_pct", "last_checkin_sec"), DEFAULT_LIMITS)]
+            if any(type(v) not in (int, float) for v in limits):
+                raise ValueError(f"bad threshold rule: {rule!r}")
+            rules.append((rule["hostname"], *limits))
+        return cls(rules)
+
+    def index(self, hostname):
+        if not self.patterns:
+            return 0
+        key = str(hostname)
+        i = self._index.get(key)
+        if i is None:
+            i = next((n + 1 for n, p in enumerate(self.patterns) if fnmatch.fnmatchcase(key, p)), 0)
+            self._index[key] = i
+        return i
+
+    def indexes(self, hostnames):
+        # index() of each hostname; string hostnames seen before are a
+        # single dict lookup each, done in C
+        if not self.patterns:
+            return [0] * len(hostnames)
+        try:
+            found = list(map(self._index.get, hostnames))
+        except TypeError:
+            found = [None] * len(hostnames)
+        if None in found:
+            found = [self.index(h) if i is None else i for i, h in zip(found, hostnames)]
+        return found
+
+DEFAULT_THRESHOLDS = Thresholds()
+
 ########################################
 
-def get_unhealthy_reasons(entry):
+def get_unhealthy_reasons(entry, thresholds=DEFAULT_THRESHOLDS):
     reasons = []
+    cpu_limit, mem_limit, checkin_limit = thresholds.limits[thresholds.index(entry.get("hostname"))]
 
     if entry.get("status") != "ok":
         reasons.append("status_not_ok")
 
     try:
-        if float(entry.get("cpu_pct", 0)) > 85:
+        if float(entry.get("cpu_pct", 0)) > cpu_limit:
             reasons.append("high_cpu")
     except (TypeError, ValueError):
         pass
 
     try:
-        if float(entry.get("mem_pct", 0)) > 90:
+        if float(entry.get("mem_pct", 0)) > mem_limit:
             reasons.append("high_mem")
     except (TypeError, ValueError):
         pass
 
     try:
-        if int(entry.get("last_checkin_sec", 0)) > 300:
+        if int(entry.get("last_checkin_sec", 0)) > checkin_limit:
             reasons.append("stale_checkin")
     except (TypeError, ValueError):
         pass
@@ -40,44 +120,477 @@ def get_unhealthy_reasons(entry):
     return reasons
 ########################################
 
+# Batch evaluation: the same checks as get_unhealthy_reasons for a chunk of
+# entries at once. Each field becomes a column, the comparisons run over
+# whole columns (with NumPy when it is installed), and the reasons come out
+# as a bitmask per row. A value get_unhealthy_reasons would skip (TypeError
+# or ValueError on conversion) becomes NaN, which fails every comparison.
+STATUS_NOT_OK = 1
+HIGH_CPU = 2
+HIGH_MEM = 4
+STALE_CHECKIN = 8
+REASON_NAMES = ("status_not_ok", "high_cpu", "high_mem", "stale_checkin")
+# The reasons= string for each mask
+REASON_STRINGS = tuple(",".join(name for bit, name in enumerate(REASON_NAMES) if mask >> bit & 1)
+                       for mask in range(1 << len(REASON_NAMES)))
+BATCH_SIZE = 4096
 
-def main():
-    if len(sys.argv) != 2:
-        print(f"Usage: {sys.argv[0]} <logfile>")
-        sys.exit(1)
+_NAN = float("nan")
+_PLAIN_NUMBERS = {int, float}
+# int() results beyond this are clamped; only the comparison matters
+_INT_CLAMP = 2 ** 63
+
+def _float_or_nan(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return _NAN
 
-    logfile = sys.argv[1]
-    unhealthy = []
+def _int_or_nan(value):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return _NAN
+    return float(max(-_INT_CLAMP, min(value, _INT_CLAMP)))
 
-    with open(logfile, "r") as f:
-        for line_no, line in enumerate(f, start=1):
-            line = line.strip()
-            if not line:
-                continue
+def _float_column(values):
+    # float() of each value. A column of plain numbers converts in one go.
+    if np is not None and set(map(type, values)) <= _PLAIN_NUMBERS:
+        return np.array(values, dtype=np.float64)
+    column = [_float_or_nan(v) for v in values]
+    return np.array(column, dtype=np.float64) if np is not None else column
+
+def _int_column(values):
+    # int() of each value, as floats
+    if np is not None and set(map(type, values)) <= _PLAIN_NUMBERS:
+        column = np.trunc(np.array(values, dtype=np.float64))
+        if np.isinf(column).any():
+            # What int() raises, as get_unhealthy_reasons would
+            raise OverflowError("cannot convert float infinity to integer")
+        return column
+    column = [_int_or_nan(v) for v in values]
+    return np.array(column, dtype=np.float64) if np is not None else column
+
+_COLUMN_GETTERS = tuple(operator.itemgetter(k) for k in ("status", "hostname", "cpu_pct", "mem_pct", "last_checkin_sec"))
+
+def to_columns(entries, thresholds=DEFAULT_THRESHOLDS):
+    # A chunk of entries as (status_not_ok, cpu_pct, mem_pct,
+    # last_checkin_sec, limits index) columns
+    try:
+        status, hostnames, cpu, mem, checkin = (list(map(get, entries)) for get in _COLUMN_GETTERS)
+    except KeyError:
+        # A field is missing somewhere: same defaults as get_unhealthy_reasons
+        status = [e.get("status") for e in entries]
+        hostnames = [e.get("hostname") for e in entries]
+        cpu = [e.get("cpu_pct", 0) for e in entries]
+        mem = [e.get("mem_pct", 0) for e in entries]
+        checkin = [e.get("last_checkin_sec", 0) for e in entries]
+    status = list(map(operator.ne, status, itertools.repeat("ok")))
+    limit_index = thresholds.indexes(hostnames)
+    cpu = _float_column(cpu)
+    mem = _float_column(mem)
+    checkin = _int_column(checkin)
+    if np is not None:
+        status = np.array(status, dtype=np.uint8)
+        limit_index = np.array(limit_index, dtype=np.intp)
+    return status, cpu, mem, checkin, limit_index
+
+def reason_masks(columns, thresholds=DEFAULT_THRESHOLDS):
+    # Reason bitmask per row of to_columns() output
+    status, cpu, mem, checkin, limit_index = columns
+    if np is not None:
+        limits = np.array(thresholds.limits, dtype=np.float64)[limit_index]
+        masks = status * np.uint8(STATUS_NOT_OK)
+        masks |= (cpu > limits[:, 0]) * np.uint8(HIGH_CPU)
+        masks |= (mem > limits[:, 1]) * np.uint8(HIGH_MEM)
+        masks |= (checkin > limits[:, 2]) * np.uint8(STALE_CHECKIN)
+        return masks
+    limits = thresholds.limits
+    return [s * STATUS_NOT_OK | (c > limits[i][0]) * HIGH_CPU | (m > limits[i][1]) * HIGH_MEM
+            | (k > limits[i][2]) * STALE_CHECKIN
+            for s, c, m, k, i in zip(status, cpu, mem, checkin, limit_index)]
+
+def flag_unhealthy(entries, thresholds=DEFAULT_THRESHOLDS):
+    # (entry, reason mask) for the unhealthy entries of a chunk, in order
+    if not entries:
+        return []
+    masks = reason_masks(to_columns(entries, thresholds), thresholds)
+    if np is not None:
+        rows = np.flatnonzero(masks)
+        return list(zip(map(entries.__getitem__, rows.tolist()), masks[rows].tolist()))
+    return [(entry, mask) for entry, mask in zip(entries, masks) if mask]
+
+# Byte-level pre-filter for --prefilter. Matches anywhere a line might be
+# unhealthy: a backslash (could hide an escaped key), a status other than
+# "ok", or a cpu/mem/checkin value that is not a plain JSON number within its
+# threshold (quoted, true/false/null, exponents, too many digits all count).
+# A line with no match has every health field it contains healthy, so
+# get_unhealthy_reasons would return nothing for it with the default limits.
+_NUM_FRACTION = rb"(?:\.\d{1,12})?"
+_NEGATIVE = rb"-(?:0|[1-9]\d{0,11})" + _NUM_FRACTION
+_FIELD_END = rb"\s*[,}]"
+MAYBE_UNHEALTHY = re.compile(
+    rb'\\|"(?:'
+    rb'status"\s*:(?!\s*"ok"' + _FIELD_END + rb")"
+    rb'|cpu_pct"\s*:(?!\s*(?:' + _NEGATIVE
+    + rb"|(?:0|[1-9]|[1-7]\d|8[0-4])" + _NUM_FRACTION + rb"|85(?:\.0{1,12})?)" + _FIELD_END + rb")"
+    rb'|mem_pct"\s*:(?!\s*(?:' + _NEGATIVE
+    + rb"|(?:0|[1-9]|[1-8]\d)" + _NUM_FRACTION + rb"|90(?:\.0{1,12})?)" + _FIELD_END + rb")"
+    rb'|last_checkin_sec"\s*:(?!\s*(?:' + _NEGATIVE
+    + rb"|(?:0|[1-9]\d?|[12]\d\d|300)" + _NUM_FRACTION + rb")" + _FIELD_END + rb")"
+    rb")"
+)
+
+# --follow saves its checkpoint at most this often (seconds)
+CHECKPOINT_INTERVAL = 1.0
+
+# Output: unhealthy rows are kept as compact records and only turned into
+# text by a RowWriter when written. Formats are key=value lines (the
+# original output), JSON lines, and CSV with a header row.
+OUTPUT_FORMATS = ("kv", "json", "csv")
+CSV_HEADER = ("timestamp", "hostname", "agent_id", "reasons")
+# RowSorter keeps at most this many rows in memory before spilling a run
+MAX_ROWS_IN_MEMORY = 1_000_000
+_SPILL_BLOCK = 10_000
+_OUTPUT_BUFFER = 1 << 20
+
+def reason_mask(reasons):
+    # get_unhealthy_reasons' list as a bitmask
+    mask = 0
+    for reason in reasons:
+        mask |= 1 << REASON_NAMES.index(reason)
+    return mask
+
+class HealthTracker:
+    # Per-agent health state for a stream taken a batch at a time (--follow,
+    # ingest.py). changes() gives (entry, mask) for each entry that
+    # changes its agent's health: the new reasons when it turns unhealthy or
+    # its reasons change, 0 when it recovers. Only currently unhealthy agents
+    # are kept.
+    def __init__(self, thresholds=DEFAULT_THRESHOLDS):
+        self.thresholds = thresholds
+        self.unhealthy = {}  # agent_id -> reason mask last reported
+
+    def _masks(self, entries):
+        try:
+            masks = reason_masks(to_columns(entries, self.thresholds), self.thresholds)
+        except OverflowError:
+            # An infinite last_checkin_sec, which get_unhealthy_reasons
+            # raises on too: check the batch row by row and leave those out
+            masks = []
+            for entry in entries:
+                try:
+                    masks.append(reason_mask(get_unhealthy_reasons(entry, self.thresholds)))
+                except OverflowError:
+                    masks.append(None)
+            return masks
+        return masks.tolist() if np is not None else masks
+
+    def changes(self, entries):
+        if not entries:
+            return []
+        unhealthy = self.unhealthy
+        changed = []
+        for entry, mask in zip(entries, self._masks(entries)):
+            agent = str(entry["agent_id"])
+            if mask:
+                if unhealthy.get(agent) != mask:
+                    unhealthy[agent] = mask
+                    changed.append((entry, mask))
+            elif mask is not None and agent in unhealthy:
+                del unhealthy[agent]
+                changed.append((entry, 0))
+        return changed
+
+class RowWriter:
+    # Formats rows as they are written. A mask of 0 is an agent that has
+    # recovered (--follow), written as reasons=ok / [] / "ok".
+    def __init__(self, out, fmt="kv"):
+        self.out = out
+        self.fmt = fmt
+        self._csv = None
+        if fmt == "csv":
+            self._csv = csv.writer(out, lineterminator="\n")
+            self._csv.writerow(CSV_HEADER)
+
+    def write(self, ts, hostname, agent_id, mask):
+        if self.fmt == "kv":
+            reasons = REASON_STRINGS[mask] if mask else "ok"
+            self.out.write(f"timestamp={ts} hostname={hostname} agent_id={agent_id} reasons={reasons}\n")
+        elif self.fmt == "json":
+            reasons = [name for bit, name in enumerate(REASON_NAMES) if mask >> bit & 1]
+            self.out.write(json.dumps({"timestamp": ts, "hostname": hostname, "agent_id": agent_id,
+                                       "reasons": reasons}) + "\n")
+        else:
+            self._csv.writerow((ts, hostname, agent_id, REASON_STRINGS[mask] if mask else "ok"))
 
+    def write_all(self, records):
+        # Records as yielded by RowSorter; returns how many were written
+        write = self.write
+        n = 0
+        for n, (_, ts, hostname, agent_id, mask) in enumerate(records, 1):
+            write(ts, hostname, agent_id, mask)
+        return n
+
+def buffered_stdout():
+    # A text stream over stdout's file descriptor with a large buffer, so
+    # rows go out in big writes. Anything already printed is flushed first.
+    sys.stdout.flush()
+    try:
+        fd = sys.stdout.fileno()
+    except (AttributeError, io.UnsupportedOperation):
+        return sys.stdout
+    return open(fd, "w", buffering=_OUTPUT_BUFFER, encoding=sys.stdout.encoding,
+                errors=sys.stdout.errors, newline="", closefd=False)
+
+_ROW_KEY = operator.itemgetter(0)
+
+def _read_run(path):
+    with open(path, "rb") as f:
+        while True:
             try:
-                entry = json.loads(line)
-            except json.JSONDecodeError:
-                # In a real script you might log this somewhere
-                print(f"Skipping invalid JSON at line {line_no}")
+                block = pickle.load(f)
+            except EOFError:
+                return
+            yield from block
+
+class RowSorter:
+    # Collects unhealthy rows as (hostname key, ts, hostname, agent_id, mask)
+    # tuples and hands them back ordered by hostname, ties in input order.
+    # The key is worked out once per row, and repeated hostnames and agent
+    # ids share one string. Once max_rows rows are held, they are sorted
+    # and pickled to a temp file as a run; the runs are heap-merged on the
+    # way out, so memory stays bounded for large outputs. Runs go in
+    # spill_dir if given (the caller cleans it up), else a private temp dir.
+    def __init__(self, max_rows=MAX_ROWS_IN_MEMORY, spill_dir=None):
+        self.max_rows = max_rows
+        self.rows = []
+        self.runs = []
+        self._names = {}
+        self._spill_dir = spill_dir
+        self._tmpdir = None
+
+    def _shared(self, value):
+        if type(value) is not str:
+            return value
+        return self._names.setdefault(value, value)
+
+    def add(self, ts, hostname, agent_id, mask):
+        hostname = self._shared(hostname)
+        self.rows.append((str(hostname), ts, hostname, self._shared(agent_id), mask))
+        if len(self.rows) >= self.max_rows:
+            self.spill()
+
+    def spill(self):
+        # Write the rows held so far out as a sorted run
+        if not self.rows:
+            return
+        self.rows.sort(key=_ROW_KEY)
+        if self._spill_dir is None:
+            self._tmpdir = tempfile.TemporaryDirectory(prefix="logparse_")
+            self._spill_dir = self._tmpdir.name
+        fd, path = tempfile.mkstemp(prefix="run", dir=self._spill_dir)
+        with open(fd, "wb") as f:
+            for i in range(0, len(self.rows), _SPILL_BLOCK):
+                pickle.dump(self.rows[i:i + _SPILL_BLOCK], f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.runs.append(path)
+        self.rows = []
+        self._names = {}
+
+    def __iter__(self):
+        # Both sorts are stable, and merge prefers earlier runs on ties
+        self.rows.sort(key=_ROW_KEY)
+        if not self.runs:
+            return iter(self.rows)
+        return heapq.merge(*(_read_run(p) for p in self.runs), self.rows, key=_ROW_KEY)
+
+    def close(self):
+        if self._tmpdir is not None:
+            self._tmpdir.cleanup()
+            self._tmpdir = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def merge_rows(parts):
+    # Merge the (runs, rows) RowSorter contents of several files, given in
+    # file order, into one stream ordered as if the files had been one log:
+    # by hostname, ties in file order and then line order
+    streams = []
+    for runs, rows in parts:
+        streams.extend(_read_run(p) for p in runs)
+        streams.append(rows)
+    return heapq.merge(*streams, key=_ROW_KEY)
+
+def check_file(logfile, spill_dir, thresholds=DEFAULT_THRESHOLDS, prefilter=False,
+               max_rows=MAX_ROWS_IN_MEMORY, keep_rows=True):
+    # Check one log. Returns (bad line numbers, runs, rows): the unhealthy
+    # rows sorted as RowSorter sorts them, split between run files in
+    # spill_dir and rows still in memory. With keep_rows=False every row is
+    # spilled, which is how a worker process hands back a large result
+    # without pickling it through the pool.
+    bad_lines = []
+    if prefilter:
+        # Healthy-looking lines are skipped undecoded; a malformed line
+        # among them is not reported
+        entries = linereader.iter_json_scan(logfile, MAYBE_UNHEALTHY, on_error=bad_lines.append)
+    else:
+        entries = linereader.iter_json(logfile, on_error=bad_lines.append)
+
+    # --stats: the loop's own time is "validate", flagging is "flag" and
+    # sorting and spilling the rows is "sort"
+    entries = runstats.timed_iter("read", entries)
+    flag = runstats.timed("flag", flag_unhealthy)
+    unhealthy = RowSorter(max_rows, spill_dir)
+    add = runstats.timed("sort", unhealthy.add)
+    batch = []
+    with runstats.stage("validate"):
+        for _, entry in entries:
+            if any(k not in entry for k in REQUIRED_KEYS):
+                runstats.count("lines_skipped")
                 continue
 
+            batch.append(entry)
+            if len(batch) >= BATCH_SIZE:
+                for flagged, mask in flag(batch, thresholds):
+                    add(flagged["ts"], flagged["hostname"], flagged["agent_id"], mask)
+                batch = []
+        for flagged, mask in flag(batch, thresholds):
+            add(flagged["ts"], flagged["hostname"], flagged["agent_id"], mask)
+
+    with runstats.stage("sort"):
+        if not keep_rows:
+            unhealthy.spill()
+        unhealthy.rows.sort(key=_ROW_KEY)
+    runstats.count("runs_spilled", len(unhealthy.runs))
+    return bad_lines, unhealthy.runs, unhealthy.rows
+
+def follow_file(logfile, checkpoint=None, thresholds=DEFAULT_THRESHOLDS, fmt="kv"):
+    # --follow: tail the log and print a row whenever an agent's health
+    # changes: the usual row when it turns unhealthy or its reasons change,
+    # and one with reasons=ok when it recovers. Only currently unhealthy
+    # agents are kept in memory. With a checkpoint file, the byte offset and
+    # that state are saved about once a second and picked up on restart.
+    tracker = HealthTracker(thresholds)
+    offset, inode = 0, None
+    if checkpoint:
+        saved = linereader.load_checkpoint(checkpoint)
+        if saved is not None:
+            offset = saved.get("offset", 0)
+            inode = saved.get("inode")
+            tracker.unhealthy = saved.get("unhealthy", {})
+
+    # Same stream as the bad-line messages, flushed after every batch
+    writer = RowWriter(sys.stdout, fmt)
+
+    def report_bad_line(start):
+        print(f"Skipping invalid JSON at byte {start}")
+
+    def save():
+        linereader.save_checkpoint(checkpoint, {"file": logfile, "inode": inode, "offset": offset,
+                                                "unhealthy": tracker.unhealthy})
+
+    # Ctrl-C and SIGTERM stop at the next batch boundary (within a poll
+    # interval), so the offset saved is always the one the state is at
+    stopping = []
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda signum, frame: stopping.append(signum))
+    saved_at = (inode, offset)
+    last_save = time.monotonic()
+    # Entries are checked a batch at a time, and the offset only moves past
+    # a batch once it has been checked
+    batch = []
+    position = (inode, offset)
+    try:
+        for item in linereader.follow_json(logfile, report_bad_line, offset, inode):
+            if item is None:
+                for entry, mask in tracker.changes(batch):
+                    writer.write(entry["ts"], entry["hostname"], entry["agent_id"], mask)
+                batch.clear()
+                inode, offset = position
+                sys.stdout.flush()
+                if stopping:
+                    break
+                if checkpoint and (inode, offset) != saved_at and time.monotonic() - last_save >= CHECKPOINT_INTERVAL:
+                    save()
+                    saved_at = (inode, offset)
+                    last_save = time.monotonic()
+                continue
+            position = item[:2]
+            entry = item[2]
             if any(k not in entry for k in REQUIRED_KEYS):
                 continue
+            batch.append(entry)
+    finally:
+        if checkpoint:
+            save()
+
+def main():
+    args = sys.argv[1:]
+    prefilter = linereader.pop_flag(args, "--prefilter")
+    follow = linereader.pop_flag(args, "--follow")
+    try:
+        checkpoint = linereader.pop_option(args, "--checkpoint", str)
+        thresholds_file = linereader.pop_option(args, "--thresholds", str)
+        fmt = linereader.pop_option(args, "--format", str)
+        max_rows = linereader.pop_option(args, "--max-rows", int)
+        workers = linereader.pop_option(args, "--workers", int)
+        stats = linereader.pop_option(args, "--stats", str)
+    except ValueError:
+        args = []
+    # The prefilter has the default limits built in
+    if (not args or (checkpoint and not follow) or (follow and (prefilter or len(args) != 1 or workers or stats))
+            or (prefilter and thresholds_file) or fmt not in (None, *OUTPUT_FORMATS) or (max_rows is not None and max_rows < 1)
+            or (workers is not None and workers < 1) or stats not in (None, *runstats.REPORT_FORMATS)):
+        print(f"Usage: {sys.argv[0]} [--format kv|json|csv] [--thresholds FILE] [--max-rows N] [--workers N] "
+              f"[--prefilter] [--stats table|prometheus] <logfile|glob>... | --follow [--checkpoint FILE] <logfile>")
+        sys.exit(1)
+
+    thresholds = DEFAULT_THRESHOLDS
+    if thresholds_file:
+        try:
+            thresholds = Thresholds.load(thresholds_file)
+        except (OSError, ValueError) as e:
+            print(f"Could not load thresholds from {thresholds_file}: {e}")
+            sys.exit(1)
+
+    if fmt is None:
+        fmt = "kv"
+    if max_rows is None:
+        max_rows = MAX_ROWS_IN_MEMORY
+
+    if follow:
+        follow_file(args[0], checkpoint, thresholds, fmt)
+        return
+
+    # Each file is checked on its own, in a worker process when there are
+    # several, and their sorted rows are merged. Workers spill all their rows
+    # to the shared temp dir, so only file names come back through the pool.
+    if stats:
+        runstats.enable()
+    paths = linereader.expand_paths(args)
+    with tempfile.TemporaryDirectory(prefix="logparse_") as spill_dir:
+        single = len(paths) == 1
+        check = functools.partial(check_file, spill_dir=spill_dir, thresholds=thresholds,
+                                  prefilter=prefilter, max_rows=max_rows, keep_rows=single)
+        parts = []
+        for logfile, (bad_lines, runs, rows) in zip(paths, linereader.map_files(check, paths, workers)):
+            # In a real script you might log this somewhere
+            for line_no in bad_lines:
+                if single:
+                    print(f"Skipping invalid JSON at line {line_no}")
+                else:
+                    print(f"Skipping invalid JSON at {logfile} line {line_no}")
+            parts.append((runs, rows))
 
-            reasons = get_unhealthy_reasons(entry)
-            if reasons:
-                reason_str = ",".join(reasons)
-                log_str = (
-                    f"timestamp={entry['ts']} "
-                    f"hostname={entry['hostname']} "
-                    f"agent_id={entry['agent_id']} "
-                    f"reasons={reason_str}"
-                )
-                unhealthy.append(log_str)
-
-    for row in sorted(unhealthy, key=lambda x: x.split()[1].split("=")[1]):
-        print(row)
+        with runstats.stage("output"):
+            out = buffered_stdout()
+            runstats.count("rows_out", RowWriter(out, fmt).write_all(merge_rows(parts)))
+            out.flush()
+    runstats.report(stats, "logparse")
 
 if __name__ == "__main__":
     main()
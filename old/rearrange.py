@@ -1,48 +1,157 @@
 import sys
 import json
+from array import array
+
+import linereader
+
+# Group a JSON array of {"host": ..., "status": ...} records by host:
+#
+#   python3 rearrange.py [--compact counts|rle] [--output FILE] <inputFile.json>
+#
+# The array is read one record at a time (linereader.iter_array), so the
+# input can be far larger than memory. Each host's statuses are held
+# run-length encoded as (status code, count) pairs in an array, and each
+# distinct status is kept and serialized once, so memory grows with the
+# number of hosts and status changes, not with the number of records.
+#
+# The result goes to the output file and stdout. By default it is
+# host -> [status, ...]; --compact counts gives host -> {status: count}
+# and --compact rle gives host -> [[status, run length], ...].
+COMPACT_MODES = ("counts", "rle")
+DEFAULT_OUTPUT = "output"
+_OUTPUT_BUFFER = 1 << 20
+# Statuses are written out this many at a time
+_WRITE_BLOCK = 4096
+
+def _key_text(value):
+    # value as a JSON object key, converted the way json.dumps converts keys
+    if isinstance(value, str):
+        return json.dumps(value)
+    return json.dumps(json.dumps(value))
+
+class StatusGroups:
+    # host -> run-length encoded sequence of statuses, in first-seen order
+    def __init__(self):
+        self.runs = {}      # host -> array of code, count, code, count, ...
+        self.texts = []     # status code -> the status as JSON
+        self._codes = {}    # status (or its JSON, if unhashable) -> code
+
+    def _code(self, status):
+        # Strings are looked up as they are, other values with their type so
+        # that 1, 1.0 and true stay apart, and floats (NaN is not equal to
+        # itself) and lists or objects by their JSON
+        if type(status) is str:
+            key = status
+        elif type(status) in (int, bool) or status is None:
+            key = (type(status), status)
+        else:
+            key = (json.dumps(status),)
+        code = self._codes.get(key)
+        if code is None:
+            code = self._codes[key] = len(self.texts)
+            self.texts.append(json.dumps(status))
+        return code
+
+    def add(self, host, status):
+        code = self._codes.get(status) if type(status) is str else None
+        if code is None:
+            code = self._code(status)
+        runs = self.runs.get(host)
+        if runs is None:
+            self.runs[host] = array("Q", (code, 1))
+        elif runs[-2] == code:
+            runs[-1] += 1
+        else:
+            runs.append(code)
+            runs.append(1)
+
+    def statuses(self, host):
+        # The host's status codes, one per record
+        runs = self.runs[host]
+        for i in range(0, len(runs), 2):
+            for _ in range(runs[i + 1]):
+                yield runs[i]
+
+def group(records):
+    # StatusGroups of an iterable of records. A record that is not a dict
+    # with "host" and "status" raises KeyError/TypeError, as before.
+    groups = StatusGroups()
+    add = groups.add
+    for record in records:
+        add(record["host"], record["status"])
+    return groups
 
 def rearrange(myList):
-    new_data={}
-    
-    for dict in myList:
-        if not new_data.get(dict['host']):
-            new_data[dict['host']] = [dict['status']]
+    # host -> [status, ...] for a list of records
+    groups = group(myList)
+    values = [json.loads(text) for text in groups.texts]
+    return {host: [values[code] for code in groups.statuses(host)] for host in groups.runs}
+
+def iter_json_text(groups, compact=None):
+    # The grouped result as JSON text, in pieces, formatted as json.dumps
+    # formats it. Nothing is built up beyond one piece at a time.
+    texts = groups.texts
+    status_keys = None
+    yield "{"
+    for n, (host, runs) in enumerate(groups.runs.items()):
+        yield f"{', ' if n else ''}{_key_text(host)}: "
+        if compact == "counts":
+            # Statuses that give the same key (1 and "1") are counted together
+            if status_keys is None:
+                status_keys = [_key_text(json.loads(text)) for text in texts]
+            counts = {}
+            for i in range(0, len(runs), 2):
+                key = status_keys[runs[i]]
+                counts[key] = counts.get(key, 0) + runs[i + 1]
+            yield "{" + ", ".join(f"{key}: {count}" for key, count in counts.items()) + "}"
+        elif compact == "rle":
+            yield "[" + ", ".join(f"[{texts[runs[i]]}, {runs[i + 1]}]" for i in range(0, len(runs), 2)) + "]"
         else:
-           new_data[dict['host']].append(dict['status'])
-    return new_data
+            yield "["
+            block = []
+            for code in groups.statuses(host):
+                block.append(texts[code])
+                if len(block) >= _WRITE_BLOCK:
+                    yield ", ".join(block) + ", "
+                    block = []
+            yield ", ".join(block) + "]"
+    yield "}"
 
-def arg_check():
-    if len(sys.argv)!=2:
-        print("Usage: python3 "+sys.argv[0]+" <inputFile.json>")
+def write_all(pieces, outs):
+    # Each piece is made once and written to every stream
+    for piece in pieces:
+        for out in outs:
+            out.write(piece)
+
+def arg_check(args):
+    compact = output = None
+    try:
+        compact = linereader.pop_option(args, "--compact", str)
+        output = linereader.pop_option(args, "--output", str)
+    except ValueError:
+        args.clear()
+    if len(args) != 1 or output == "" or (compact is not None and compact not in COMPACT_MODES):
+        print(f"Usage: python3 {sys.argv[0]} [--compact counts|rle] [--output FILE] <inputFile.json>")
         sys.exit(1)
-    
-def getFile():
-    inputFile = sys.argv[1]
-    return inputFile
+    return args[0], DEFAULT_OUTPUT if output is None else output, compact
 
 def main():
-    arg_check()
-    inputFile = getFile()
-    outputfile='output'
+    inputFile, outputfile, compact = arg_check(sys.argv[1:])
 
     try:
-        with open(inputFile,mode='r') as f:
-            input = json.load(f)
-            new_data = rearrange(input)
-    except:
+        groups = group(linereader.iter_array(inputFile))
+    except (OSError, ValueError, KeyError, TypeError):
         print("ERROR opening "+inputFile)
         sys.exit(1)
 
     try:
-        with open(outputfile,mode='w') as j:
-            json.dump(new_data,j)
-    except:
+        with open(outputfile, mode='w', buffering=_OUTPUT_BUFFER) as j:
+            write_all(iter_json_text(groups, compact), (j, sys.stdout))
+    except OSError:
         print("ERROR opening "+outputfile)
         sys.exit(1)
-
-    result = json.dumps(new_data) 
-    print(result)
+    print()
 
 
 if __name__=="__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,235 @@
+# Stage timings and counters for the log tools' --stats report: where the
+# time went (reading, JSON decoding, timestamp parsing, validation, windows,
+# output) and how many lines were read, skipped and invalid.
+#
+# Off unless a tool calls enable(). While STATS is None, timed() and
+# timed_iter() hand back what they were given and count() and peak() return
+# at once, and the tools only call them once per file or batch (or on rare
+# branches), so a run without --stats runs the same per-line code as before.
+#
+# Stage times are exclusive, like a profiler's self time: a stage entered
+# from inside another (a JSON decode inside a read) is taken off the outer
+# one, so the stages of one process add up to at most its wall time. Work
+# done in worker processes comes back through pool_map and is added in, so
+# with workers the stages can add up to more than the wall time.
+#
+# ts_convert/ts_stats.py is the same module for the ts_convert tools, which
+# are run from their own directory and do not import from this one. The two
+# keep the same API; a change to one belongs in the other.
+#
+#   python3 logParse.py --stats table agent_heartbeats.log
+#   python3 chatGPTversion.py --stats prometheus alerts.log
+import sys
+import time
+import contextlib
+import functools
+
+REPORT_FORMATS = ("table", "prometheus")
+
+# The Stats of this run, or None when --stats is off
+STATS = None
+
+class Stats:
+    __slots__ = ("stages", "counters", "peaks", "started", "_inner")
+
+    def __init__(self):
+        self.stages = {}        # stage -> seconds
+        self.counters = {}      # name -> count
+        self.peaks = {}         # name -> highest value seen
+        self.started = time.perf_counter()
+        self._inner = 0.0       # time of the stages inside the current one
+
+    def _enter(self):
+        outer = self._inner
+        self._inner = 0.0
+        return outer, time.perf_counter()
+
+    def _leave(self, stage, mark):
+        outer, start = mark
+        elapsed = time.perf_counter() - start
+        self.stages[stage] = self.stages.get(stage, 0.0) + elapsed - self._inner
+        self._inner = outer + elapsed
+
+    @contextlib.contextmanager
+    def stage(self, stage):
+        mark = self._enter()
+        try:
+            yield
+        finally:
+            self._leave(stage, mark)
+
+    def timed(self, stage, fn):
+        # fn, with the time of each call counted toward stage
+        enter, leave = self._enter, self._leave
+
+        def call(*args, **kwargs):
+            mark = enter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                leave(stage, mark)
+        return call
+
+    def timed_iter(self, stage, iterable):
+        # The items of iterable, with the time spent producing each one
+        # counted toward stage
+        enter, leave = self._enter, self._leave
+        it = iter(iterable)
+        while True:
+            mark = enter()
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+            finally:
+                leave(stage, mark)
+            yield item
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def peak(self, name, value):
+        if name not in self.peaks or value > self.peaks[name]:
+            self.peaks[name] = value
+
+    def counted(self, name, fn):
+        # A callback that counts its calls under name, then calls fn (if any)
+        def call(*args):
+            self.count(name)
+            if fn is not None:
+                fn(*args)
+        return call
+
+    def snapshot(self):
+        # Plain dicts, to send back from a worker process
+        return {"stages": dict(self.stages), "counters": dict(self.counters), "peaks": dict(self.peaks)}
+
+    def merge(self, snapshot):
+        for stage, seconds in snapshot["stages"].items():
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        for name, n in snapshot["counters"].items():
+            self.count(name, n)
+        for name, value in snapshot["peaks"].items():
+            self.peak(name, value)
+
+    def wall(self):
+        return time.perf_counter() - self.started
+
+    def table(self):
+        lines = []
+        total = sum(self.stages.values())
+        names = [*self.stages, *self.counters, *(name + " (peak)" for name in self.peaks)]
+        width = max([len(name) for name in names] + [10])
+        lines.append(f"{'stage':{width}}  {'seconds':>10}  {'share':>6}")
+        for stage, seconds in sorted(self.stages.items(), key=lambda item: -item[1]):
+            share = seconds / total if total else 0.0
+            lines.append(f"{stage:{width}}  {seconds:10.3f}  {share:6.1%}")
+        lines.append(f"{'wall':{width}}  {self.wall():10.3f}")
+        if self.counters or self.peaks:
+            lines.append("")
+            lines.append(f"{'counter':{width}}  {'value':>10}")
+            for name, n in sorted(self.counters.items()):
+                lines.append(f"{name:{width}}  {n:10,}")
+            for name, value in sorted(self.peaks.items()):
+                lines.append(f"{name + ' (peak)':{width}}  {value:10,}")
+        return "\n".join(lines) + "\n"
+
+    def prometheus(self, prefix):
+        # Prometheus text exposition format, for a textfile collector or a
+        # push gateway
+        lines = [
+            f"# HELP {prefix}_stage_seconds_total Time spent in each stage (exclusive).",
+            f"# TYPE {prefix}_stage_seconds_total counter",
+        ]
+        for stage, seconds in sorted(self.stages.items()):
+            lines.append(f'{prefix}_stage_seconds_total{{stage="{stage}"}} {seconds:.6f}')
+        lines.append(f"# TYPE {prefix}_wall_seconds gauge")
+        lines.append(f"{prefix}_wall_seconds {self.wall():.6f}")
+        for name, n in sorted(self.counters.items()):
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {n}")
+        for name, value in sorted(self.peaks.items()):
+            lines.append(f"# TYPE {prefix}_{name}_peak gauge")
+            lines.append(f"{prefix}_{name}_peak {value}")
+        return "\n".join(lines) + "\n"
+
+    def render(self, fmt, prefix):
+        # The report in one of REPORT_FORMATS
+        if fmt not in REPORT_FORMATS:
+            raise ValueError(f"unknown stats format: {fmt}")
+        return self.table() if fmt == "table" else self.prometheus(prefix)
+
+def enable():
+    # Start collecting for this run; returns the new Stats
+    global STATS
+    STATS = Stats()
+    return STATS
+
+def disable():
+    global STATS
+    STATS = None
+
+def get_stats():
+    return STATS
+
+def report(fmt, prefix, out=None):
+    # Write the report to out (stderr, so it never mixes with the output)
+    if STATS is None:
+        return
+    out = sys.stderr if out is None else out
+    out.write(STATS.render(fmt, prefix))
+    out.flush()
+
+# The helpers the tools call. Each is a pass-through while STATS is None.
+
+def stage(name):
+    return STATS.stage(name) if STATS is not None else contextlib.nullcontext()
+
+def timed(stage, fn):
+    return STATS.timed(stage, fn) if STATS is not None else fn
+
+def timed_iter(stage, iterable):
+    return STATS.timed_iter(stage, iterable) if STATS is not None else iterable
+
+def count(name, n=1):
+    if STATS is not None:
+        STATS.count(name, n)
+
+def peak(name, value):
+    if STATS is not None:
+        STATS.peak(name, value)
+
+@contextlib.contextmanager
+def suspended():
+    # Record nothing inside the with block, e.g. for a pre-pass that reads
+    # lines the real pass will count; its time goes to the stage around it
+    global STATS
+    outer = STATS
+    STATS = None
+    try:
+        yield
+    finally:
+        STATS = outer
+
+def collect(fn, *args):
+    # (fn(*args), snapshot of its stats). Run in a worker, so that fn's stats
+    # go into a fresh Stats rather than the copy of the parent's a fork
+    # leaves; the Stats current before is put back, so it works inline too.
+    global STATS
+    outer = STATS
+    STATS = Stats()
+    try:
+        return fn(*args), STATS.snapshot()
+    finally:
+        STATS = outer
+
+def pool_map(pool, fn, *iterables):
+    # pool.map(fn, ...), or map() inline when pool is None, that adds each
+    # call's stats to this process's
+    map_fn = map if pool is None else pool.map
+    if STATS is None:
+        yield from map_fn(fn, *iterables)
+        return
+    for result, snapshot in map_fn(functools.partial(collect, fn), *iterables):
+        STATS.merge(snapshot)
+        yield result
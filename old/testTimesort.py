@@ -1,6 +1,38 @@
 #!/usr/bin/env python3
-import sys, json
-from datetime import datetime, timedelta
+import re
+import sys
+import time
+import signal
+import functools
+from datetime import datetime, timedelta, timezone
+
+import linereader
+import runstats
+
+WINDOW = timedelta(minutes=10)
+# Longest --windows value: the error ring keeps a slot per second of the
+# longest window, so this is about 600k slots
+MAX_WINDOW = timedelta(days=7)
+# --follow saves its checkpoint at most this often (seconds)
+CHECKPOINT_INTERVAL = 1.0
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_EPOCH_NAIVE = datetime(1970, 1, 1)
+
+# The mmap fast path (scan_file) decodes only the lines that can matter for
+# the answer. Most heartbeats have a plain "...Z" timestamp and no error, and
+# those can only move the latest timestamp, whose max is found as bytes:
+# timestamps in this one fixed-width layout sort the same as strings and as
+# times.
+_CANONICAL_TS = rb"\d{4}-\d\d-\d\dT\d\d:\d\d:\d\dZ"
+_CANONICAL_TS_VALUE = re.compile(rb'"ts"\s*:\s*"(' + _CANONICAL_TS + rb')"')
+# Lines that have to be decoded: anything mentioning "error", any escape
+# (it could spell out a key or value), and any ts in another layout
+_MUST_DECODE = (
+    re.compile(rb'"error"'),
+    re.compile(rb"\\"),
+    re.compile(rb'"ts"\s*:\s*"(?!' + _CANONICAL_TS + rb'")'),
+)
 
 def parse_ts(s: str) -> datetime:
     # Accept ISO 8601 with trailing Z
@@ -8,49 +40,326 @@ def parse_ts(s: str) -> datetime:
         s = s[:-1] + "+00:00"
     return datetime.fromisoformat(s)
 
-def main():
-    if len(sys.argv) != 2:
-        print(f"Usage: {sys.argv[0]} <agent_heartbeats.log>")
-        sys.exit(1)
+def check_record(rec, parse=parse_ts):
+    # (ts, agent_id, status) for a usable heartbeat, else None
+    if not isinstance(rec, dict):
+        return None
+    ts_s = rec.get("ts")
+    aid = rec.get("agent_id")
+    status = rec.get("status")
+    if not ts_s or not aid or status is None:
+        return None
+    try:
+        ts = parse(ts_s)
+    except Exception:
+        return None
+    return ts, aid, status
+
+def record_checker():
+    # check_record, or with --stats on one that times validation and
+    # timestamp parsing as stages of their own
+    if runstats.STATS is None:
+        return check_record
+    parse = runstats.timed("timestamp", parse_ts)
+    return runstats.timed("validate", lambda rec: check_record(rec, parse))
+
+class ErrorRing:
+    # Errors of the last `span` before the latest heartbeat, in a ring of
+    # per-`resolution` buckets keyed on epoch time. Each bucket maps agent_id
+    # to its newest error ts in that bucket. Buckets are cleared as `latest`
+    # moves past them, so memory is bounded by the span, not the file, and a
+    # query only walks the buckets its window covers. Heartbeats may arrive
+    # out of order; errors already older than the span are dropped, since
+    # no window can include them again.
+    __slots__ = ("span", "resolution", "latest", "_latest_bucket", "_keys", "_buckets")
+
+    def __init__(self, span=WINDOW, resolution=timedelta(seconds=1)):
+        self.span = span
+        self.resolution = resolution
+        self.latest = None
+        self._latest_bucket = None
+        size = -(-span // resolution) + 1
+        self._keys = [None] * size      # which bucket number each slot holds
+        self._buckets = [None] * size   # agent_id -> newest error ts
+
+    def _bucket(self, ts):
+        return (ts - (_EPOCH if ts.tzinfo is not None else _EPOCH_NAIVE)) // self.resolution
+
+    def observe(self, ts):
+        # Account for a heartbeat at ts (error or not)
+        if self.latest is not None and ts <= self.latest:
+            return
+        bucket = self._bucket(ts)
+        if self._latest_bucket is not None:
+            # Free the slots that the new buckets take over
+            size = len(self._keys)
+            for b in range(self._latest_bucket + 1, min(bucket, self._latest_bucket + size) + 1):
+                self._keys[b % size] = None
+                self._buckets[b % size] = None
+        self.latest = ts
+        self._latest_bucket = bucket
+
+    def add_error(self, ts, aid):
+        self.observe(ts)
+        if ts < self.latest - self.span:
+            return
+        bucket = self._bucket(ts)
+        i = bucket % len(self._keys)
+        if self._keys[i] != bucket:
+            self._keys[i] = bucket
+            self._buckets[i] = {}
+        agents = self._buckets[i]
+        if aid not in agents or ts > agents[aid]:
+            agents[aid] = ts
+
+    def _newest_errors(self, window):
+        # agent_id -> newest error ts, over the buckets window reaches
+        newest = {}
+        if self.latest is None:
+            return newest
+        size = len(self._keys)
+        first = self._bucket(self.latest - min(window, self.span))
+        for b in range(max(first, self._latest_bucket - size + 1), self._latest_bucket + 1):
+            i = b % size
+            if self._keys[i] != b:
+                continue
+            for aid, ts in self._buckets[i].items():
+                if aid not in newest or ts > newest[aid]:
+                    newest[aid] = ts
+        return newest
+
+    def unhealthy(self, window=WINDOW):
+        # Sorted agent ids with an error in [latest - window, latest]
+        return self.unhealthy_many([window])[window]
+
+    def unhealthy_many(self, windows):
+        # {window: sorted agent ids} for several windows in one walk of the
+        # buckets of the largest
+        if self.latest is None:
+            return {w: [] for w in windows}
+        newest = self._newest_errors(max(windows))
+        return {w: sorted(aid for aid, ts in newest.items() if ts >= self.latest - w) for w in windows}
+
+    def errors(self):
+        # (agent_id, ts) for every error held, e.g. for a checkpoint
+        return [(aid, ts) for agents in self._buckets if agents for aid, ts in agents.items()]
 
-    path = sys.argv[1]
-    latest = None
-    errors = []  # store tuples of (ts, agent_id)
+def read_all(path, ring):
+    # Decode every line and feed each usable heartbeat to the ring
+    check = record_checker()
+    for _, rec in runstats.timed_iter("read", linereader.iter_json(path)):
+        checked = check(rec)
+        if checked is None:
+            runstats.count("lines_skipped")
+            continue
+        ts, aid, status = checked
+        if status == "error":
+            ring.add_error(ts, aid)
+        else:
+            ring.observe(ts)
+    return ring
 
-    with open(path, "r", encoding="utf-8") as f:
-        for raw in f:
-            s = raw.strip()
-            if not s:
+def scan_file(path, ring):
+    # Same result as read_all, decoding only the lines _MUST_DECODE picks out
+    # plus the ones holding the largest canonical ts. Returns None when that
+    # largest ts is not the real latest (bad date, not a usable heartbeat),
+    # and the caller falls back to read_all with a fresh ring.
+    # With --stats, the regex passes are the "scan" stage and the lines they
+    # pick out are counted as decoded
+    check = record_checker()
+    loads = runstats.timed("json", linereader.loads)
+    seen = set()
+    for pattern in _MUST_DECODE:
+        for line_no, line in runstats.timed_iter("scan", linereader.scan_matches(path, pattern)):
+            if line_no in seen:
                 continue
+            seen.add(line_no)
             try:
-                rec = json.loads(s)
-            except json.JSONDecodeError:
+                checked = check(loads(line))
+            except ValueError:
+                runstats.count("lines_invalid")
                 continue
-
-            ts_s = rec.get("ts")
-            aid = rec.get("agent_id")
-            status = rec.get("status")
-            if not ts_s or not aid or status is None:
+            if checked is None:
+                runstats.count("lines_skipped")
                 continue
+            ts, aid, status = checked
+            if status == "error":
+                ring.add_error(ts, aid)
+            else:
+                ring.observe(ts)
 
-            try:
-                ts = parse_ts(ts_s)
-            except Exception:
+    runstats.count("lines_decoded", len(seen))
+    chunks = runstats.timed_iter("scan", linereader.findall_chunks(path, _CANONICAL_TS_VALUE))
+    top = max((max(found) for found in chunks if found), default=None)
+    if top is None:
+        return ring
+    try:
+        top_ts = parse_ts(top.decode())
+    except ValueError:
+        return None
+    if ring.latest is not None and top_ts <= ring.latest:
+        return ring
+
+    # Every other line has a canonical ts <= top, so top is the latest as
+    # long as one line carrying it really is a heartbeat with that ts
+    top_value = re.compile(rb'"ts"\s*:\s*"' + re.escape(top) + rb'"')
+    for _, line in linereader.scan_matches(path, top_value):
+        try:
+            checked = check_record(linereader.loads(line))
+        except ValueError:
+            continue
+        if checked is not None and checked[0] == top_ts:
+            ring.observe(top_ts)
+            return ring
+    return None
+
+def file_errors(path, span=WINDOW):
+    # Worker for one log: (latest ts, [(agent_id, ts)] of the errors within
+    # span of it). That is all another file's ring needs to take it in.
+    ring = None
+    if not linereader.is_compressed(path):
+        ring = scan_file(path, ErrorRing(span))
+        if ring is None:
+            runstats.count("scan_fallbacks")
+    if ring is None:
+        ring = read_all(path, ErrorRing(span))
+    errors = ring.errors()
+    runstats.peak("errors_held", len(errors))
+    return ring.latest, errors
+
+def merge_errors(parts, span=WINDOW):
+    # One ring from the file_errors() of several files. Only the overall
+    # latest ts matters, so the order the files are in makes no difference;
+    # errors a file kept that are too old for the overall latest drop out.
+    ring = ErrorRing(span)
+    latest = [ts for ts, _ in parts if ts is not None]
+    if latest:
+        ring.observe(max(latest))
+    for _, errors in parts:
+        for aid, ts in errors:
+            ring.add_error(ts, aid)
+    return ring
+
+def print_unhealthy(agents, window=WINDOW):
+    print(f"Unhealthy agents in last {window / timedelta(minutes=1):g} min: {agents}")
+
+def follow_file(path, windows, checkpoint=None):
+    # --follow: tail the log and print the unhealthy lists every time one
+    # of them changes, as agents error or age out of a window. State is the
+    # ring, so memory stays bounded by the largest window. With a checkpoint
+    # file, the byte offset and the ring's errors are saved about once a
+    # second and picked up on restart.
+    ring = ErrorRing(max(windows))
+    offset, inode = 0, None
+    if checkpoint:
+        saved = linereader.load_checkpoint(checkpoint)
+        if saved is not None:
+            offset = saved.get("offset", 0)
+            inode = saved.get("inode")
+            if saved.get("latest"):
+                ring.observe(datetime.fromisoformat(saved["latest"]))
+            for aid, ts in saved.get("errors", []):
+                ring.add_error(datetime.fromisoformat(ts), aid)
+
+    shown = None
+
+    def save():
+        linereader.save_checkpoint(checkpoint, {
+            "file": path, "inode": inode, "offset": offset,
+            "latest": ring.latest.isoformat() if ring.latest is not None else None,
+            "errors": [[aid, ts.isoformat()] for aid, ts in ring.errors()],
+        })
+
+    # Ctrl-C and SIGTERM stop at the next batch boundary (within a poll
+    # interval), so the offset saved is always the one the ring is at
+    stopping = []
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda signum, frame: stopping.append(signum))
+    saved_at = (inode, offset)
+    last_save = time.monotonic()
+    # Records are applied to the ring a batch at a time, and the offset only
+    # moves past a batch once it has been applied
+    batch = []
+    position = (inode, offset)
+    try:
+        for item in linereader.follow_json(path, None, offset, inode):
+            if item is not None:
+                position = item[:2]
+                checked = check_record(item[2])
+                if checked is not None:
+                    batch.append(checked)
                 continue
 
-            if latest is None or ts > latest:
-                latest = ts
+            for ts, aid, status in batch:
+                if status == "error":
+                    ring.add_error(ts, aid)
+                else:
+                    ring.observe(ts)
+            batch.clear()
+            inode, offset = position
 
-            if status == "error":
-                errors.append((ts, aid))
+            # Between batches: print if changed, maybe checkpoint
+            current = ring.unhealthy_many(windows)
+            if current != shown:
+                for window, agents in current.items():
+                    print_unhealthy(agents, window)
+                sys.stdout.flush()
+                shown = current
+            if stopping:
+                break
+            if checkpoint and (inode, offset) != saved_at and time.monotonic() - last_save >= CHECKPOINT_INTERVAL:
+                save()
+                saved_at = (inode, offset)
+                last_save = time.monotonic()
+    finally:
+        if checkpoint:
+            save()
+
+def parse_windows(value):
+    # "1,5,10,60" -> timedeltas, in the order given
+    try:
+        windows = [timedelta(minutes=float(v)) for v in value.split(",")]
+    except OverflowError:
+        # inf, or more minutes than a timedelta holds
+        raise ValueError(value) from None
+    if any(not timedelta(0) < w <= MAX_WINDOW for w in windows):
+        raise ValueError(value)
+    return windows
+
+def main():
+    args = sys.argv[1:]
+    follow = linereader.pop_flag(args, "--follow")
+    try:
+        checkpoint = linereader.pop_option(args, "--checkpoint", str)
+        windows = linereader.pop_option(args, "--windows", parse_windows)
+        workers = linereader.pop_option(args, "--workers", int)
+        stats = linereader.pop_option(args, "--stats", str)
+    except ValueError:
+        args = []
+    if (not args or (checkpoint and not follow) or (follow and (len(args) != 1 or workers or stats))
+            or (workers is not None and workers < 1) or stats not in (None, *runstats.REPORT_FORMATS)):
+        print(f"Usage: {sys.argv[0]} [--windows MINUTES[,MINUTES...]] [--workers N] [--stats table|prometheus] "
+              f"<agent_heartbeats.log|glob>... | --follow [--checkpoint FILE] <agent_heartbeats.log>")
+        sys.exit(1)
 
-    if latest is None:
-        print("Unhealthy agents in last 10 min: []")
+    windows = windows or [WINDOW]
+    if follow:
+        follow_file(args[0], windows, checkpoint)
         return
 
-    cutoff = latest - timedelta(minutes=10)
-    recent_unhealthy = sorted({aid for ts, aid in errors if ts >= cutoff})
-    print(f"Unhealthy agents in last 10 min: {recent_unhealthy}")
+    if stats:
+        runstats.enable()
+    paths = linereader.expand_paths(args)
+    span = max(windows)
+    # With --stats, what the stages inside leave over is the error ring
+    with runstats.stage("window"):
+        parts = linereader.map_files(functools.partial(file_errors, span=span), paths, workers)
+        ring = merge_errors(list(parts), span)
+        unhealthy = ring.unhealthy_many(windows)
+    with runstats.stage("output"):
+        for window, agents in unhealthy.items():
+            print_unhealthy(agents, window)
+    runstats.report(stats, "testtimesort")
 
 if __name__ == "__main__":
     main()
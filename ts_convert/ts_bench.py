@@ -0,0 +1,186 @@
+"""
+Microbenchmark for detect_datetime_format.
+Times one sample string per entry in FORMAT_TYPES (plus the Unix timestamp
+branch and an unparseable string) against the original strptime try-loop,
+then times parse_datetimes on single-format columns, the format registry's
+adaptive probe order against its fixed one, detect_epoch_ns against
+detect + datetime_to_epoch_ns, and the compiled formatters against strftime.
+
+    python3 ts_bench.py [iterations]
+"""
+
+from datetime import datetime
+from typing import Optional, Tuple
+import sys
+import timeit
+
+import ts_convert
+
+# One representative string per format name, in FORMAT_TYPES order
+SAMPLES = {
+    "Unix timestamp (seconds)": "1731405780",
+    "Unix timestamp (milliseconds)": "1731405780123",
+    "ISO 8601 (with timezone)": "2025-11-11T05:03:00-0500",
+    "ISO 8601 (with microseconds and timezone)": "2025-11-11T05:03:00.123456+0100",
+    "ISO 8601 (datetime with timezone)": "2025-11-11 05:03:00-0500",
+    "ISO 8601 (datetime with microseconds and timezone)": "2025-11-11 05:03:00.5+05:30",
+    "ISO 8601 (datetime)": "2024-03-15 14:30:00",
+    "ISO 8601 (T-separated)": "2024-03-15T14:30:00",
+    "ISO 8601 (with microseconds)": "2024-03-15T14:30:00.250",
+    "ISO 8601 (UTC/Zulu)": "2024-03-15T14:30:00z",
+    "ISO 8601 (UTC with microseconds)": "2024-03-15T14:30:00.250000z",
+    "ISO 8601 (date only)": "2024-03-15",
+    "US format (MM/DD/YYYY)": "03/15/2024",
+    "US format (MM/DD/YYYY with time)": "03/15/2024 14:30:00",
+    "US format (MM/DD/YY)": "03/15/24",
+    "US format (MM-DD-YYYY)": "03-15-2024",
+    "European format (DD/MM/YYYY)": "15/03/2024",
+    "European format (DD/MM/YYYY with time)": "15/03/2024 14:30:00",
+    "European format (DD-MM-YYYY)": "15-03-2024",
+    "European format (DD.MM.YYYY)": "15.03.2024",
+    "Long month format (Month DD, YYYY)": "March 15, 2024",
+    "Short month format (Mon DD, YYYY)": "Mar 15, 2024",
+    "European text format (DD Month YYYY)": "15 March 2024",
+    "European text format (DD Mon YYYY)": "15 Mar 2024",
+    "Asian format (YYYY/MM/DD)": "2024/03/15",
+    "Asian format (YYYY/MM/DD with time)": "2024/03/15 14:30:00",
+    "Short month format (DD-Mon-YYYY)": "15-Mar-2024",
+    "Compact format (YYYYMMDD)": "20240315",
+    None: "not a date",
+}
+
+
+def legacy_detect_datetime_format(date_string: str) -> Tuple[Optional[datetime], Optional[str]]:
+    """
+    The original strptime try-loop, kept as the reference the compiled
+    detector must agree with.
+    """
+    date_string = date_string.strip()
+    if date_string.isdigit():
+        try:
+            timestamp = int(date_string)
+            if len(date_string) == 13:
+                return datetime.fromtimestamp(timestamp / 1000), "Unix timestamp (milliseconds)"
+            elif len(date_string) == 10:
+                return datetime.fromtimestamp(timestamp), "Unix timestamp (seconds)"
+        except (ValueError, OSError):
+            pass
+    for fmt, format_name in ts_convert.FORMAT_TYPES.items():
+        try:
+            return datetime.strptime(date_string, fmt), format_name
+        except ValueError:
+            continue
+    return None, None
+
+
+def bench_column(rows: int):
+    """Per-row cost of detecting every value vs parse_datetimes on one-format columns."""
+    print(f"\n{'column of ' + str(rows) + ' rows':52} {'detect us':>10} {'column us':>12} {'speedup':>8}")
+    print("-" * 85)
+    for name, sample in SAMPLES.items():
+        if name is None:
+            continue
+        column = [sample] * rows
+        detect = timeit.timeit(lambda: [ts_convert.detect_datetime_format(s) for s in column], number=1)
+        sticky = timeit.timeit(lambda: ts_convert.parse_datetimes(column), number=1)
+        detect_us = detect / rows * 1e6
+        sticky_us = sticky / rows * 1e6
+        print(f"{name:52} {detect_us:10.2f} {sticky_us:12.2f} {detect_us / sticky_us:7.1f}x")
+
+
+def bench_adaptive(iterations: int):
+    """Per-row cost of detection with the registry in its fixed order vs reordered for the traffic."""
+    registry = ts_convert.get_format_registry()
+    interval = registry.reorder_interval
+    print(f"\n{'format (probe order)':52} {'fixed us':>10} {'adaptive us':>12} {'speedup':>8}")
+    print("-" * 85)
+    for name, sample in SAMPLES.items():
+        if name is None or name.startswith("Unix"):
+            continue
+        # Fixed: registration order, never reordered
+        registry.reorder_interval = 0
+        registry.reset()
+        fixed = timeit.timeit(lambda: ts_convert.detect_datetime_format(sample), number=iterations)
+        # Adaptive: reordered once for this format's traffic
+        registry.reset()
+        ts_convert.detect_datetime_format(sample)
+        registry.reorder()
+        adaptive = timeit.timeit(lambda: ts_convert.detect_datetime_format(sample), number=iterations)
+        fixed_us = fixed / iterations * 1e6
+        adaptive_us = adaptive / iterations * 1e6
+        print(f"{name:52} {fixed_us:10.2f} {adaptive_us:12.2f} {fixed_us / adaptive_us:7.1f}x")
+    registry.reorder_interval = interval
+    registry.reset()
+
+
+def bench_epoch(iterations: int):
+    """Per-row cost of detect + datetime_to_epoch_ns vs detect_epoch_ns for every format name."""
+    print(f"\n{'format (to epoch ns)':52} {'datetime us':>10} {'epoch us':>12} {'speedup':>8}")
+    print("-" * 85)
+    for name, sample in SAMPLES.items():
+        if name is None:
+            continue
+        dt, _ = ts_convert.detect_datetime_format(sample)
+        expected = ts_convert.datetime_to_epoch_ns(dt), name
+        got = ts_convert.detect_epoch_ns(sample)
+        if got != expected:
+            print(f"MISMATCH for {sample!r}: {got} != {expected}")
+            sys.exit(1)
+
+        def via_datetime():
+            dt, _ = ts_convert.detect_datetime_format(sample)
+            return ts_convert.datetime_to_epoch_ns(dt)
+
+        legacy = timeit.timeit(via_datetime, number=iterations)
+        direct = timeit.timeit(lambda: ts_convert.detect_epoch_ns(sample), number=iterations)
+        legacy_us = legacy / iterations * 1e6
+        direct_us = direct / iterations * 1e6
+        print(f"{name:52} {legacy_us:10.2f} {direct_us:12.2f} {legacy_us / direct_us:7.1f}x")
+
+
+def bench_format(iterations: int):
+    """Per-row cost of strftime vs the compiled formatters for every format name."""
+    dt = datetime(2024, 3, 15, 14, 30, 5, 250000).astimezone()
+    print(f"\n{'format (to string)':52} {'strftime us':>10} {'compiled us':>12} {'speedup':>8}")
+    print("-" * 85)
+    for fmt, name in ts_convert.FORMAT_TYPES.items():
+        formatter = ts_convert.get_formatter(name)
+        if formatter(dt) != dt.strftime(fmt):
+            print(f"MISMATCH for {name}: {formatter(dt)!r} != {dt.strftime(fmt)!r}")
+            sys.exit(1)
+        legacy = timeit.timeit(lambda: dt.strftime(fmt), number=iterations)
+        compiled = timeit.timeit(lambda: formatter(dt), number=iterations)
+        legacy_us = legacy / iterations * 1e6
+        compiled_us = compiled / iterations * 1e6
+        print(f"{name:52} {legacy_us:10.2f} {compiled_us:12.2f} {legacy_us / compiled_us:7.1f}x")
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    # Repeating one sample would only measure cache hits
+    ts_convert.set_parse_cache(None)
+
+    print(f"{'format':52} {'legacy us':>10} {'compiled us':>12} {'speedup':>8}")
+    print("-" * 85)
+    for name, sample in SAMPLES.items():
+        expected = legacy_detect_datetime_format(sample)
+        got = ts_convert.detect_datetime_format(sample)
+        if got != expected:
+            print(f"MISMATCH for {sample!r}: {got} != {expected}")
+            sys.exit(1)
+
+        legacy = timeit.timeit(lambda: legacy_detect_datetime_format(sample), number=iterations)
+        compiled = timeit.timeit(lambda: ts_convert.detect_datetime_format(sample), number=iterations)
+        legacy_us = legacy / iterations * 1e6
+        compiled_us = compiled / iterations * 1e6
+        label = name or f"(unparseable) {sample!r}"
+        print(f"{label:52} {legacy_us:10.2f} {compiled_us:12.2f} {legacy_us / compiled_us:7.1f}x")
+
+    bench_column(iterations)
+    bench_adaptive(iterations)
+    bench_epoch(iterations)
+    bench_format(iterations)
+
+
+if __name__ == "__main__":
+    main()
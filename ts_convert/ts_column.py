@@ -0,0 +1,174 @@
+"""
+Columnar timestamp storage for ts_convert.
+Holds parsed timestamps as an int64 array of epoch nanoseconds plus a uint8
+array of format codes (indexes into ts_convert.FORMAT_NAMES), instead of one
+(datetime, format_name, original_string) tuple per row. That works out to
+9 bytes per row, so 10M timestamps take ~90 MB rather than gigabytes.
+
+NumPy is used when it is installed. Otherwise the same data is kept in
+stdlib array.array buffers.
+"""
+
+from array import array
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, Optional, Sequence
+import itertools
+
+import ts_convert
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_INT64_MIN = -(2 ** 63)
+_INT64_MAX = 2 ** 63 - 1
+
+
+def _finish(epoch_ns: array, codes: array):
+    # Hand the buffers to NumPy when it is available
+    if np is None:
+        return epoch_ns, codes
+    return np.frombuffer(epoch_ns, dtype=np.int64), np.frombuffer(codes, dtype=np.uint8)
+
+
+class TimestampColumn:
+    """
+    A column of parsed timestamps.
+
+    Attributes:
+        epoch_ns: int64 nanoseconds since the Unix epoch (naive values are taken as UTC)
+        codes: uint8 format codes, see ts_convert.FORMAT_NAMES
+        originals: the original strings, or None if they were not kept
+    """
+
+    def __init__(self, epoch_ns, codes, originals: Optional[List[str]] = None):
+        self.epoch_ns = epoch_ns
+        self.codes = codes
+        self.originals = originals
+
+    @classmethod
+    def from_strings(cls, date_strings: Iterable[str], keep_originals: bool = False, sample_size: int = 0) -> "TimestampColumn":
+        """
+        Parse date strings into a column, in input order.
+
+        Args:
+            date_strings: The date strings to parse
+            keep_originals: If True, keep the original strings alongside the arrays
+            sample_size: If > 0, infer one format from this many values and parse
+                with it (see ts_convert.ColumnParser)
+
+        Returns:
+            A TimestampColumn; strings that cannot be parsed are skipped with a warning
+        """
+        if sample_size > 0:
+            date_strings = list(date_strings)
+            parser = ts_convert.ColumnParser.from_sample(date_strings, sample_size)
+            parsed = map(parser.detect_epoch_ns, date_strings)
+        else:
+            date_strings, texts = itertools.tee(date_strings)
+            parsed = ts_convert.iter_epoch_ns(texts)
+
+        epoch_ns = array("q")
+        codes = array("B")
+        originals = [] if keep_originals else None
+        format_codes = ts_convert.FORMAT_CODES
+
+        for date_str, (ns, format_type) in zip(date_strings, parsed):
+            if ns is None:
+                print(f"Warning: Could not parse '{date_str}'")
+                continue
+            if not _INT64_MIN <= ns <= _INT64_MAX:
+                print(f"Warning: '{date_str}' is outside the int64 nanosecond range")
+                continue
+            epoch_ns.append(ns)
+            codes.append(format_codes[format_type])
+            if keep_originals:
+                originals.append(date_str)
+
+        return cls(*_finish(epoch_ns, codes), originals)
+
+    def __len__(self) -> int:
+        return len(self.epoch_ns)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes used by the epoch and format code arrays (originals not included)."""
+        if np is not None:
+            return self.epoch_ns.nbytes + self.codes.nbytes
+        return len(self.epoch_ns) * self.epoch_ns.itemsize + len(self.codes) * self.codes.itemsize
+
+    def argsort(self):
+        """Return the row order that sorts the column chronologically (stable)."""
+        if np is not None:
+            return np.argsort(self.epoch_ns, kind="stable")
+        return array("q", sorted(range(len(self.epoch_ns)), key=self.epoch_ns.__getitem__))
+
+    def take(self, order) -> "TimestampColumn":
+        """Return a new column with the rows in the given order."""
+        originals = None
+        if self.originals is not None:
+            originals = [self.originals[i] for i in order]
+        if np is not None:
+            return TimestampColumn(self.epoch_ns[order], self.codes[order], originals)
+        epoch_ns = array("q", (self.epoch_ns[i] for i in order))
+        codes = array("B", (self.codes[i] for i in order))
+        return TimestampColumn(epoch_ns, codes, originals)
+
+    def sorted(self) -> "TimestampColumn":
+        """Return a chronologically sorted copy of the column."""
+        return self.take(self.argsort())
+
+    def format_name(self, i: int) -> str:
+        """Return the format name of row i."""
+        return ts_convert.FORMAT_NAMES[self.codes[i]]
+
+    def datetime(self, i: int) -> datetime:
+        """Return row i as a UTC datetime (sub-microsecond digits are dropped)."""
+        return _EPOCH + timedelta(microseconds=int(self.epoch_ns[i]) // 1000)
+
+    def as_tuples(self) -> "TupleView":
+        """Return a lazy view of the rows as sort_datetimes-style tuples."""
+        return TupleView(self)
+
+
+class TupleView(Sequence):
+    """
+    Read-only view of a TimestampColumn as (datetime, format_name, original_string)
+    tuples, built one row at a time on access.
+
+    The datetime and format come from the row's epoch_ns and format code, so they
+    are the ones the column was parsed and sorted with. The datetime is in UTC; it
+    is the same instant sort_datetimes gives (and compares equal to it), though a
+    value parsed with an offset comes back converted to UTC. original_string is
+    None when the column did not keep its originals.
+    """
+
+    def __init__(self, column: TimestampColumn):
+        self._column = column
+
+    def __len__(self) -> int:
+        return len(self._column)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        column = self._column
+        original = column.originals[i] if column.originals is not None else None
+        return column.datetime(i), column.format_name(i), original
+
+
+def sort_datetimes_column(date_strings: Iterable[str], keep_originals: bool = False, sample_size: int = 0) -> TimestampColumn:
+    """
+    Columnar counterpart of ts_convert.sort_datetimes.
+
+    Args:
+        date_strings: The date strings to parse and sort
+        keep_originals: If True, keep the original strings alongside the arrays
+        sample_size: If > 0, infer one format from this many values (see ts_convert.ColumnParser)
+
+    Returns:
+        A chronologically sorted TimestampColumn; use as_tuples() for the tuple form
+    """
+    return TimestampColumn.from_strings(date_strings, keep_originals, sample_size).sorted()
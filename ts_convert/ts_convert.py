@@ -3,8 +3,14 @@ Datetime Conversion Utility
 Automatically detect, parse, convert, and format datetime strings in various formats.
 """
 
-from datetime import datetime, timezone
-from typing import Optional, Tuple, List
+from datetime import date, datetime, timedelta, timezone
+from collections import Counter, OrderedDict
+from functools import lru_cache
+from itertools import islice
+from operator import attrgetter, itemgetter
+from typing import Callable, Iterable, Iterator, Optional, Tuple, List
+import calendar
+import re
 import sys
 
 def list_func():
@@ -13,14 +19,721 @@ def list_func():
     # parse_datetime(date_string: str) -> Optional[datetime]
     # print_datetime_format(date_string: str) -> None
     # datetime_to_string(dt: datetime, format_type: str) -> str
-    # sort_datetimes(date_strings: List[str], make_aware: bool = True) -> List[Tuple[datetime, str, str]]
+    # get_formatter(format_type: str) -> Callable[[datetime], str]
+    # format_many(values: Iterable, format_type: str) -> List[str]
+    # sort_datetimes(date_strings: List[str], make_aware: bool = True, sample_size: int = 0) -> List[Tuple[datetime, str, str]]
+    # datetime_to_epoch_ns(dt: datetime) -> int
+    # register_format(name: str, fmt: str, formatter: Optional[Callable[[datetime], str]] = None) -> None
+    # get_format_registry() -> FormatRegistry
+    # detect_epoch_ns(date_string: str) -> Tuple[Optional[int], Optional[str]]
+    # parse_epoch_ns(date_string: str) -> Optional[int]
+    # iter_epoch_ns(date_strings: Iterable[str]) -> Iterator[Tuple[Optional[int], Optional[str]]]
+    # parse_epoch_ns_many(date_strings: Iterable[str]) -> List[Optional[int]]
+    # set_parse_cache(maxsize: Optional[int]) -> Optional[ParseCache]
+    # get_parse_cache() -> Optional[ParseCache]
+    # clear_parse_cache() -> None
+    # infer_format(date_strings: Iterable[str], sample_size: int = 100) -> Optional[str]
+    # parse_datetimes(date_strings: List[str], sample_size: int = 100) -> Tuple[List[Tuple[Optional[datetime], Optional[str]]], ColumnParser]
     """
     print("\n")
     print("-" * 70)
     print("Available Functions:")
     print(funcStr)
+    print("Command line:")
+    print("    python3 -m ts_convert parse|detect|sort|convert FILE [--workers N] [--chunk-size BYTES] [--output-format NAME]")
     print("-" * 70)
 
+# Dictionary mapping format strings to human-readable names.
+# Order matters: when a string matches several formats (e.g. "03/04/2024" is
+# valid as both US and European), the first entry wins.
+FORMAT_TYPES = {
+    # ISO 8601 formats with timezone
+    "%Y-%m-%dT%H:%M:%S%z": "ISO 8601 (with timezone)",
+    "%Y-%m-%dT%H:%M:%S.%f%z": "ISO 8601 (with microseconds and timezone)",
+    "%Y-%m-%d %H:%M:%S%z": "ISO 8601 (datetime with timezone)",
+    "%Y-%m-%d %H:%M:%S.%f%z": "ISO 8601 (datetime with microseconds and timezone)",
+    
+    # ISO 8601 formats
+    "%Y-%m-%d %H:%M:%S": "ISO 8601 (datetime)",
+    "%Y-%m-%dT%H:%M:%S": "ISO 8601 (T-separated)",
+    "%Y-%m-%dT%H:%M:%S.%f": "ISO 8601 (with microseconds)",
+    "%Y-%m-%dT%H:%M:%SZ": "ISO 8601 (UTC/Zulu)",
+    "%Y-%m-%dT%H:%M:%S.%fZ": "ISO 8601 (UTC with microseconds)",
+    "%Y-%m-%d": "ISO 8601 (date only)",
+    
+    # US formats
+    "%m/%d/%Y": "US format (MM/DD/YYYY)",
+    "%m/%d/%Y %H:%M:%S": "US format (MM/DD/YYYY with time)",
+    "%m/%d/%y": "US format (MM/DD/YY)",
+    "%m-%d-%Y": "US format (MM-DD-YYYY)",
+    
+    # European formats
+    "%d/%m/%Y": "European format (DD/MM/YYYY)",
+    "%d/%m/%Y %H:%M:%S": "European format (DD/MM/YYYY with time)",
+    "%d-%m-%Y": "European format (DD-MM-YYYY)",
+    "%d.%m.%Y": "European format (DD.MM.YYYY)",
+    
+    # Text month formats
+    "%B %d, %Y": "Long month format (Month DD, YYYY)",
+    "%b %d, %Y": "Short month format (Mon DD, YYYY)",
+    "%d %B %Y": "European text format (DD Month YYYY)",
+    "%d %b %Y": "European text format (DD Mon YYYY)",
+    
+    # Other common formats
+    "%Y/%m/%d": "Asian format (YYYY/MM/DD)",
+    "%Y/%m/%d %H:%M:%S": "Asian format (YYYY/MM/DD with time)",
+    "%d-%b-%Y": "Short month format (DD-Mon-YYYY)",
+    "%Y%m%d": "Compact format (YYYYMMDD)",
+}
+
+# Every format name detect_datetime_format can return. The position in this
+# tuple is the format's compact code (it fits in one byte). Codes are stored
+# in sort runs, so new names go at the end.
+FORMAT_NAMES = (
+    "Unix timestamp (seconds)",
+    "Unix timestamp (milliseconds)",
+) + tuple(FORMAT_TYPES.values()) + (
+    "Unix timestamp (microseconds)",
+    "Unix timestamp (nanoseconds)",
+    "Unix timestamp (fractional seconds)",
+)
+FORMAT_CODES = {name: code for code, name in enumerate(FORMAT_NAMES)}
+
+
+def _names_re(names: List[str]) -> str:
+    # Longest first so "September" is not cut short by "Sep"
+    names = sorted((n for n in names if n), key=len, reverse=True)
+    return "|".join(re.escape(n) for n in names)
+
+
+# Regex fragment for each strptime directive used in FORMAT_TYPES. These are
+# the same patterns the stdlib _strptime module uses, so a match here is a
+# match there. "{g}" is replaced with a unique group name per format.
+_DIRECTIVE_RE = {
+    "d": r"(?P<{g}>3[0-1]|[1-2]\d|0[1-9]|[1-9]| [1-9])",
+    "f": r"(?P<{g}>[0-9]{1,6})",
+    "H": r"(?P<{g}>2[0-3]|[0-1]\d|\d)",
+    "m": r"(?P<{g}>1[0-2]|0[1-9]|[1-9])",
+    "M": r"(?P<{g}>[0-5]\d|\d)",
+    "S": r"(?P<{g}>6[0-1]|[0-5]\d|\d)",
+    "y": r"(?P<{g}>\d\d)",
+    "Y": r"(?P<{g}>\d\d\d\d)",
+    "z": r"(?P<{g}>[+-]\d\d:?[0-5]\d(?::?[0-5]\d(?:\.\d{1,6})?)?|(?-i:Z))",
+    "B": "(?P<{g}>" + _names_re(calendar.month_name[1:]) + ")",
+    "b": "(?P<{g}>" + _names_re(calendar.month_abbr[1:]) + ")",
+}
+
+_MONTH_INDEX = {}
+for _i in range(1, 13):
+    _MONTH_INDEX[calendar.month_name[_i].lower()] = _i
+    _MONTH_INDEX[calendar.month_abbr[_i].lower()] = _i
+
+
+@lru_cache(maxsize=256)
+def _parse_tz(z: str) -> timezone:
+    # Mirrors the %z handling in _strptime: "Z", "+HHMM", "+HH:MM" and the
+    # optional seconds/microseconds tail. A feed only uses a handful of
+    # offsets, so the timezone objects are cached.
+    if z == "Z":
+        return timezone(timedelta(0))
+    if z[3] == ":":
+        z = z[:3] + z[4:]
+        if len(z) > 5:
+            if z[5] != ":":
+                raise ValueError(f"Inconsistent use of : in {z}")
+            z = z[:5] + z[6:]
+    seconds = int(z[1:3]) * 3600 + int(z[3:5]) * 60 + int(z[5:7] or 0)
+    fraction = int(z[8:].ljust(6, "0")) if len(z) > 8 else 0
+    if z[0] == "-":
+        seconds, fraction = -seconds, -fraction
+    return timezone(timedelta(seconds=seconds, microseconds=fraction))
+
+
+def _parse_fraction(value: str) -> int:
+    return int(value.ljust(6, "0"))
+
+
+def _parse_short_year(value: str) -> int:
+    year = int(value)
+    return year + (2000 if year <= 68 else 1900)
+
+
+def _parse_month_name(value: str) -> int:
+    month = _MONTH_INDEX.get(value.lower())
+    if month is None:
+        raise ValueError(f"Unknown month name: {value}")
+    return month
+
+
+# directive -> (position in the datetime() arguments, converter)
+_FIELD_CONVERTERS = {
+    "Y": (0, int),
+    "y": (0, _parse_short_year),
+    "m": (1, int),
+    "B": (1, _parse_month_name),
+    "b": (1, _parse_month_name),
+    "d": (2, int),
+    "H": (3, int),
+    "M": (4, int),
+    "S": (5, int),
+    "f": (6, _parse_fraction),
+    "z": (7, _parse_tz),
+}
+
+
+def _offset_ns(z: str) -> int:
+    # UTC offset of a %z value in nanoseconds
+    return _parse_tz(z).utcoffset(None) // timedelta(microseconds=1) * 1000
+
+
+# The epoch path converts the date, hour, minute and offset of a match
+# together and caches the result on their text, so only the seconds and the
+# fraction are converted for each string.
+# directive -> (position in [year, month, day, hour, minute, offset], converter)
+_MINUTE_FIELDS = {
+    "Y": (0, int),
+    "y": (0, _parse_short_year),
+    "m": (1, int),
+    "B": (1, _parse_month_name),
+    "b": (1, _parse_month_name),
+    "d": (2, int),
+    "H": (3, int),
+    "M": (4, int),
+    "z": (5, _offset_ns),
+}
+# %S text -> seconds. The pattern also allows leap seconds (60, 61), which
+# datetime() rejects, so those are left out.
+_SECONDS = {f"{i:02d}": i for i in range(60)}
+_SECONDS.update((str(i), i) for i in range(10))
+_NS_PER_MINUTE = 60 * 10 ** 9
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+# Minutes kept per format by _CompiledFormat.epoch_ns before starting over
+_MINUTE_CACHE_SIZE = 4096
+
+
+class _CompiledFormat:
+    """
+    One entry of FORMAT_TYPES compiled to a regex plus a direct field converter,
+    so a string can be turned into a datetime without going through strptime.
+    """
+    __slots__ = ("fmt", "name", "index", "pattern", "regex", "groups", "fields",
+                 "minute_fields", "minute_key", "minute_cache", "second", "fraction")
+
+    def __init__(self, fmt: str, name: str, index: int):
+        self.fmt = fmt
+        self.name = name
+        self.index = index
+        groups = []
+        fields = []
+        minute_fields = []
+        self.second = self.fraction = None
+        pattern = ""
+        pos = 0
+        while pos < len(fmt):
+            ch = fmt[pos]
+            if ch == "%":
+                directive = fmt[pos + 1]
+                group = f"{directive}{index}"
+                pattern += _DIRECTIVE_RE[directive].replace("{g}", group)
+                if directive == "S":
+                    self.second = len(groups)
+                elif directive == "f":
+                    self.fraction = len(groups)
+                else:
+                    minute_fields.append((len(groups), *_MINUTE_FIELDS[directive]))
+                groups.append(group)
+                fields.append(_FIELD_CONVERTERS[directive])
+                pos += 2
+                continue
+            # Whitespace in a strptime format matches any run of whitespace
+            pattern += r"\s+" if ch.isspace() else re.escape(ch)
+            pos += 1
+        self.groups = tuple(groups)
+        self.fields = tuple(fields)
+        self.minute_fields = tuple(minute_fields)
+        # The text of the minute fields of a match, as the key of minute_cache
+        positions = [pos for pos, _, _ in minute_fields]
+        self.minute_key = itemgetter(*positions) if positions else lambda values: ()
+        self.minute_cache = {}
+        self.pattern = f"(?P<fmt{index}>{pattern})"
+        self.regex = re.compile(self.pattern + r"\Z", re.IGNORECASE)
+
+    def build(self, match: "re.Match") -> datetime:
+        """
+        Convert the groups of a successful match into a datetime. Raises
+        ValueError for out-of-range values (e.g. February 30th), just like strptime.
+        """
+        # year, month, day, hour, minute, second, microsecond, tzinfo
+        args = [1900, 1, 1, 0, 0, 0, 0, None]
+        for (slot, convert), value in zip(self.fields, match.group(*self.groups)):
+            args[slot] = convert(value)
+        return datetime(*args)
+
+    def parse(self, date_string: str) -> Optional[datetime]:
+        """Parse an already stripped string with this format only, or return None."""
+        match = self.regex.match(date_string)
+        if match is None:
+            return None
+        try:
+            return self.build(match)
+        except ValueError:
+            return None
+    
+    def epoch_ns(self, match: "re.Match") -> int:
+        """
+        Same instant as datetime_to_epoch_ns(self.build(match)), without making
+        the datetime. Raises ValueError wherever build() would.
+        """
+        values = match.group(*self.groups)
+        key = self.minute_key(values)
+        ns = self.minute_cache.get(key)
+        if ns is None:
+            ns = self._minute_ns(values)
+            if len(self.minute_cache) >= _MINUTE_CACHE_SIZE:
+                self.minute_cache.clear()
+            self.minute_cache[key] = ns
+        if self.second is not None:
+            second = _SECONDS.get(values[self.second])
+            if second is None:
+                raise ValueError("second must be in 0..59")
+            ns += second * 1000000000
+        if self.fraction is not None:
+            ns += int(values[self.fraction].ljust(6, "0")) * 1000
+        return ns
+    
+    def _minute_ns(self, values: tuple) -> int:
+        # Epoch ns of the date, hour and minute of a match, less its offset
+        fields = [1900, 1, 1, 0, 0, 0]
+        for pos, slot, convert in self.minute_fields:
+            fields[slot] = convert(values[pos])
+        year, month, day, hour, minute, offset = fields
+        days = date(year, month, day).toordinal() - _EPOCH_ORDINAL
+        return (days * 1440 + hour * 60 + minute) * _NS_PER_MINUTE - offset
+    
+    def parse_epoch_ns(self, date_string: str) -> Optional[int]:
+        """Epoch-ns counterpart of parse()."""
+        match = self.regex.match(date_string)
+        if match is None:
+            return None
+        try:
+            return self.epoch_ns(match)
+        except ValueError:
+            return None
+
+
+# What each directive's pattern can match, as (characters, shortest, longest)
+# with None for no limit. Used only to tell whether two formats can ever match
+# the same string, so a looser description is safe: at worst it keeps two
+# formats in a fixed order that did not need to be.
+_DIGITS = frozenset("0123456789")
+_MONTH_NAMES = calendar.month_name[1:] + calendar.month_abbr[1:]
+_NAME_CHARS = frozenset("".join(_MONTH_NAMES).lower() + "".join(_MONTH_NAMES).upper())
+_WHITESPACE = frozenset(" \t\n\r\f\v")
+_DIRECTIVE_SHAPES = {
+    "d": [(_DIGITS | {" "}, 1, 2)],
+    "f": [(_DIGITS, 1, 6)],
+    "H": [(_DIGITS, 1, 2)],
+    "m": [(_DIGITS, 1, 2)],
+    "M": [(_DIGITS, 1, 2)],
+    "S": [(_DIGITS, 1, 2)],
+    "y": [(_DIGITS, 2, 2)],
+    "Y": [(_DIGITS, 4, 4)],
+    "z": [(frozenset("+-Z"), 1, 1), (_DIGITS | {":", "."}, 0, 14)],
+    "B": [(_NAME_CHARS, min(map(len, calendar.month_name[1:])), max(map(len, calendar.month_name[1:])))],
+    "b": [(_NAME_CHARS, min(map(len, calendar.month_abbr[1:])), max(map(len, calendar.month_abbr[1:])))],
+}
+
+
+def _format_shape(fmt: str) -> List[Tuple[frozenset, int, Optional[int]]]:
+    # fmt as a list of (characters, shortest, longest), one per directive or literal
+    shape = []
+    pos = 0
+    while pos < len(fmt):
+        ch = fmt[pos]
+        if ch == "%":
+            shape.extend(_DIRECTIVE_SHAPES[fmt[pos + 1]])
+            pos += 2
+            continue
+        if ch.isspace():
+            shape.append((_WHITESPACE, 1, None))
+        else:
+            # Matching ignores case
+            shape.append((frozenset((ch.lower(), ch.upper())), 1, 1))
+        pos += 1
+    return shape
+
+
+def _shapes_overlap(a: list, b: list) -> bool:
+    # Whether some string fits both shapes: walk both a character at a time
+    # over (piece of a, length so far, piece of b, length so far)
+    start = (0, 0, 0, 0)
+    seen = {start}
+    stack = [start]
+    while stack:
+        i, n, j, m = stack.pop()
+        if i == len(a) and j == len(b):
+            return True
+        steps = []
+        # Move on to the next piece once this one is long enough
+        if i < len(a) and n >= a[i][1]:
+            steps.append((i + 1, 0, j, m))
+        if j < len(b) and m >= b[j][1]:
+            steps.append((i, n, j + 1, 0))
+        # Or take one more character that both pieces allow. Past the
+        # minimum of an unlimited piece, lengths are all alike.
+        if (i < len(a) and j < len(b) and a[i][0] & b[j][0]
+                and (a[i][2] is None or n < a[i][2]) and (b[j][2] is None or m < b[j][2])):
+            steps.append((i, n + 1 if a[i][2] is not None else min(n + 1, a[i][1]),
+                          j, m + 1 if b[j][2] is not None else min(m + 1, b[j][1])))
+        for step in steps:
+            if step not in seen:
+                seen.add(step)
+                stack.append(step)
+    return False
+
+
+class FormatRegistry:
+    """
+    The formats detect_datetime_format and detect_epoch_ns try, each kept with
+    the function that formats a datetime back into it.
+    
+    Formats are registered in precedence order: when a string fits several
+    (e.g. "03/04/2024" is both US and European), the one registered first wins.
+    All formats are tried in one regex alternation, and the registry counts
+    which format each string turned out to be. Every reorder_interval strings
+    the alternation is rebuilt with the busiest formats first, so a feed of
+    late entries like "Short month format (DD-Mon-YYYY)" stops paying for
+    the misses before them. Formats that can match the same string never
+    change places, so reordering cannot change what a string parses as.
+    
+    Counters:
+        hits: format name -> strings parsed with it
+    """
+    
+    def __init__(self, reorder_interval: int = 4096):
+        """
+        Args:
+            reorder_interval: Parsed strings between reorders; 0 only reorders
+                when reorder() is called
+        """
+        self.reorder_interval = reorder_interval
+        self._formats = []          # _CompiledFormat, in precedence order
+        self._by_name = {}
+        self._by_group = {}         # outer group name -> _CompiledFormat
+        self._shapes = []
+        self._before = []           # index -> indexes that must be tried before it
+        self._formatters = {}       # format name -> formatter, including Unix ones
+        self._hits = []             # index -> strings parsed with the format
+        self._weights = []          # index -> recent hits, halved at every reorder
+        self._order = []            # probe order, as indexes
+        self._next = {}             # index -> formats after it in probe order
+        self._regex = None
+        self._countdown = reorder_interval
+    
+    def register(self, name: str, fmt: str, formatter: Optional[Callable[[datetime], str]] = None) -> None:
+        """
+        Add a format, after every format already registered.
+        
+        Use register_format() for the shared registry, so format codes and the
+        parse cache are kept up to date.
+        
+        Args:
+            name: The format name that detection returns and get_formatter accepts
+            fmt: strptime-style format using %Y %y %m %B %b %d %H %M %S %f %z,
+                e.g. "%b %d %H:%M:%S" (syslog) or "%d/%b/%Y:%H:%M:%S %z" (Apache CLF)
+            formatter: Function that formats a datetime in this format
+                (default: one compiled from fmt)
+                
+        Raises:
+            ValueError: If the name is taken or fmt uses another directive
+        """
+        if name in self._formatters:
+            raise ValueError(f"Format already registered: {name}")
+        try:
+            compiled = _CompiledFormat(fmt, name, len(self._formats))
+            shape = _format_shape(fmt)
+        except (KeyError, IndexError):
+            raise ValueError(f"Unsupported format: {fmt}") from None
+        
+        self._before.append({k for k, other in enumerate(self._shapes) if _shapes_overlap(other, shape)})
+        self._formats.append(compiled)
+        self._shapes.append(shape)
+        self._by_name[name] = compiled
+        self._by_group[f"fmt{compiled.index}"] = compiled
+        self._formatters[name] = formatter or _compile_formatter(fmt)
+        self._hits.append(0)
+        self._weights.append(0)
+        self._set_order(self._order + [compiled.index])
+    
+    def add_formatter(self, name: str, formatter: Callable[[datetime], str]) -> None:
+        """Add a formatter for a format that is parsed outside the registry (e.g. Unix timestamps)."""
+        if name in self._formatters:
+            raise ValueError(f"Format already registered: {name}")
+        self._formatters[name] = formatter
+    
+    def names(self) -> List[str]:
+        """Return the registered format names, in precedence order."""
+        return [compiled.name for compiled in self._formats]
+    
+    def compiled(self, name: str) -> Optional[_CompiledFormat]:
+        """Return the compiled parser of a format, or None."""
+        return self._by_name.get(name)
+    
+    def formatter(self, name: str) -> Optional[Callable[[datetime], str]]:
+        """Return the formatter of a format, or None."""
+        return self._formatters.get(name)
+    
+    def parse(self, date_string: str, epoch_ns: bool = False):
+        """
+        Parse an already stripped string with the first format it fits.
+        
+        Args:
+            date_string: The date string to parse
+            epoch_ns: If True, return epoch nanoseconds instead of a datetime
+            
+        Returns:
+            A tuple of (datetime or epoch ns, format name), or (None, None)
+        """
+        match = self._regex.match(date_string)
+        if match is None:
+            return None, None
+        compiled = self._by_group[match.lastgroup]
+        try:
+            value = compiled.epoch_ns(match) if epoch_ns else compiled.build(match)
+        except ValueError:
+            # The text had the right shape but not a real date (e.g.
+            # "02/30/2024"). strptime would have moved on to the next format,
+            # so do the same.
+            value = None
+            for compiled in self._next[compiled.index]:
+                value = compiled.parse_epoch_ns(date_string) if epoch_ns else compiled.parse(date_string)
+                if value is not None:
+                    break
+            else:
+                return None, None
+        
+        self._hits[compiled.index] += 1
+        self._weights[compiled.index] += 1
+        self._countdown -= 1
+        if self._countdown == 0:
+            self.reorder()
+        return value, compiled.name
+    
+    def reorder(self) -> None:
+        """Put the formats with the most recent hits first, keeping precedence where it matters."""
+        self._countdown = self.reorder_interval
+        # A format is as urgent as the busiest format that has to wait for it
+        weights = list(self._weights)
+        for k in range(len(weights) - 1, -1, -1):
+            for before in self._before[k]:
+                weights[before] = max(weights[before], weights[k])
+        order = []
+        placed = set()
+        remaining = list(range(len(self._formats)))
+        while remaining:
+            best = max((k for k in remaining if self._before[k] <= placed),
+                       key=lambda k: (weights[k], -k))
+            order.append(best)
+            placed.add(best)
+            remaining.remove(best)
+        # Halve the counts so the order follows changes in the traffic
+        self._weights = [w // 2 for w in self._weights]
+        if order != self._order:
+            self._set_order(order)
+    
+    def reset(self) -> None:
+        """Forget the recent hits and go back to the registration order."""
+        self._weights = [0] * len(self._formats)
+        self._countdown = self.reorder_interval
+        self._set_order(list(range(len(self._formats))))
+    
+    def _set_order(self, order: List[int]) -> None:
+        # Rebuild the alternation. The regex engine tries the alternatives in
+        # order and the outer group tells which one matched.
+        self._order = order
+        formats = [self._formats[k] for k in order]
+        self._next = {cf.index: formats[i + 1:] for i, cf in enumerate(formats)}
+        self._regex = re.compile("(?:" + "|".join(cf.pattern for cf in formats) + r")\Z", re.IGNORECASE)
+    
+    def stats(self) -> dict:
+        """Return the probe order and the hit counters as a dict."""
+        return {
+            "order": [self._formats[k].name for k in self._order],
+            "hits": {cf.name: self._hits[cf.index] for cf in self._formats},
+        }
+
+
+# Unix timestamps are all digits, and the number of digits gives the unit:
+# digits -> (format name, nanoseconds per unit)
+_UNIX_UNITS = {
+    10: ("Unix timestamp (seconds)", 10 ** 9),
+    13: ("Unix timestamp (milliseconds)", 10 ** 6),
+    16: ("Unix timestamp (microseconds)", 1000),
+    19: ("Unix timestamp (nanoseconds)", 1),
+}
+# Seconds with a fraction, as time.time() prints them
+_UNIX_FRACTION_RE = re.compile(r"(\d{10})\.(\d{1,9})\Z")
+
+
+def _unix_epoch_ns(date_string: str) -> Tuple[Optional[int], Optional[str]]:
+    # (epoch ns, format name) of a stripped Unix timestamp, else (None, None)
+    if date_string.isdigit():
+        unit = _UNIX_UNITS.get(len(date_string))
+        if unit is not None:
+            try:
+                return int(date_string) * unit[1], unit[0]
+            except ValueError:
+                pass
+    elif date_string[10:11] == ".":
+        match = _UNIX_FRACTION_RE.match(date_string)
+        if match is not None:
+            try:
+                return int(match[1]) * 10 ** 9 + int(match[2].ljust(9, "0")), "Unix timestamp (fractional seconds)"
+            except ValueError:
+                pass
+    return None, None
+
+
+def _unix_local_epoch_ns(date_string: str) -> Tuple[Optional[int], Optional[str]]:
+    # _unix_epoch_ns moved to the local time _parse_unix gives, taken as UTC,
+    # so Unix timestamps sort against naive strings as in sort_datetimes
+    ns, format_name = _unix_epoch_ns(date_string)
+    if ns is None:
+        return None, None
+    seconds = ns // 10 ** 9
+    try:
+        local = datetime.fromtimestamp(seconds)
+    except (ValueError, OSError, OverflowError):
+        return None, None
+    return ns + ((local - _EPOCH_NAIVE) // _ONE_SECOND - seconds) * 10 ** 9, format_name
+
+
+def _parse_unix(date_string: str) -> Tuple[Optional[datetime], Optional[str]]:
+    # Unix timestamps come back as naive local times, as fromtimestamp gives
+    # them, with any digits below a microsecond dropped
+    ns, format_name = _unix_epoch_ns(date_string)
+    if ns is None:
+        return None, None
+    try:
+        if format_name == "Unix timestamp (seconds)":
+            return datetime.fromtimestamp(ns // 10 ** 9), format_name
+        if format_name == "Unix timestamp (milliseconds)":
+            return datetime.fromtimestamp(ns // 10 ** 6 / 1000), format_name
+        seconds, ns = divmod(ns, 10 ** 9)
+        return datetime.fromtimestamp(seconds).replace(microsecond=ns // 1000), format_name
+    except (ValueError, OSError, OverflowError):
+        return None, None
+
+
+def _single_format_parser(format_name: Optional[str]) -> Callable[[str], Optional[datetime]]:
+    # A parser that only accepts format_name and returns None for anything else
+    compiled = _format_registry.compiled(format_name)
+    if compiled is not None:
+        return compiled.parse
+    
+    def parse_unix(date_string: str) -> Optional[datetime]:
+        dt, name = _parse_unix(date_string)
+        return dt if name == format_name else None
+    return parse_unix
+
+
+def _single_format_epoch_parser(format_name: Optional[str]) -> Callable[[str], Optional[int]]:
+    # Epoch-ns counterpart of _single_format_parser
+    compiled = _format_registry.compiled(format_name)
+    if compiled is not None:
+        return compiled.parse_epoch_ns
+    
+    def parse_unix(date_string: str) -> Optional[int]:
+        ns, name = _unix_local_epoch_ns(date_string)
+        return ns if name == format_name else None
+    return parse_unix
+
+
+class ParseCache:
+    """
+    Bounded LRU cache of detect_datetime_format results, keyed on the raw string.
+    
+    Log streams repeat the same timestamp string for every event in the same
+    second, so most lookups after the first are hits. Counters:
+        hits, misses, evictions
+    """
+    
+    def __init__(self, maxsize: int = 4096):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def __len__(self) -> int:
+        return len(self._data)
+    
+    def get(self, date_string: str) -> Optional[Tuple[Optional[datetime], Optional[str]]]:
+        """Return the cached result for date_string, or None on a miss."""
+        result = self._data.get(date_string)
+        if result is None:
+            self.misses += 1
+            return None
+        self._data.move_to_end(date_string)
+        self.hits += 1
+        return result
+    
+    def put(self, date_string: str, result: Tuple[Optional[datetime], Optional[str]]) -> None:
+        """Store a result, evicting the least recently used entry when full."""
+        self._data[date_string] = result
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+    
+    def clear(self) -> None:
+        """Drop all entries and reset the counters."""
+        self._data.clear()
+        self.hits = self.misses = self.evictions = 0
+    
+    def stats(self) -> dict:
+        """Return the counters as a dict."""
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+# Shared by detect_datetime_format, and through it parse_datetime and
+# sort_datetimes. None when caching is turned off.
+_parse_cache: Optional[ParseCache] = ParseCache()
+
+
+def set_parse_cache(maxsize: Optional[int]) -> Optional[ParseCache]:
+    """
+    Replace the shared parse cache.
+    
+    Args:
+        maxsize: Maximum number of cached strings, or None to turn caching off
+        
+    Returns:
+        The new cache, or None if caching was turned off
+    """
+    global _parse_cache
+    _parse_cache = ParseCache(maxsize) if maxsize is not None else None
+    return _parse_cache
+
+
+def get_parse_cache() -> Optional[ParseCache]:
+    """Return the shared parse cache (None if caching is off)."""
+    return _parse_cache
+
+
+def clear_parse_cache() -> None:
+    """Empty the shared parse cache and reset its counters."""
+    if _parse_cache is not None:
+        _parse_cache.clear()
+
+
 def detect_datetime_format(date_string: str) -> Tuple[Optional[datetime], Optional[str]]:
     """
     Automatically detect the format of a date string and return both the datetime object
@@ -32,74 +745,160 @@ def detect_datetime_format(date_string: str) -> Tuple[Optional[datetime], Option
     Returns:
         A tuple of (datetime object, format name) if parsing succeeds, (None, None) otherwise
     """
+    cache = _parse_cache
+    if cache is None:
+        return _detect_datetime_format(date_string)
+    
+    result = cache.get(date_string)
+    if result is None:
+        result = _detect_datetime_format(date_string)
+        cache.put(date_string, result)
+    return result
+
+
+def _detect_datetime_format(date_string: str) -> Tuple[Optional[datetime], Optional[str]]:
+    # The uncached detector behind detect_datetime_format
+    
     # Clean the string
     date_string = date_string.strip()
     
-    # Check if it's a Unix timestamp (all digits, 10 or 13 digits)
-    if date_string.isdigit():
-        try:
-            timestamp = int(date_string)
-            # Handle both seconds (10 digits) and milliseconds (13 digits)
-            if len(date_string) == 13:
-                dt = datetime.fromtimestamp(timestamp / 1000)
-                return dt, "Unix timestamp (milliseconds)"
-            elif len(date_string) == 10:
-                dt = datetime.fromtimestamp(timestamp)
-                return dt, "Unix timestamp (seconds)"
-        except (ValueError, OSError):
-            pass
-    
-    # Dictionary mapping format strings to human-readable names
-    format_types = {
-        # ISO 8601 formats with timezone
-        "%Y-%m-%dT%H:%M:%S%z": "ISO 8601 (with timezone)",
-        "%Y-%m-%dT%H:%M:%S.%f%z": "ISO 8601 (with microseconds and timezone)",
-        "%Y-%m-%d %H:%M:%S%z": "ISO 8601 (datetime with timezone)",
-        "%Y-%m-%d %H:%M:%S.%f%z": "ISO 8601 (datetime with microseconds and timezone)",
+    # Check if it's a Unix timestamp (all digits, 10/13/16/19 digits, or
+    # seconds with a fraction)
+    dt, format_name = _parse_unix(date_string)
+    if dt is not None:
+        return dt, format_name
+    
+    # One regex pass picks the first matching format
+    return _format_registry.parse(date_string)
+
+
+def infer_format(date_strings: Iterable[str], sample_size: int = 100) -> Optional[str]:
+    """
+    Guess the format of a column of date strings from its first few values.
+    
+    Args:
+        date_strings: The column values (only the first sample_size are read)
+        sample_size: How many values to run full detection on
         
-        # ISO 8601 formats
-        "%Y-%m-%d %H:%M:%S": "ISO 8601 (datetime)",
-        "%Y-%m-%dT%H:%M:%S": "ISO 8601 (T-separated)",
-        "%Y-%m-%dT%H:%M:%S.%f": "ISO 8601 (with microseconds)",
-        "%Y-%m-%dT%H:%M:%SZ": "ISO 8601 (UTC/Zulu)",
-        "%Y-%m-%dT%H:%M:%S.%fZ": "ISO 8601 (UTC with microseconds)",
-        "%Y-%m-%d": "ISO 8601 (date only)",
+    Returns:
+        The most common format name in the sample, or None if nothing parsed
+    """
+    counts = Counter()
+    for date_str in islice(date_strings, sample_size):
+        _, format_name = detect_datetime_format(date_str)
+        if format_name:
+            counts[format_name] += 1
+    if not counts:
+        return None
+    return counts.most_common(1)[0][0]
+
+
+class ColumnParser:
+    """
+    Parse a column of date strings that are expected to share one format.
+    
+    Every value is first tried with the column's format only. Values that do not
+    fit it fall back to full detection with detect_datetime_format. Note that an
+    ambiguous value such as "03/04/2024" is read with the column's format, which
+    may differ from what detect_datetime_format would pick on its own.
+    
+    The counters show how well the column's format fits:
+        parsed:    values parsed with the column format
+        fallbacks: values that needed full detection and got a result
+        failed:    values that could not be parsed at all
+    """
+    
+    def __init__(self, format_name: Optional[str]):
+        self.format_name = format_name
+        self.parsed = 0
+        self.fallbacks = 0
+        self.failed = 0
+        self._parse_one = _single_format_parser(format_name)
+        self._parse_one_ns = _single_format_epoch_parser(format_name)
+    
+    @classmethod
+    def from_sample(cls, date_strings: List[str], sample_size: int = 100) -> "ColumnParser":
+        """Build a parser for the format infer_format finds in the first sample_size values."""
+        return cls(infer_format(date_strings, sample_size))
+    
+    @property
+    def fallback_rate(self) -> float:
+        """Fraction of values that did not fit the column format."""
+        total = self.parsed + self.fallbacks + self.failed
+        return (self.fallbacks + self.failed) / total if total else 0.0
+    
+    def detect(self, date_string: str) -> Tuple[Optional[datetime], Optional[str]]:
+        """
+        Same contract as detect_datetime_format, but tries the column format first.
         
-        # US formats
-        "%m/%d/%Y": "US format (MM/DD/YYYY)",
-        "%m/%d/%Y %H:%M:%S": "US format (MM/DD/YYYY with time)",
-        "%m/%d/%y": "US format (MM/DD/YY)",
-        "%m-%d-%Y": "US format (MM-DD-YYYY)",
+        Args:
+            date_string: The date string to parse
+            
+        Returns:
+            A tuple of (datetime object, format name) if parsing succeeds, (None, None) otherwise
+        """
+        dt = self._parse_one(date_string.strip())
+        if dt is not None:
+            self.parsed += 1
+            return dt, self.format_name
         
-        # European formats
-        "%d/%m/%Y": "European format (DD/MM/YYYY)",
-        "%d/%m/%Y %H:%M:%S": "European format (DD/MM/YYYY with time)",
-        "%d-%m-%Y": "European format (DD-MM-YYYY)",
-        "%d.%m.%Y": "European format (DD.MM.YYYY)",
+        dt, format_name = detect_datetime_format(date_string)
+        if dt is None:
+            self.failed += 1
+        else:
+            self.fallbacks += 1
+        return dt, format_name
+    
+    def detect_epoch_ns(self, date_string: str) -> Tuple[Optional[int], Optional[str]]:
+        """
+        Same contract as detect_epoch_ns, but tries the column format first.
         
-        # Text month formats
-        "%B %d, %Y": "Long month format (Month DD, YYYY)",
-        "%b %d, %Y": "Short month format (Mon DD, YYYY)",
-        "%d %B %Y": "European text format (DD Month YYYY)",
-        "%d %b %Y": "European text format (DD Mon YYYY)",
+        Args:
+            date_string: The date string to parse
+            
+        Returns:
+            A tuple of (epoch nanoseconds, format name) if parsing succeeds, (None, None) otherwise
+        """
+        ns = self._parse_one_ns(date_string.strip())
+        if ns is not None:
+            self.parsed += 1
+            return ns, self.format_name
         
-        # Other common formats
-        "%Y/%m/%d": "Asian format (YYYY/MM/DD)",
-        "%Y/%m/%d %H:%M:%S": "Asian format (YYYY/MM/DD with time)",
-        "%d-%b-%Y": "Short month format (DD-Mon-YYYY)",
-        "%Y%m%d": "Compact format (YYYYMMDD)",
-    }
-    
-    # Try each format
-    for fmt, format_name in format_types.items():
-        try:
-            dt = datetime.strptime(date_string, fmt)
-            return dt, format_name
-        except ValueError:
-            continue
+        ns, format_name = detect_epoch_ns(date_string)
+        if ns is None:
+            self.failed += 1
+        else:
+            self.fallbacks += 1
+        return ns, format_name
     
-    # If none of the formats work, return None, None
-    return None, None
+    def stats(self) -> dict:
+        """Return the counters as a dict."""
+        return {
+            "format": self.format_name,
+            "parsed": self.parsed,
+            "fallbacks": self.fallbacks,
+            "failed": self.failed,
+            "fallback_rate": self.fallback_rate,
+        }
+
+
+def parse_datetimes(date_strings: List[str], sample_size: int = 100) -> Tuple[List[Tuple[Optional[datetime], Optional[str]]], ColumnParser]:
+    """
+    Parse a whole column of date strings that share one format.
+    
+    The format is inferred from the first sample_size values and then used for
+    every value, with full detection only for values that do not fit.
+    
+    Args:
+        date_strings: List of date strings to parse
+        sample_size: How many values to sample when inferring the format
+        
+    Returns:
+        A list of (datetime object, format name) tuples in input order, and the
+        ColumnParser used (see its counters for the fallback rate)
+    """
+    parser = ColumnParser.from_sample(date_strings, sample_size)
+    return [parser.detect(date_str) for date_str in date_strings], parser
 
 
 def parse_datetime(date_string: str) -> Optional[datetime]:
@@ -134,6 +933,154 @@ def print_datetime_format(date_string: str) -> None:
         print(f"'{date_string}' -> Unknown format (could not parse)")
 
 
+# Directives that fill a fixed-width number from a datetime attribute
+_NUMERIC_FIELDS = {
+    "Y": ("%04d", "year"),
+    "y": ("%02d", "year"),
+    "m": ("%02d", "month"),
+    "d": ("%02d", "day"),
+    "H": ("%02d", "hour"),
+    "M": ("%02d", "minute"),
+    "S": ("%02d", "second"),
+    "f": ("%06d", "microsecond"),
+}
+
+
+def _format_offset(d: datetime) -> str:
+    # Same output as strftime("%z"): "" for naive, else +HHMM[SS[.ffffff]]
+    offset = d.utcoffset()
+    if offset is None:
+        return ""
+    sign = "+"
+    if offset.days < 0:
+        sign = "-"
+        offset = -offset
+    minutes, seconds = divmod(offset.seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    result = "%s%02d%02d" % (sign, hours, minutes)
+    if seconds or offset.microseconds:
+        result += "%02d" % seconds
+        if offset.microseconds:
+            result += ".%06d" % offset.microseconds
+    return result
+
+
+def _compile_formatter(fmt: str) -> Callable[[datetime], str]:
+    # Numeric layouts are filled into a "%04d-%02d-..." template straight from
+    # the datetime's attributes, which is about twice as fast as strftime.
+    # Text months stay on strftime so they follow the locale, as does any
+    # layout with an offset other than at the end.
+    with_offset = fmt.endswith("%z")
+    if with_offset:
+        fmt_body = fmt[:-2]
+    else:
+        fmt_body = fmt
+    if not set(re.findall("%(.)", fmt_body)) <= _NUMERIC_FIELDS.keys():
+        return lambda d: d.strftime(fmt)
+    
+    template = ""
+    attrs = []
+    short_year = None
+    pos = 0
+    while pos < len(fmt_body):
+        ch = fmt_body[pos]
+        if ch == "%":
+            directive = fmt_body[pos + 1]
+            spec, attr = _NUMERIC_FIELDS[directive]
+            if directive == "y":
+                short_year = len(attrs)
+            template += spec
+            attrs.append(attr)
+            pos += 2
+            continue
+        template += ch
+        pos += 1
+    
+    get_values = attrgetter(*attrs)
+    if short_year is not None:
+        get_full_values = get_values
+        
+        def get_values(d: datetime) -> tuple:
+            values = list(get_full_values(d))
+            values[short_year] %= 100
+            return tuple(values)
+    
+    def format_fixed(d: datetime) -> str:
+        # strftime does not zero-pad %Y below 1000, so leave those to it
+        if d.year < 1000:
+            return d.strftime(fmt)
+        if with_offset:
+            return template % get_values(d) + _format_offset(d)
+        return template % get_values(d)
+    
+    return format_fixed
+
+
+def _timestamp_us(d: datetime) -> int:
+    # d.timestamp() in whole microseconds, without float rounding
+    return int(d.replace(microsecond=0).timestamp()) * 1000000 + d.microsecond
+
+
+# Shared by detect_datetime_format, detect_epoch_ns and get_formatter. Holds
+# FORMAT_TYPES in order, with their formatters compiled once at import.
+_format_registry = FormatRegistry()
+for _fmt, _name in FORMAT_TYPES.items():
+    _format_registry.register(_name, _fmt)
+# Unix timestamps are parsed before the registry is tried
+_format_registry.add_formatter("Unix timestamp (seconds)", lambda d: str(int(d.timestamp())))
+_format_registry.add_formatter("Unix timestamp (milliseconds)", lambda d: str(int(d.timestamp() * 1000)))
+_format_registry.add_formatter("Unix timestamp (microseconds)", lambda d: str(_timestamp_us(d)))
+_format_registry.add_formatter("Unix timestamp (nanoseconds)", lambda d: str(_timestamp_us(d) * 1000))
+_format_registry.add_formatter("Unix timestamp (fractional seconds)",
+                               lambda d: "%d.%06d" % divmod(_timestamp_us(d), 1000000))
+
+
+def get_format_registry() -> FormatRegistry:
+    """Return the shared format registry (see its stats() for hit counts)."""
+    return _format_registry
+
+
+def register_format(name: str, fmt: str, formatter: Optional[Callable[[datetime], str]] = None) -> None:
+    """
+    Add a custom format to the shared registry, after all existing formats.
+    
+    Args:
+        name: The format name that detection returns and get_formatter accepts
+        fmt: strptime-style format using %Y %y %m %B %b %d %H %M %S %f %z,
+            e.g. "%b %d %H:%M:%S" (syslog) or "%d/%b/%Y:%H:%M:%S %z" (Apache CLF)
+        formatter: Function that formats a datetime in this format
+            (default: one compiled from fmt)
+            
+    Raises:
+        ValueError: If the name is taken, fmt uses another directive, or there
+            would be more than 256 format names (codes are one byte)
+    """
+    global FORMAT_NAMES
+    if name not in FORMAT_CODES and len(FORMAT_NAMES) >= 256:
+        raise ValueError("Too many formats")
+    _format_registry.register(name, fmt, formatter)
+    if name not in FORMAT_CODES:
+        FORMAT_CODES[name] = len(FORMAT_NAMES)
+        FORMAT_NAMES += (name,)
+    # Strings that failed before may parse now
+    clear_parse_cache()
+
+
+def get_formatter(format_type: str) -> Callable[[datetime], str]:
+    """
+    Return a precompiled function that formats a datetime in the given format.
+    
+    Args:
+        format_type: The format type (e.g., "ISO 8601 (UTC/Zulu)", "Unix timestamp (seconds)", etc.)
+        
+    Returns:
+        A callable taking a datetime and returning the same string as
+        datetime_to_string(dt, format_type)
+    """
+    # Default to ISO 8601 if format type not recognized
+    return _format_registry.formatter(format_type) or datetime.isoformat
+
+
 def datetime_to_string(dt: datetime, format_type: str) -> str:
     """
     Convert a datetime object back to a string in the specified format.
@@ -145,72 +1092,154 @@ def datetime_to_string(dt: datetime, format_type: str) -> str:
     Returns:
         A formatted string representation of the datetime
     """
-    format_map = {
-        # Unix timestamps
-        "Unix timestamp (seconds)": lambda d: str(int(d.timestamp())),
-        "Unix timestamp (milliseconds)": lambda d: str(int(d.timestamp() * 1000)),
+    return get_formatter(format_type)(dt)
+
+
+def format_many(values: Iterable, format_type: str) -> List[str]:
+    """
+    Format many timestamps at once.
+    
+    Args:
+        values: datetimes, or integer epoch nanoseconds (e.g. TimestampColumn.epoch_ns),
+            which are formatted as UTC datetimes
+        format_type: The format type, as for datetime_to_string
         
-        # ISO 8601 formats with timezone
-        "ISO 8601 (with timezone)": lambda d: d.strftime("%Y-%m-%dT%H:%M:%S%z"),
-        "ISO 8601 (with microseconds and timezone)": lambda d: d.strftime("%Y-%m-%dT%H:%M:%S.%f%z"),
-        "ISO 8601 (datetime with timezone)": lambda d: d.strftime("%Y-%m-%d %H:%M:%S%z"),
-        "ISO 8601 (datetime with microseconds and timezone)": lambda d: d.strftime("%Y-%m-%d %H:%M:%S.%f%z"),
+    Returns:
+        A list of formatted strings, in input order
+    """
+    formatter = get_formatter(format_type)
+    result = []
+    append = result.append
+    for value in values:
+        if not isinstance(value, datetime):
+            value = _EPOCH + timedelta(microseconds=int(value) // 1000)
+        append(formatter(value))
+    return result
+
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_EPOCH_NAIVE = datetime(1970, 1, 1)
+_ONE_MICROSECOND = timedelta(microseconds=1)
+_ONE_SECOND = timedelta(seconds=1)
+
+
+def datetime_to_epoch_ns(dt: datetime) -> int:
+    """
+    Convert a datetime to integer nanoseconds since the Unix epoch.
+    
+    Args:
+        dt: The datetime to convert. Naive datetimes are treated as UTC, the same
+            way sort_datetimes(make_aware=True) treats them.
         
-        # ISO 8601 formats
-        "ISO 8601 (datetime)": lambda d: d.strftime("%Y-%m-%d %H:%M:%S"),
-        "ISO 8601 (T-separated)": lambda d: d.strftime("%Y-%m-%dT%H:%M:%S"),
-        "ISO 8601 (with microseconds)": lambda d: d.strftime("%Y-%m-%dT%H:%M:%S.%f"),
-        "ISO 8601 (UTC/Zulu)": lambda d: d.strftime("%Y-%m-%dT%H:%M:%SZ"),
-        "ISO 8601 (UTC with microseconds)": lambda d: d.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
-        "ISO 8601 (date only)": lambda d: d.strftime("%Y-%m-%d"),
+    Returns:
+        Nanoseconds since 1970-01-01T00:00:00Z
+    """
+    epoch = _EPOCH_NAIVE if dt.tzinfo is None else _EPOCH
+    return (dt - epoch) // _ONE_MICROSECOND * 1000
+
+
+def detect_epoch_ns(date_string: str) -> Tuple[Optional[int], Optional[str]]:
+    """
+    Detect the format of a date string and return it as integer nanoseconds
+    since the Unix epoch, without making a datetime.
+    
+    Picks the same format as detect_datetime_format and gives the same value as
+    datetime_to_epoch_ns on its result: naive times are taken as UTC, and that
+    includes Unix timestamps, which detect_datetime_format gives as naive local
+    times. Sorting by this value therefore orders strings the way
+    sort_datetimes does. Nanosecond digits of 19-digit and fractional
+    timestamps are kept.
+    
+    Args:
+        date_string: The date string to parse
         
-        # US formats
-        "US format (MM/DD/YYYY)": lambda d: d.strftime("%m/%d/%Y"),
-        "US format (MM/DD/YYYY with time)": lambda d: d.strftime("%m/%d/%Y %H:%M:%S"),
-        "US format (MM/DD/YY)": lambda d: d.strftime("%m/%d/%y"),
-        "US format (MM-DD-YYYY)": lambda d: d.strftime("%m-%d-%Y"),
+    Returns:
+        A tuple of (epoch nanoseconds, format name) if parsing succeeds, (None, None) otherwise
+    """
+    date_string = date_string.strip()
+    ns, format_name = _unix_local_epoch_ns(date_string)
+    if ns is not None:
+        return ns, format_name
+    
+    return _format_registry.parse(date_string, epoch_ns=True)
+
+
+def parse_epoch_ns(date_string: str) -> Optional[int]:
+    """
+    Convert a date string of any detected format to UTC epoch nanoseconds.
+    
+    Args:
+        date_string: The date string to parse
         
-        # European formats
-        "European format (DD/MM/YYYY)": lambda d: d.strftime("%d/%m/%Y"),
-        "European format (DD/MM/YYYY with time)": lambda d: d.strftime("%d/%m/%Y %H:%M:%S"),
-        "European format (DD-MM-YYYY)": lambda d: d.strftime("%d-%m-%Y"),
-        "European format (DD.MM.YYYY)": lambda d: d.strftime("%d.%m.%Y"),
+    Returns:
+        Nanoseconds since 1970-01-01T00:00:00Z (see detect_epoch_ns), or None
+    """
+    return detect_epoch_ns(date_string)[0]
+
+
+# Distinct strings iter_epoch_ns remembers before starting over
+_EPOCH_MEMO_SIZE = 4096
+
+
+def iter_epoch_ns(date_strings: Iterable[str]) -> Iterator[Tuple[Optional[int], Optional[str]]]:
+    """
+    Run detect_epoch_ns over a stream of date strings.
+    
+    Logs repeat the same string for every event in the same second, so recent
+    results are remembered and a repeat costs one dict lookup.
+    
+    Args:
+        date_strings: The date strings to parse
         
-        # Text month formats
-        "Long month format (Month DD, YYYY)": lambda d: d.strftime("%B %d, %Y"),
-        "Short month format (Mon DD, YYYY)": lambda d: d.strftime("%b %d, %Y"),
-        "European text format (DD Month YYYY)": lambda d: d.strftime("%d %B %Y"),
-        "European text format (DD Mon YYYY)": lambda d: d.strftime("%d %b %Y"),
+    Yields:
+        (epoch nanoseconds, format name) per string in input order, (None, None)
+        for strings that cannot be parsed
+    """
+    memo = {}
+    for date_string in date_strings:
+        result = memo.get(date_string)
+        if result is None:
+            result = detect_epoch_ns(date_string)
+            if len(memo) >= _EPOCH_MEMO_SIZE:
+                memo.clear()
+            memo[date_string] = result
+        yield result
+
+
+def parse_epoch_ns_many(date_strings: Iterable[str]) -> List[Optional[int]]:
+    """
+    Convert many date strings to UTC epoch nanoseconds.
+    
+    Args:
+        date_strings: The date strings to parse
         
-        # Other common formats
-        "Asian format (YYYY/MM/DD)": lambda d: d.strftime("%Y/%m/%d"),
-        "Asian format (YYYY/MM/DD with time)": lambda d: d.strftime("%Y/%m/%d %H:%M:%S"),
-        "Short month format (DD-Mon-YYYY)": lambda d: d.strftime("%d-%b-%Y"),
-        "Compact format (YYYYMMDD)": lambda d: d.strftime("%Y%m%d"),
-    }
-    
-    if format_type in format_map:
-        return format_map[format_type](dt)
-    else:
-        # Default to ISO 8601 if format type not recognized
-        return dt.isoformat()
+    Returns:
+        A list of nanoseconds since the epoch (None where a string could not be
+        parsed), in input order
+    """
+    return [ns for ns, _ in iter_epoch_ns(date_strings)]
 
 
-def sort_datetimes(date_strings: List[str], make_aware: bool = True) -> List[Tuple[datetime, str, str]]:
+def sort_datetimes(date_strings: List[str], make_aware: bool = True, sample_size: int = 0) -> List[Tuple[datetime, str, str]]:
     """
     Parse, sort, and return datetime strings with their format information.
     
     Args:
         date_strings: List of date strings to parse and sort
         make_aware: If True, make all datetimes timezone-aware (UTC) for proper sorting
+        sample_size: If > 0, infer one format for the whole list from this many
+            values and parse with it (see ColumnParser) instead of detecting each string
         
     Returns:
         List of tuples: (datetime_object, format_type, original_string) sorted chronologically
     """
     parsed_data = []
+    detect = detect_datetime_format
+    if sample_size > 0:
+        detect = ColumnParser.from_sample(date_strings, sample_size).detect
     
     for date_str in date_strings:
-        dt, format_type = detect_datetime_format(date_str)
+        dt, format_type = detect(date_str)
         if dt:
             # Make timezone-aware for proper sorting if requested
             if make_aware and dt.tzinfo is None:
@@ -227,6 +1256,10 @@ def sort_datetimes(date_strings: List[str], make_aware: bool = True) -> List[Tup
 
 # Example usage and tests
 if __name__ == "__main__":
+    if len(sys.argv) > 2:
+        # python -m ts_convert parse|detect|sort|convert FILE [options]
+        import ts_parallel
+        sys.exit(ts_parallel.main(sys.argv[1:]))
     if len(sys.argv) == 2:
         list_func()
         sys.exit(0)
@@ -0,0 +1,188 @@
+"""
+External-memory sort for timestamp files larger than RAM.
+Reads a file of date strings (one per line) in chunks, parses each line
+straight to epoch ns with ts_convert.iter_epoch_ns, writes each chunk as a
+sorted run of fixed-size binary records to a temp file, then k-way merges the
+runs with heapq.
+
+Each record is (epoch_ns int64, byte offset of the line in the input int64,
+format code uint8), 17 bytes on disk. The original text is re-read from the
+input file by offset when the merged output is produced.
+
+    python3 ts_extsort.py <timestamps.txt> [memory_budget_mb]
+"""
+
+from datetime import datetime, timezone
+from typing import BinaryIO, Iterator, List, Tuple
+import heapq
+import itertools
+import os
+import struct
+import sys
+import tempfile
+
+import ts_convert
+
+RECORD = struct.Struct("<qqB")
+# Rough in-memory cost of one (epoch, offset, code) tuple while a run is built
+_IN_MEMORY_RECORD_BYTES = 120
+_INT64_MIN = -(2 ** 63)
+_INT64_MAX = 2 ** 63 - 1
+# How many runs are merged at once; more runs than this get merged in passes
+MAX_FAN_IN = 64
+
+
+def _read_run(path: str, buffer_records: int = 4096) -> Iterator[Tuple[int, int, int]]:
+    # Stream (epoch_ns, offset, code) records back from a run file
+    block = RECORD.size * buffer_records
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(block)
+            if not data:
+                return
+            yield from RECORD.iter_unpack(data)
+
+
+def _write_run(records: List[Tuple[int, int, int]], tmpdir: str) -> str:
+    fd, path = tempfile.mkstemp(suffix=".run", dir=tmpdir)
+    with os.fdopen(fd, "wb", buffering=1 << 20) as out:
+        pack = RECORD.pack
+        for record in records:
+            out.write(pack(*record))
+    return path
+
+
+def _merge_runs(paths: List[str], tmpdir: str) -> List[str]:
+    # Merge runs in groups of MAX_FAN_IN until one merge can take them all
+    while len(paths) > MAX_FAN_IN:
+        merged = []
+        for i in range(0, len(paths), MAX_FAN_IN):
+            group = paths[i:i + MAX_FAN_IN]
+            fd, path = tempfile.mkstemp(suffix=".run", dir=tmpdir)
+            with os.fdopen(fd, "wb", buffering=1 << 20) as out:
+                for record in heapq.merge(*(_read_run(p) for p in group)):
+                    out.write(RECORD.pack(*record))
+            for p in group:
+                os.remove(p)
+            merged.append(path)
+        paths = merged
+    return paths
+
+
+def _lines(f: BinaryIO) -> Iterator[Tuple[int, str]]:
+    # (byte offset, text) of each non-blank line
+    offset = 0
+    for raw in f:
+        line_offset = offset
+        offset += len(raw)
+        date_str = raw.decode("utf-8").rstrip("\r\n")
+        if date_str.strip():
+            yield line_offset, date_str
+
+
+def sorted_records(path: str, memory_budget: int = 256 * 1024 * 1024, tmpdir: str = None) -> Iterator[Tuple[int, int, int]]:
+    """
+    Sort the date strings in a file without holding them all in memory.
+
+    Args:
+        path: Input file with one date string per line
+        memory_budget: Approximate bytes of records to hold in memory per run
+        tmpdir: Where to put the run files (default: the system temp directory)
+
+    Yields:
+        (epoch_ns, byte_offset, format_code) in chronological order. Ties keep
+        input order. Lines that cannot be parsed are skipped with a warning.
+    """
+    run_size = max(1, memory_budget // _IN_MEMORY_RECORD_BYTES)
+    format_codes = ts_convert.FORMAT_CODES
+
+    with tempfile.TemporaryDirectory(prefix="ts_extsort_", dir=tmpdir) as rundir:
+        runs = []
+        chunk = []
+        with open(path, "rb") as f:
+            lines, texts = itertools.tee(_lines(f))
+            parsed = ts_convert.iter_epoch_ns(date_str for _, date_str in texts)
+            for (line_offset, date_str), (ns, format_type) in zip(lines, parsed):
+                if ns is None:
+                    print(f"Warning: Could not parse '{date_str}'")
+                    continue
+                if not _INT64_MIN <= ns <= _INT64_MAX:
+                    print(f"Warning: '{date_str}' is outside the int64 nanosecond range")
+                    continue
+
+                chunk.append((ns, line_offset, format_codes[format_type]))
+                if len(chunk) >= run_size:
+                    chunk.sort()
+                    runs.append(_write_run(chunk, rundir))
+                    chunk = []
+
+        if chunk:
+            chunk.sort()
+            if not runs:
+                # Everything fit in one run, no need to touch the disk
+                yield from chunk
+                return
+            runs.append(_write_run(chunk, rundir))
+            chunk = []
+
+        runs = _merge_runs(runs, rundir)
+        yield from heapq.merge(*(_read_run(p) for p in runs))
+
+
+def _read_line(f: BinaryIO, offset: int) -> str:
+    f.seek(offset)
+    return f.readline().decode("utf-8").rstrip("\r\n")
+
+
+def external_sort_datetimes(path: str, memory_budget: int = 256 * 1024 * 1024, make_aware: bool = True) -> Iterator[Tuple[datetime, str, str]]:
+    """
+    Streaming counterpart of ts_convert.sort_datetimes for a file of date strings.
+
+    Args:
+        path: Input file with one date string per line
+        memory_budget: Approximate bytes of records to hold in memory per run
+        make_aware: If True, make all datetimes timezone-aware (UTC)
+
+    Yields:
+        (datetime_object, format_type, original_string) in chronological order,
+        the same tuples sort_datetimes returns for the file's lines
+    """
+    with open(path, "rb") as f:
+        for _, offset, code in sorted_records(path, memory_budget):
+            original = _read_line(f, offset)
+            dt, _ = ts_convert.detect_datetime_format(original)
+            if make_aware and dt.tzinfo is None:
+                dt = dt.replace(tzinfo=timezone.utc)
+            yield dt, ts_convert.FORMAT_NAMES[code], original
+
+
+def sort_file(path: str, out, memory_budget: int = 256 * 1024 * 1024) -> int:
+    """
+    Write the lines of a timestamp file to out in chronological order.
+
+    Args:
+        path: Input file with one date string per line
+        out: A text stream to write the sorted lines to
+        memory_budget: Approximate bytes of records to hold in memory per run
+
+    Returns:
+        The number of lines written
+    """
+    count = 0
+    with open(path, "rb") as f:
+        for _, offset, _ in sorted_records(path, memory_budget):
+            out.write(_read_line(f, offset) + "\n")
+            count += 1
+    return count
+
+
+def main():
+    if len(sys.argv) not in (2, 3):
+        print(f"Usage: {sys.argv[0]} <timestamps.txt> [memory_budget_mb]")
+        sys.exit(1)
+    budget = int(sys.argv[2]) * 1024 * 1024 if len(sys.argv) == 3 else 256 * 1024 * 1024
+    sort_file(sys.argv[1], sys.stdout, budget)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""
+Multiprocess parse/detect/convert/sort of timestamp files.
+The input is split into byte ranges that end on line boundaries, and each
+range is handled by a worker in a process pool. For sort, each worker returns
+its range as pre-sorted arrays (epoch ns, byte offset, format code) and the
+parent k-way merges them.
+
+Run through ts_convert (from this directory):
+
+    python3 -m ts_convert parse|detect|sort|convert FILE [--workers N]
+        [--chunk-size BYTES] [--output-format "FORMAT NAME"]
+        [--stats table|prometheus]
+
+--stats writes the time spent in each stage (see ts_stats), lines read and
+unparseable, and parse cache hits to stderr when the run ends.
+"""
+
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timezone
+from typing import Iterator, List, Optional, Tuple
+import argparse
+import functools
+import heapq
+import os
+import sys
+
+import ts_convert
+import ts_stats
+
+COMMANDS = ("parse", "detect", "sort", "convert")
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def chunk_ranges(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> List[Tuple[int, int]]:
+    """
+    Split a file into (start, end) byte ranges of about chunk_size bytes.
+    Each range ends just after a newline (or at EOF), so no line is split.
+    """
+    size = os.path.getsize(path)
+    ranges = []
+    with open(path, "rb") as f:
+        start = 0
+        while start < size:
+            f.seek(min(start + chunk_size, size))
+            f.readline()
+            end = min(f.tell(), size)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def _read_range(path: str, start: int, end: int) -> bytes:
+    with open(path, "rb") as f:
+        f.seek(start)
+        return f.read(end - start)
+
+
+def _lines(data: bytes, start: int) -> Iterator[Tuple[int, str]]:
+    # (byte offset in the file, line text) for each non-blank line
+    offset = start
+    for raw in data.splitlines(keepends=True):
+        line_offset = offset
+        offset += len(raw)
+        line = raw.decode("utf-8").rstrip("\r\n")
+        if line.strip():
+            yield line_offset, line
+
+
+def _warn(line: str) -> None:
+    print(f"Warning: Could not parse '{line}'", file=sys.stderr)
+
+
+def _render(dt, format_name: str, output_format: Optional[str]) -> str:
+    if output_format:
+        return ts_convert.datetime_to_string(dt, output_format)
+    return dt.isoformat()
+
+
+def _process_range(path: str, start: int, end: int, command: str, output_format: Optional[str]) -> str:
+    # Worker for parse/detect/convert: returns the output text for one range
+    detect = ts_stats.timed("parse", ts_convert.detect_datetime_format)
+    render = ts_stats.timed("format", _render)
+    to_string = ts_stats.timed("format", ts_convert.datetime_to_string)
+    out = []
+    invalid = 0
+    for _, line in _lines(ts_stats.timed("read", _read_range)(path, start, end), start):
+        dt, format_name = detect(line)
+        if dt is None:
+            invalid += 1
+            if command == "detect":
+                out.append(f"{line}\tUnknown format")
+            else:
+                _warn(line)
+            continue
+        if command == "detect":
+            out.append(f"{line}\t{format_name}")
+        elif command == "parse":
+            out.append(f"{line}\t{render(dt, format_name, output_format)}")
+        else:
+            # convert: same format by default, so a round trip can be checked
+            out.append(to_string(dt, output_format or format_name))
+    ts_stats.count("lines_read", len(out) if command == "detect" else len(out) + invalid)
+    ts_stats.count("lines_invalid", invalid)
+    return "".join(s + "\n" for s in out)
+
+
+def _sort_range(path: str, start: int, end: int) -> Tuple[bytes, bytes, bytes]:
+    # Worker for sort: returns the range's records sorted, as packed arrays
+    format_codes = ts_convert.FORMAT_CODES
+    records = []
+    lines = list(_lines(ts_stats.timed("read", _read_range)(path, start, end), start))
+    parsed = ts_stats.timed_iter("parse", ts_convert.iter_epoch_ns(line for _, line in lines))
+    for (offset, line), (ns, format_name) in zip(lines, parsed):
+        if ns is None:
+            _warn(line)
+            continue
+        records.append((ns, offset, format_codes[format_name]))
+    ts_stats.count("lines_read", len(lines))
+    ts_stats.count("lines_invalid", len(lines) - len(records))
+    with ts_stats.stage("sort"):
+        records.sort()
+        epoch_ns = array("q", [r[0] for r in records])
+        offsets = array("q", [r[1] for r in records])
+        codes = array("B", [r[2] for r in records])
+    return epoch_ns.tobytes(), offsets.tobytes(), codes.tobytes()
+
+
+def _unpack_run(packed: Tuple[bytes, bytes, bytes]) -> Iterator[Tuple[int, int, int]]:
+    epoch_ns, offsets, codes = array("q"), array("q"), array("B")
+    epoch_ns.frombytes(packed[0])
+    offsets.frombytes(packed[1])
+    codes.frombytes(packed[2])
+    return zip(epoch_ns, offsets, codes)
+
+
+def _counting_worker(fn, *args):
+    # fn(*args) for --stats: the time fn spends outside the stages it times
+    # is the "worker" stage, and its parse cache hits and misses are counted
+    cache = ts_convert.get_parse_cache()
+    hits, misses = (cache.hits, cache.misses) if cache is not None else (0, 0)
+    result = ts_stats.timed("worker", fn)(*args)
+    if cache is not None:
+        ts_stats.count("parse_cache_hits", cache.hits - hits)
+        ts_stats.count("parse_cache_misses", cache.misses - misses)
+    return result
+
+
+def _map(workers: int, fn, *iterables) -> Iterator:
+    # Ordered map over a process pool, or inline for a single worker. With
+    # --stats on each call collects its own stats and they are merged in.
+    if ts_stats.STATS is not None:
+        fn = functools.partial(_counting_worker, fn)
+    if workers <= 1:
+        yield from ts_stats.pool_map(None, fn, *iterables)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from ts_stats.pool_map(pool, fn, *iterables)
+
+
+def run(command: str, path: str, out, workers: int = 0, chunk_size: int = DEFAULT_CHUNK_SIZE,
+        output_format: Optional[str] = None) -> None:
+    """
+    Run a parse/detect/convert/sort command over a file, writing results to out.
+
+    Args:
+        command: One of COMMANDS
+        path: Input file with one date string per line
+        out: Text stream for the results
+        workers: Worker processes (0 means one per CPU)
+        chunk_size: Approximate bytes per work unit
+        output_format: Format name for parse/convert/sort output (see ts_convert.FORMAT_NAMES)
+    """
+    workers = workers or os.cpu_count() or 1
+    with ts_stats.stage("split"):
+        ranges = chunk_ranges(path, chunk_size)
+    starts = [r[0] for r in ranges]
+    ends = [r[1] for r in ranges]
+    n = len(ranges)
+
+    write = ts_stats.timed("output", out.write)
+    if command != "sort":
+        for text in _map(workers, _process_range, [path] * n, starts, ends, [command] * n, [output_format] * n):
+            write(text)
+        return
+
+    runs = list(_map(workers, _sort_range, [path] * n, starts, ends))
+    merged = ts_stats.timed_iter("merge", heapq.merge(*(_unpack_run(r) for r in runs)))
+    detect = ts_stats.timed("parse", ts_convert.detect_datetime_format)
+    to_string = ts_stats.timed("format", ts_convert.datetime_to_string)
+    with ts_stats.stage("output"), open(path, "rb") as f:
+        for _, offset, _ in merged:
+            f.seek(offset)
+            line = f.readline().decode("utf-8").rstrip("\r\n")
+            if output_format:
+                dt, _ = detect(line)
+                if dt.tzinfo is None:
+                    dt = dt.replace(tzinfo=timezone.utc)
+                line = to_string(dt, output_format)
+            write(line + "\n")
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(prog="ts_convert", description="Detect, parse, convert and sort timestamp files.")
+    parser.add_argument("command", choices=COMMANDS)
+    parser.add_argument("file")
+    parser.add_argument("--workers", type=int, default=0, help="worker processes (default: one per CPU)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="bytes per work unit")
+    parser.add_argument("--output-format", default=None, help='format name for output, e.g. "ISO 8601 (UTC/Zulu)"')
+    parser.add_argument("--stats", choices=ts_stats.REPORT_FORMATS, default=None,
+                        help="write stage timings and counters to stderr at the end")
+    args = parser.parse_args(argv)
+
+    if args.output_format and args.output_format not in ts_convert.FORMAT_CODES:
+        print(f"Unknown output format: {args.output_format}", file=sys.stderr)
+        print("Available formats:", file=sys.stderr)
+        for name in ts_convert.FORMAT_NAMES:
+            print(f"  {name}", file=sys.stderr)
+        return 1
+    if args.chunk_size < 1:
+        print("--chunk-size must be positive", file=sys.stderr)
+        return 1
+
+    if args.stats:
+        ts_stats.enable()
+    run(args.command, args.file, sys.stdout, args.workers, args.chunk_size, args.output_format)
+    if args.stats:
+        sys.stdout.flush()
+        ts_stats.report(args.stats, "ts_convert")
+        ts_stats.disable()
+    return 0
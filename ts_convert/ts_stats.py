@@ -0,0 +1,285 @@
+"""
+Stage timings and counters for the ts_convert command line (--stats).
+Records how long each stage of a run took (reading, parsing, formatting,
+sorting, merging, output) and how many lines were read and could not be
+parsed, and renders them as a table or in the Prometheus text format.
+
+Collection is off unless enable() is called. While STATS is None, timed() and
+timed_iter() return what they are given and count() and peak() return at
+once, and the callers only use them once per work unit, so the per-line code
+is the same as without --stats.
+
+Stage times are exclusive: time in a stage entered from inside another is
+taken off the outer one. Workers collect into their own Stats, which come
+back with their results (see collect() and pool_map()) and are merged into
+the parent's.
+
+old/runstats.py is the same module for the log tools. The two directories
+are run as separate script trees and do not import from each other, so each
+has its own copy; they keep the same API, and a change to one belongs in the
+other.
+"""
+
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, Iterable, Iterator, Optional, TextIO, Tuple
+import functools
+import sys
+import time
+
+REPORT_FORMATS = ("table", "prometheus")
+
+
+class Stats:
+    """
+    Exclusive time per stage plus named counters and peaks.
+
+    Attributes:
+        stages: stage name -> seconds
+        counters: counter name -> count
+        peaks: name -> highest value seen
+        started: perf_counter() when collection started
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {}
+        self.peaks: Dict[str, int] = {}
+        self.started = time.perf_counter()
+        self._inner = 0.0   # time of the stages inside the current one
+
+    def _enter(self) -> Tuple[float, float]:
+        outer = self._inner
+        self._inner = 0.0
+        return outer, time.perf_counter()
+
+    def _leave(self, stage: str, mark: Tuple[float, float]) -> None:
+        outer, start = mark
+        elapsed = time.perf_counter() - start
+        self.stages[stage] = self.stages.get(stage, 0.0) + elapsed - self._inner
+        self._inner = outer + elapsed
+
+    @contextmanager
+    def stage(self, stage: str):
+        """Count the time of a with block toward stage."""
+        mark = self._enter()
+        try:
+            yield
+        finally:
+            self._leave(stage, mark)
+
+    def timed(self, stage: str, fn: Callable) -> Callable:
+        """Wrap fn so the time of each call counts toward stage."""
+        enter, leave = self._enter, self._leave
+
+        def call(*args, **kwargs):
+            mark = enter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                leave(stage, mark)
+        return call
+
+    def timed_iter(self, stage: str, iterable: Iterable) -> Iterator:
+        """Yield the items of iterable, counting the time to produce each toward stage."""
+        enter, leave = self._enter, self._leave
+        it = iter(iterable)
+        while True:
+            mark = enter()
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+            finally:
+                leave(stage, mark)
+            yield item
+
+    def count(self, name: str, n: int = 1) -> None:
+        """Add n to a counter."""
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def peak(self, name: str, value: int) -> None:
+        """Record value if it is the highest seen under name."""
+        if name not in self.peaks or value > self.peaks[name]:
+            self.peaks[name] = value
+
+    def counted(self, name: str, fn: Optional[Callable]) -> Callable:
+        """Return a callback that counts its calls under name, then calls fn (if any)."""
+        def call(*args):
+            self.count(name)
+            if fn is not None:
+                fn(*args)
+        return call
+
+    def snapshot(self) -> dict:
+        """Return the stages, counters and peaks as plain dicts (picklable)."""
+        return {"stages": dict(self.stages), "counters": dict(self.counters), "peaks": dict(self.peaks)}
+
+    def merge(self, snapshot: dict) -> None:
+        """Add in a snapshot() taken elsewhere, e.g. in a worker."""
+        for stage, seconds in snapshot["stages"].items():
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        for name, n in snapshot["counters"].items():
+            self.count(name, n)
+        for name, value in snapshot["peaks"].items():
+            self.peak(name, value)
+
+    def wall(self) -> float:
+        """Return the seconds since collection started."""
+        return time.perf_counter() - self.started
+
+    def table(self) -> str:
+        """Render as a table, slowest stage first."""
+        total = sum(self.stages.values())
+        names = [*self.stages, *self.counters, *(name + " (peak)" for name in self.peaks)]
+        width = max([len(name) for name in names] + [10])
+        lines = [f"{'stage':{width}}  {'seconds':>10}  {'share':>6}"]
+        for stage, seconds in sorted(self.stages.items(), key=lambda item: -item[1]):
+            share = seconds / total if total else 0.0
+            lines.append(f"{stage:{width}}  {seconds:10.3f}  {share:6.1%}")
+        lines.append(f"{'wall':{width}}  {self.wall():10.3f}")
+        if self.counters or self.peaks:
+            lines.append("")
+            lines.append(f"{'counter':{width}}  {'value':>10}")
+            for name, n in sorted(self.counters.items()):
+                lines.append(f"{name:{width}}  {n:10,}")
+            for name, value in sorted(self.peaks.items()):
+                lines.append(f"{name + ' (peak)':{width}}  {value:10,}")
+        return "\n".join(lines) + "\n"
+
+    def prometheus(self, prefix: str) -> str:
+        """Render in the Prometheus text exposition format, metric names starting with prefix."""
+        lines = [
+            f"# HELP {prefix}_stage_seconds_total Time spent in each stage (exclusive).",
+            f"# TYPE {prefix}_stage_seconds_total counter",
+        ]
+        for stage, seconds in sorted(self.stages.items()):
+            lines.append(f'{prefix}_stage_seconds_total{{stage="{stage}"}} {seconds:.6f}')
+        lines.append(f"# TYPE {prefix}_wall_seconds gauge")
+        lines.append(f"{prefix}_wall_seconds {self.wall():.6f}")
+        for name, n in sorted(self.counters.items()):
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {n}")
+        for name, value in sorted(self.peaks.items()):
+            lines.append(f"# TYPE {prefix}_{name}_peak gauge")
+            lines.append(f"{prefix}_{name}_peak {value}")
+        return "\n".join(lines) + "\n"
+
+    def render(self, fmt: str, prefix: str) -> str:
+        """Render in one of REPORT_FORMATS."""
+        if fmt not in REPORT_FORMATS:
+            raise ValueError(f"unknown stats format: {fmt}")
+        return self.table() if fmt == "table" else self.prometheus(prefix)
+
+
+# The Stats being collected into, or None when collection is off
+STATS: Optional[Stats] = None
+
+
+def enable() -> Stats:
+    """Start collecting; returns the new Stats."""
+    global STATS
+    STATS = Stats()
+    return STATS
+
+
+def disable() -> None:
+    """Stop collecting."""
+    global STATS
+    STATS = None
+
+
+def get_stats() -> Optional[Stats]:
+    """Return the Stats being collected into (None if collection is off)."""
+    return STATS
+
+
+def report(fmt: str, prefix: str, out: Optional[TextIO] = None) -> None:
+    """
+    Write the report of the current Stats, if collection is on.
+
+    Args:
+        fmt: One of REPORT_FORMATS
+        prefix: Metric name prefix for the Prometheus format
+        out: Where to write it (default: stderr, so it never mixes with the output)
+    """
+    if STATS is None:
+        return
+    out = sys.stderr if out is None else out
+    out.write(STATS.render(fmt, prefix))
+    out.flush()
+
+
+def stage(name: str):
+    """Stats.stage on the current Stats, or a no-op context when off."""
+    return STATS.stage(name) if STATS is not None else nullcontext()
+
+
+def timed(stage: str, fn: Callable) -> Callable:
+    """Stats.timed on the current Stats, or fn itself when off."""
+    return STATS.timed(stage, fn) if STATS is not None else fn
+
+
+def timed_iter(stage: str, iterable: Iterable) -> Iterable:
+    """Stats.timed_iter on the current Stats, or iterable itself when off."""
+    return STATS.timed_iter(stage, iterable) if STATS is not None else iterable
+
+
+def count(name: str, n: int = 1) -> None:
+    """Stats.count on the current Stats; does nothing when off."""
+    if STATS is not None:
+        STATS.count(name, n)
+
+
+def peak(name: str, value: int) -> None:
+    """Stats.peak on the current Stats; does nothing when off."""
+    if STATS is not None:
+        STATS.peak(name, value)
+
+
+@contextmanager
+def suspended():
+    """
+    Record nothing inside a with block, e.g. for a pre-pass over lines the
+    real pass will count. Its time goes to the stage around the block.
+    """
+    global STATS
+    outer = STATS
+    STATS = None
+    try:
+        yield
+    finally:
+        STATS = outer
+
+
+def collect(fn: Callable, *args) -> Tuple[object, dict]:
+    """
+    Call fn(*args) collecting into a fresh Stats, for a worker.
+
+    Returns:
+        (fn's result, snapshot of what the call recorded). Whatever Stats was
+        current before is restored, so this also works inline in the parent.
+    """
+    global STATS
+    outer = STATS
+    STATS = Stats()
+    try:
+        return fn(*args), STATS.snapshot()
+    finally:
+        STATS = outer
+
+
+def pool_map(pool, fn: Callable, *iterables) -> Iterator:
+    """
+    pool.map(fn, *iterables), or map() inline when pool is None, adding the
+    stats of each call to the current Stats when collection is on.
+
+    Yields:
+        fn's results in order
+    """
+    map_fn = map if pool is None else pool.map
+    if STATS is None:
+        yield from map_fn(fn, *iterables)
+        return
+    for result, snapshot in map_fn(functools.partial(collect, fn), *iterables):
+        STATS.merge(snapshot)
+        yield result
@@ -1,6 +1,11 @@
 #from datetime_convert2 import parse_datetime,detect_datetime_format
 from datetime import timezone
+import os
+import tempfile
+import time
 import ts_convert
+import ts_column
+import ts_extsort
     # detect_datetime_format(date_string: str) -> Tuple[Optional[datetime], Optional[str]]:
     # parse_datetime(date_string: str) -> Optional[datetime]:
     # print_datetime_format(date_string: str) -> None:
@@ -30,4 +35,25 @@ for t in times:
 sorted_times = sorted(parsed_times)
 
 for dt in sorted_times:
-    print(dt)
\ No newline at end of file
+    print(dt)
+
+# The epoch-ns paths (external sort, column sort) must order Unix timestamps
+# against naive strings the way sort_datetimes does, in any local timezone
+os.environ["TZ"] = "America/New_York"
+time.tzset()
+# Unix results parsed above are local times of the old zone
+ts_convert.clear_parse_cache()
+mixed = ["1731405780", "2024-11-12 10:00:00", "2024-11-12T12:00:00Z", "1731412800"]
+expected = ts_convert.sort_datetimes(mixed)
+with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+    f.write("\n".join(mixed) + "\n")
+try:
+    # A tiny budget so the records go through run files and the merge
+    external = list(ts_extsort.external_sort_datetimes(f.name, memory_budget=1))
+finally:
+    os.remove(f.name)
+column = list(ts_column.sort_datetimes_column(mixed, keep_originals=True).as_tuples())
+assert external == expected, external
+assert column == expected, column
+assert [dt for dt, _, _ in external] == sorted(dt for dt, _, _ in external)
+print("TZ=America/New_York: external and column sorts match sort_datetimes")